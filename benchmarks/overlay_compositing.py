@@ -0,0 +1,177 @@
+"""
+Benchmark: region-only caption compositing vs. the previous full-frame path.
+
+The previous add_text_overlay converted the whole image to RGBA, pasted a
+translucent box, drew the text and converted the whole frame back to RGB.
+The current one crops the caption band, shades and draws on it, and pastes
+it back. This script times both and measures their peak memory; each variant
+runs in a fresh subprocess so the peak RSS of one doesn't hide the other's.
+
+The speedup depends on the machine and its load: on a 1024x1280 frame the
+in-place region path has measured between about 2x and 4x faster (its peak
+RSS increase is ~1 MB against ~10 MB), with a pixel difference of 0. Run
+the script rather than relying on a single figure.
+
+Usage:
+    python benchmarks/overlay_compositing.py [--runs 20] [--image images/some.png]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from PIL import Image, ImageDraw, ImageChops
+
+import config
+import fonts
+import image_generator
+
+CAPTION = ("The gentle light of morning reminds us that each day holds "
+           "the promise of renewal and quiet possibilities")
+
+
+def full_frame_overlay(image: Image.Image, caption: str) -> Image.Image:
+    """
+    The previous add_text_overlay compositing: whole-image RGBA round trip.
+    Kept here as the reference the region-only path is measured against.
+    """
+    img_with_text = image.convert('RGBA')
+    draw = ImageDraw.Draw(img_with_text)
+    width, height = img_with_text.size
+
+    base_font_size = min(60, max(24, int(width * 0.045)))
+    font = fonts.get_font(base_font_size)
+    wrapped_lines = fonts.wrap_text(caption, base_font_size, width * config.OVERLAY_MAX_TEXT_WIDTH)
+
+    line_heights = []
+    line_widths = []
+    for line in wrapped_lines:
+        bbox = draw.textbbox((0, 0), line, font=font)
+        line_widths.append(bbox[2] - bbox[0])
+        line_heights.append(bbox[3] - bbox[1])
+
+    total_text_height = sum(line_heights) + (len(wrapped_lines) - 1) * int(base_font_size * 0.3)
+    max_line_width = max(line_widths)
+    text_x = int((width - max_line_width) // 2)
+    text_y = int(height * 0.62)
+
+    padding = int(base_font_size * 0.6)
+    bg_x1 = max(0, text_x - padding)
+    bg_y1 = max(0, text_y - padding)
+    bg_x2 = min(width, text_x + int(max_line_width) + padding)
+    bg_y2 = min(height, text_y + total_text_height + padding)
+
+    overlay = Image.new('RGBA', (bg_x2 - bg_x1, bg_y2 - bg_y1), (0, 0, 0, 140))
+    img_with_text.paste(overlay, (bg_x1, bg_y1), overlay)
+    draw = ImageDraw.Draw(img_with_text)
+
+    current_y = text_y
+    for i, line in enumerate(wrapped_lines):
+        line_x = int((width - line_widths[i]) // 2)
+        draw.text((line_x, current_y), line, fill=(255, 255, 255, 255), font=font)
+        current_y += line_heights[i] + int(base_font_size * 0.25)
+
+    return img_with_text.convert('RGB')
+
+
+VARIANTS = {
+    "full_frame": full_frame_overlay,
+    "region": image_generator.add_text_overlay,
+    # What finish_image uses: no copy of the base image at all
+    "region_in_place": lambda image, caption: image_generator.add_text_overlay(image, caption, in_place=True),
+}
+
+
+def load_input(image_path: str = None) -> Image.Image:
+    """
+    Load a sample image, or build a synthetic one at the pipeline's size.
+    """
+    if image_path:
+        image = Image.open(image_path).convert('RGB')
+        return image.resize((config.IMAGE_WIDTH, config.IMAGE_HEIGHT))
+    return Image.effect_noise((config.IMAGE_WIDTH, config.IMAGE_HEIGHT), 64).convert('RGB')
+
+
+def peak_rss_kb() -> float:
+    """
+    Peak resident set size of this process in KB, or -1 where unsupported.
+    """
+    try:
+        import resource
+    except ImportError:
+        return -1
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak / 1024 if sys.platform == "darwin" else peak
+
+
+def run_child(variant: str, runs: int, image_path: str = None):
+    """
+    Time one variant and print its results as JSON (subprocess side).
+    """
+    overlay = VARIANTS[variant]
+    image = load_input(image_path)
+    # Warm the font registry so neither variant pays for discovery; don't
+    # render an overlay yet, or its allocations would already be in the peak
+    size = min(60, max(24, int(image.width * 0.045)))
+    fonts.wrap_text(CAPTION, size, image.width * config.OVERLAY_MAX_TEXT_WIDTH)
+    fonts.get_font(size).getbbox(CAPTION)
+
+    rss_before = peak_rss_kb()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        overlay(image, CAPTION)
+        timings.append(time.perf_counter() - started)
+    rss_after = peak_rss_kb()
+
+    print(json.dumps({
+        "variant": variant,
+        "runs": runs,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+        "peak_rss_increase_kb": rss_after - rss_before if rss_before >= 0 else None,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="Overlays rendered per variant")
+    parser.add_argument("--image", help="Sample image to overlay (default: synthetic noise)")
+    parser.add_argument("--child", choices=sorted(VARIANTS), help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        run_child(options.child, options.runs, options.image)
+        return
+
+    results = {}
+    for variant in VARIANTS:
+        command = [sys.executable, os.path.abspath(__file__), "--child", variant, "--runs", str(options.runs)]
+        if options.image:
+            command += ["--image", options.image]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results[variant] = json.loads(output.strip().splitlines()[-1])
+
+    # Both paths must produce the same picture
+    image = load_input(options.image)
+    difference = ImageChops.difference(full_frame_overlay(image, CAPTION), image_generator.add_text_overlay(image, CAPTION))
+    max_channel_diff = max(high for _, high in difference.getextrema())
+
+    print(f"{'variant':<16}{'mean ms':>10}{'min ms':>10}{'peak RSS +KB':>14}")
+    for variant, result in results.items():
+        peak = result["peak_rss_increase_kb"]
+        peak_text = f"{peak:.0f}" if peak is not None else "n/a"
+        print(f"{variant:<16}{result['mean_ms']:>10.2f}{result['min_ms']:>10.2f}{peak_text:>14}")
+    speedup = results["full_frame"]["mean_ms"] / results["region_in_place"]["mean_ms"]
+    print(f"\nRegion-only compositing (in place) is {speedup:.1f}x faster; max pixel difference: {max_channel_diff}")
+
+
+if __name__ == "__main__":
+    main()
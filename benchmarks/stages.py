@@ -0,0 +1,384 @@
+"""
+Benchmark: time and peak memory of each rendering stage, offline.
+
+Covers the work done after the image API returns: the LANCZOS resize from
+1024x1792 to the output size, add_text_overlay at several caption lengths,
+encoding (PNG, JPEG, WEBP), variant scoring (image_scoring), whole renders of 1, 4 and 8 images at once, and
+save_post_log appends against post logs of increasing size. Inputs are
+synthetic noise and the sample images in images/ (scaled to 1024x1792), so
+no network or API key is needed.
+
+Every case runs in a fresh subprocess, so the peak RSS increase of one case
+isn't hidden by another's. Results are written as JSON; pass a previous
+results file as --baseline to compare, and the run fails (exit status 1)
+when a case got slower or bigger than the tolerance allows.
+
+Usage:
+    python benchmarks/stages.py [--runs 10] [--only overlay] [--output results.json]
+                                [--baseline old.json] [--tolerance 0.2]
+"""
+
+import argparse
+import gc
+import glob
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import PIL
+from PIL import Image
+
+import config
+import fonts
+import image_generator
+import image_scoring
+import utils
+
+SOURCE_SIZE = (1024, 1792)  # What the image API returns (see fetch_base_image)
+
+CAPTIONS = {
+    "short": "Breathe in the calm.",
+    "medium": ("The gentle light of morning reminds us that each day holds "
+               "the promise of renewal and quiet possibilities"),
+    "long": ("Slow down and let the quiet of the water settle your thoughts. "
+             "Every ripple fades, every storm passes, and the surface always "
+             "returns to stillness. Carry that stillness with you today, into "
+             "every conversation, every decision and every small moment that "
+             "asks for a little more patience than you think you have."),
+}
+
+ENCODE_FORMATS = ("PNG", "JPEG", "WEBP")
+RENDER_COUNTS = (1, 4, 8)
+LOG_SIZES = (0, 1000, 10000)
+
+DEFAULT_OUTPUT = os.path.join(config.OUTPUT_DIR, "benchmarks", "stages.json")
+
+
+def sample_paths() -> list:
+    """
+    Sample images shipped in images/.
+    """
+    return sorted(glob.glob(os.path.join(REPO_ROOT, "images", "*.png")))
+
+
+def load_inputs(source: str) -> list:
+    """
+    Build the 1024x1792 source images for a case.
+
+    Args:
+        source: "synthetic" (noise, the worst case for PNG) or "samples"
+
+    Returns:
+        List of RGB images
+    """
+    if source == "synthetic":
+        return [Image.effect_noise(SOURCE_SIZE, 64).convert("RGB")]
+    return [Image.open(path).convert("RGB").resize(SOURCE_SIZE, Image.Resampling.LANCZOS) for path in sample_paths()]
+
+
+def resized(images: list) -> list:
+    return [image.resize((config.IMAGE_WIDTH, config.IMAGE_HEIGHT), Image.Resampling.LANCZOS) for image in images]
+
+
+def warm_fonts():
+    """
+    Load the overlay fonts, so no case pays for font discovery.
+    """
+    for caption in CAPTIONS.values():
+        size = min(60, max(24, int(config.IMAGE_WIDTH * config.OVERLAY_FONT_SCALE)))
+        fonts.wrap_text(caption, size, config.IMAGE_WIDTH * config.OVERLAY_MAX_TEXT_WIDTH)
+        fonts.get_font(size).getbbox(caption)
+
+
+def use_scratch_dir(scratch: str):
+    """
+    Point every output path at a scratch directory.
+    """
+    config.OUTPUT_DIR = scratch
+    config.IMAGES_DIR = os.path.join(scratch, "images")
+    config.BASE_IMAGES_DIR = os.path.join(scratch, "base_images")
+    config.IMAGE_STORE_DIR = os.path.join(scratch, "image_store")
+    config.POSTS_LOG_PATH = os.path.join(scratch, "posts.jsonl")
+    config.POSTS_JSON_PATH = os.path.join(scratch, "posts.json")
+    utils.ensure_output_directories()
+
+
+def sample_post(index: int) -> dict:
+    """
+    A post log entry shaped like the ones the pipeline writes.
+    """
+    return {
+        "theme": f"benchmark theme {index}",
+        "caption": CAPTIONS["medium"],
+        "hashtags": "#calm #morning #mindfulness #nature #peace",
+        "image_path": os.path.join(config.IMAGES_DIR, f"benchmark_{index}.jpg"),
+        "base_image_path": os.path.join(config.BASE_IMAGES_DIR, f"benchmark_{index}.png"),
+        "timestamp": datetime.now().isoformat(),
+        "instagram_uploaded": False,
+        "instagram_media_id": None,
+        "image_fetch": {"response_format": "url", "cached": True, "bytes": 1500000},
+    }
+
+
+def build_cases() -> dict:
+    """
+    All benchmark cases.
+
+    Returns:
+        Mapping of case name to setup function; setup(scratch_dir) prepares
+        the inputs and returns the function to time
+    """
+    sources = ["synthetic"] + (["samples"] if sample_paths() else [])
+    overlay_source = sources[-1]
+    cases = {}
+
+    def resize_case(source):
+        def setup(scratch):
+            images = load_inputs(source)
+            counter = itertools.count()
+            return lambda: images[next(counter) % len(images)].resize(
+                (config.IMAGE_WIDTH, config.IMAGE_HEIGHT), Image.Resampling.LANCZOS)
+        return setup
+
+    def overlay_case(caption):
+        def setup(scratch):
+            base = resized(load_inputs(overlay_source))[0]
+            warm_fonts()
+            return lambda: image_generator.add_text_overlay(base, caption)
+        return setup
+
+    def encode_case(image_format, source):
+        def setup(scratch):
+            images = resized(load_inputs(source))
+            path = os.path.join(scratch, "encoded" + config.OUTPUT_EXTENSIONS[image_format])
+            counter = itertools.count()
+            return lambda: image_generator.encode_image(images[next(counter) % len(images)], path, image_format)
+        return setup
+
+    def score_case(source):
+        def setup(scratch):
+            images = resized(load_inputs(source))
+            counter = itertools.count()
+            return lambda: image_scoring.score_image(images[next(counter) % len(images)])
+        return setup
+
+    def render_case(count):
+        def setup(scratch):
+            use_scratch_dir(scratch)
+            sources_images = load_inputs(overlay_source)
+            warm_fonts()
+            runs = itertools.count()
+
+            def render_one(run, index):
+                # What the render stage does: resize, overlay, encode, store
+                image = sources_images[index % len(sources_images)].resize(
+                    (config.IMAGE_WIDTH, config.IMAGE_HEIGHT), Image.Resampling.LANCZOS)
+                path = os.path.join(config.IMAGES_DIR, f"render_{run}_{index}{config.OUTPUT_EXTENSIONS[config.OUTPUT_FORMAT]}")
+                image_generator.finish_image(image, path, caption=CAPTIONS["medium"])
+
+            def render_batch():
+                run = next(runs)
+                with ThreadPoolExecutor(max_workers=count) as executor:
+                    list(executor.map(lambda index: render_one(run, index), range(count)))
+            return render_batch
+        return setup
+
+    def post_log_case(existing):
+        def setup(scratch):
+            use_scratch_dir(scratch)
+            with open(config.POSTS_LOG_PATH, "w", encoding="utf-8") as f:
+                for index in range(existing):
+                    f.write(json.dumps(sample_post(index), ensure_ascii=False) + "\n")
+            counter = itertools.count(existing)
+            return lambda: utils.save_post_log(sample_post(next(counter)))
+        return setup
+
+    for source in sources:
+        cases[f"resize/{source}"] = resize_case(source)
+    for name, caption in CAPTIONS.items():
+        cases[f"overlay/{name}"] = overlay_case(caption)
+    for image_format in ENCODE_FORMATS:
+        for source in sources:
+            cases[f"encode/{image_format}/{source}"] = encode_case(image_format, source)
+    for source in sources:
+        cases[f"score/{source}"] = score_case(source)
+    for count in RENDER_COUNTS:
+        cases[f"render/{count}_images"] = render_case(count)
+    for existing in LOG_SIZES:
+        cases[f"save_post_log/{existing}_entries"] = post_log_case(existing)
+    return cases
+
+
+def _proc_status_kb(field: str):
+    """
+    A memory field (e.g. "VmRSS", "VmHWM") of /proc/self/status in KB, or
+    None where /proc isn't available.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak RSS counter (Linux only), so setup allocations don't
+    count as the stage's peak.
+
+    Returns:
+        True if the counter was reset
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_kb() -> float:
+    """
+    Peak resident set size of this process in KB, or -1 where unsupported.
+    """
+    peak = _proc_status_kb("VmHWM")
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:
+        return -1
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak / 1024 if sys.platform == "darwin" else peak
+
+
+def run_child(case: str, runs: int):
+    """
+    Time one case and print its results as JSON (subprocess side).
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        stage = build_cases()[case](scratch)
+        gc.collect()
+        # Measure from the current RSS where the peak can be reset; otherwise
+        # from the peak so far, which includes the setup
+        rss_before = _proc_status_kb("VmRSS") if reset_peak_rss() else peak_rss_kb()
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            stage()
+            timings.append(time.perf_counter() - started)
+        rss_after = peak_rss_kb()
+
+    timings.sort()
+    print(json.dumps({
+        "runs": runs,
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "median_ms": timings[len(timings) // 2] * 1000,
+        "min_ms": timings[0] * 1000,
+        "peak_rss_increase_kb": max(0, rss_after - rss_before) if rss_before is not None and rss_before >= 0 else None,
+    }))
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compare results with a baseline.
+
+    Time is compared on the median and memory on the peak RSS increase
+    (memory only when it grew by more than 1 MB, to ignore allocator noise).
+
+    Args:
+        results: Case results of this run
+        baseline: Case results of the baseline run
+        tolerance: Allowed relative increase, e.g. 0.2 for 20%
+
+    Returns:
+        List of (case, metric, baseline value, new value) regressions
+    """
+    regressions = []
+    for case, result in results.items():
+        old = baseline.get(case)
+        if not old:
+            continue
+        if result["median_ms"] > old["median_ms"] * (1 + tolerance):
+            regressions.append((case, "median_ms", old["median_ms"], result["median_ms"]))
+        old_peak, new_peak = old.get("peak_rss_increase_kb"), result.get("peak_rss_increase_kb")
+        if old_peak is not None and new_peak is not None and new_peak - old_peak > 1024 \
+                and new_peak > old_peak * (1 + tolerance):
+            regressions.append((case, "peak_rss_increase_kb", old_peak, new_peak))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="Timed runs per case")
+    parser.add_argument("--only", help="Only run cases whose name contains this text (e.g. overlay, encode/PNG)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"Results file (default {DEFAULT_OUTPUT})")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown/growth vs. the baseline (0.2 = 20%%)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.child:
+        run_child(options.child, options.runs)
+        return
+
+    names = [name for name in build_cases() if not options.only or options.only in name]
+    if not names:
+        parser.error(f"no case matches {options.only!r}")
+
+    results = {}
+    print(f"{'case':<28}{'median ms':>11}{'min ms':>10}{'peak RSS +KB':>14}")
+    for name in names:
+        command = [sys.executable, os.path.abspath(__file__), "--child", name, "--runs", str(options.runs)]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        result = results[name] = json.loads(output.strip().splitlines()[-1])
+        peak = result["peak_rss_increase_kb"]
+        peak_text = f"{peak:.0f}" if peak is not None else "n/a"
+        print(f"{name:<28}{result['median_ms']:>11.2f}{result['min_ms']:>10.2f}{peak_text:>14}", flush=True)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "image_size": [config.IMAGE_WIDTH, config.IMAGE_HEIGHT],
+        "runs": options.runs,
+        "cases": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+    with open(options.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {options.output}")
+
+    if options.baseline:
+        with open(options.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get("cases", {}), options.tolerance)
+        compared = [name for name in results if name in baseline.get("cases", {})]
+        print(f"Compared {len(compared)} cases with {options.baseline} "
+              f"(Pillow {baseline.get('pillow', '?')}, {baseline.get('created', '?')})")
+        for case in compared:
+            ratio = results[case]["median_ms"] / baseline["cases"][case]["median_ms"]
+            print(f"  {case:<28}{ratio:>7.2f}x time")
+        for case, metric, old, new in regressions:
+            print(f"REGRESSION {case}: {metric} {old:.1f} -> {new:.1f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
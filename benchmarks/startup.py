@@ -0,0 +1,136 @@
+"""
+Benchmark: CLI startup import time, with a budget that fails on regressions.
+
+Each module is imported in a fresh interpreter with `python -X importtime`
+(and without OPENAI_API_KEY, which must not be needed just to start). The
+import time of the module itself is read from the importtime report, so
+interpreter startup and site packages are not counted. The check fails
+(exit status 1) when a module takes longer than the budget or pulls in one
+of the heavy dependencies that should only load in the stage that uses it.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--budget-ms 150] [--module main ...] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules a command should only import when it gets to the work that needs them
+HEAVY_PACKAGES = ("openai", "PIL", "numpy", "requests", "httpx", "pydantic")
+
+# Commands that don't generate anything start from these
+DEFAULT_MODULES = ("main", "history", "scheduler")
+
+
+def parse_importtime(report: str):
+    """
+    Parse `-X importtime` output.
+
+    Args:
+        report: The interpreter's stderr
+
+    Returns:
+        List of (module name, self microseconds, cumulative microseconds,
+        nesting depth with 0 for top-level imports)
+    """
+    entries = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # One space after the bar, then two per nesting level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter and report what it cost.
+
+    Args:
+        module: Module name, importable from the repository root
+
+    Returns:
+        Dictionary with ms (the module's cumulative import time), heavy
+        (heavy packages it imported) and slowest ((name, ms) of its
+        slowest direct imports)
+    """
+    env = dict(os.environ)
+    env.pop("OPENAI_API_KEY", None)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+
+    entries = parse_importtime(result.stderr)
+    # The report lists children before their parent; the module's own line
+    # is the top-level (depth 0) entry with its name
+    position = max(i for i, entry in enumerate(entries) if entry[0] == module and entry[3] == 0)
+    start = position
+    while start > 0 and entries[start - 1][3] > 0:
+        start -= 1
+    children = entries[start:position]
+
+    heavy = sorted({name.split(".")[0] for name, _, _, _ in children if name.split(".")[0] in HEAVY_PACKAGES})
+    direct = sorted((entry for entry in children if entry[3] == 1), key=lambda entry: -entry[2])
+    return {
+        "ms": entries[position][2] / 1000,
+        "heavy": heavy,
+        "slowest": [(name, cumulative / 1000) for name, _, cumulative, _ in direct[:5]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module (the median is used)")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Largest allowed import time per module")
+    parser.add_argument("--module", action="append", dest="modules",
+                        help=f"Module to check (repeatable; default: {', '.join(DEFAULT_MODULES)})")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    options = parser.parse_args()
+
+    results = {}
+    for module in options.modules or DEFAULT_MODULES:
+        try:
+            runs = [measure(module) for _ in range(options.runs)]
+        except RuntimeError as e:
+            print(f"FAIL {str(e)}")
+            sys.exit(1)
+        results[module] = {
+            "median_ms": statistics.median(run["ms"] for run in runs),
+            "min_ms": min(run["ms"] for run in runs),
+            "heavy_imports": sorted({name for run in runs for name in run["heavy"]}),
+            "slowest_imports": runs[-1]["slowest"],
+        }
+        results[module]["within_budget"] = (results[module]["median_ms"] <= options.budget_ms
+                                            and not results[module]["heavy_imports"])
+
+    if options.json:
+        print(json.dumps({"budget_ms": options.budget_ms, "modules": results}, indent=2))
+    else:
+        print(f"{'module':<16}{'median ms':>11}{'min ms':>10}  heavy imports")
+        for module, result in results.items():
+            heavy = ", ".join(result["heavy_imports"]) or "-"
+            print(f"{module:<16}{result['median_ms']:>11.1f}{result['min_ms']:>10.1f}  {heavy}")
+        for module, result in results.items():
+            if not result["within_budget"]:
+                slowest = ", ".join(f"{name} {ms:.1f}ms" for name, ms in result["slowest_imports"])
+                print(f"\nFAIL {module}: over the {options.budget_ms:g} ms budget or importing heavy packages "
+                      f"(slowest imports: {slowest})")
+
+    if not all(result["within_budget"] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
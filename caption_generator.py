@@ -2,46 +2,137 @@
 Caption generation using OpenAI LLM.
 """
 
-from openai import OpenAI
+import json
+from typing import Tuple
+
 import config
+import prompts
+import response_cache
+import transport
 
+CAPTION_SYSTEM_PROMPT = "You are a thoughtful content writer who creates calm, confident, grounded captions with emotional maturity. You avoid hype, hustle culture, and excessive punctuation."
+HASHTAG_SYSTEM_PROMPT = "You are a social media expert who generates relevant, effective Instagram hashtags. Return only hashtags separated by spaces, no additional text."
+COMBINED_SYSTEM_PROMPT = "You are a thoughtful content writer and social media expert. You write calm, confident, grounded captions with emotional maturity, choose relevant Instagram hashtags, and always answer with a single JSON object."
 
-def generate_caption(theme: str, prompt_template: str) -> str:
+
+def clean_caption(caption: str) -> str:
     """
-    Generate an Instagram caption using OpenAI Chat Completions API.
+    Strip quotes and exclamation/question marks from a generated caption.
     
     Args:
-        theme: The content theme
-        prompt_template: The prompt template to use
+        caption: Raw caption text from the model
         
     Returns:
-        Generated caption as plain text string
+        Cleaned caption
+    """
+    caption = caption.strip()
+    
+    # Clean up any unwanted characters or formatting
+    caption = caption.replace('"', '').replace('"', '').replace("'", "").replace("'", "")
+    caption = caption.replace("!", ".").replace("?", ".")
+    
+    return caption
+
+
+def clean_hashtags(hashtags: str) -> str:
+    """
+    Normalize generated hashtags: every tag starts with #, only alphanumeric
+    and underscore characters are kept, and at most 15 tags are returned.
+    
+    Args:
+        hashtags: Raw hashtags from the model, separated by whitespace
+        
+    Returns:
+        Cleaned hashtags as a space-separated string
+    """
+    # Clean up the hashtags - ensure they all start with #
+    hashtag_list = []
+    for tag in hashtags.split():
+        tag = tag.strip()
+        if tag and not tag.startswith('#'):
+            tag = '#' + tag
+        if tag.startswith('#'):
+            # Remove any special characters except alphanumeric and underscore
+            clean_tag = '#' + ''.join(c for c in tag[1:] if c.isalnum() or c == '_')
+            if len(clean_tag) > 1:  # Has to be more than just '#'
+                hashtag_list.append(clean_tag)
+        elif tag:
+            hashtag_list.append('#' + tag)
+    
+    # Limit to 15 hashtags max
+    hashtag_list = hashtag_list[:15]
+    
+    return ' '.join(hashtag_list)
+
+
+def _chat_completion(system_prompt: str, user_prompt: str, temperature: float,
+                     max_tokens: int, response_format: dict = None) -> str:
     """
-    client = OpenAI(api_key=config.OPENAI_API_KEY)
+    Run a Chat Completions request, serving repeats from the response cache.
     
-    response = client.chat.completions.create(
+    Args:
+        system_prompt: System message
+        user_prompt: User message
+        temperature: Sampling temperature
+        max_tokens: Completion token limit
+        response_format: Optional response_format argument (e.g. JSON mode)
+        
+    Returns:
+        Raw message content from the model
+    """
+    cache_key = response_cache.make_key(
+        kind="chat",
+        model=config.CAPTION_MODEL,
+        system=system_prompt,
+        prompt=user_prompt,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        response_format=response_format
+    )
+    cached = response_cache.get_text(cache_key)
+    if cached is not None:
+        return cached
+    
+    client = transport.get_openai_client()
+    
+    extra_args = {"response_format": response_format} if response_format else {}
+    response = transport.call_openai(
+        client.chat.completions.with_raw_response.create,
         model=config.CAPTION_MODEL,
         messages=[
             {
                 "role": "system",
-                "content": "You are a thoughtful content writer who creates calm, confident, grounded captions with emotional maturity. You avoid hype, hustle culture, and excessive punctuation."
+                "content": system_prompt
             },
             {
                 "role": "user",
-                "content": prompt_template
+                "content": user_prompt
             }
         ],
-        temperature=0.7,
-        max_tokens=100
+        temperature=temperature,
+        max_tokens=max_tokens,
+        **extra_args
     )
     
-    caption = response.choices[0].message.content.strip()
+    content = response.choices[0].message.content or ""
+    response_cache.put_text(cache_key, content)
+    return content
+
+
+def generate_caption(theme: str, prompt_template: str) -> str:
+    """
+    Generate an Instagram caption using OpenAI Chat Completions API.
     
-    # Clean up any unwanted characters or formatting
-    caption = caption.replace('"', '').replace('"', '').replace("'", "").replace("'", "")
-    caption = caption.replace("!", ".").replace("?", ".")
+    Args:
+        theme: The content theme
+        prompt_template: The prompt template to use
+        
+    Returns:
+        Generated caption as plain text string
+    """
+    content = _chat_completion(CAPTION_SYSTEM_PROMPT, prompt_template, temperature=0.7, max_tokens=100)
     
-    return caption
+    return clean_caption(content)
 
 
 def generate_hashtags(theme: str, caption: str, prompt_template: str) -> str:
@@ -56,42 +147,73 @@ def generate_hashtags(theme: str, caption: str, prompt_template: str) -> str:
     Returns:
         Generated hashtags as a string (space-separated)
     """
-    client = OpenAI(api_key=config.OPENAI_API_KEY)
+    content = _chat_completion(HASHTAG_SYSTEM_PROMPT, prompt_template, temperature=0.8, max_tokens=100)
     
-    response = client.chat.completions.create(
-        model=config.CAPTION_MODEL,
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a social media expert who generates relevant, effective Instagram hashtags. Return only hashtags separated by spaces, no additional text."
-            },
-            {
-                "role": "user",
-                "content": prompt_template
-            }
-        ],
-        temperature=0.8,
-        max_tokens=100
-    )
+    return clean_hashtags(content)
+
+
+def parse_caption_and_hashtags(content: str) -> Tuple[str, str]:
+    """
+    Validate and clean a combined JSON response.
     
-    hashtags = response.choices[0].message.content.strip()
+    Args:
+        content: Raw model output, expected to be
+            {"caption": "...", "hashtags": ["#a", "#b"]}
+        
+    Returns:
+        Tuple of (caption, hashtags) cleaned like generate_caption and
+        generate_hashtags
+        
+    Raises:
+        ValueError: If the output is not valid JSON or is missing either field
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Combined response is not valid JSON: {str(e)}")
+    if not isinstance(data, dict):
+        raise ValueError("Combined response is not a JSON object")
     
-    # Clean up the hashtags - ensure they all start with #
-    hashtag_list = []
-    for tag in hashtags.split():
-        tag = tag.strip()
-        if tag and not tag.startswith('#'):
-            tag = '#' + tag
-        if tag.startswith('#'):
-            # Remove any special characters except alphanumeric and underscore
-            clean_tag = '#' + ''.join(c for c in tag[1:] if c.isalnum() or c == '_')
-            if len(clean_tag) > 1:  # Has to be more than just '#'
-                hashtag_list.append(clean_tag)
-        elif tag:
-            hashtag_list.append('#' + tag)
+    caption = data.get("caption")
+    hashtags = data.get("hashtags")
+    if not isinstance(caption, str):
+        raise ValueError("Combined response has no caption string")
+    if isinstance(hashtags, list) and all(isinstance(tag, str) for tag in hashtags):
+        hashtags = " ".join(hashtags)
+    if not isinstance(hashtags, str):
+        raise ValueError("Combined response has no hashtag list")
     
-    # Limit to 15 hashtags max
-    hashtag_list = hashtag_list[:15]
+    caption = clean_caption(caption)
+    hashtags = clean_hashtags(hashtags)
+    if not caption:
+        raise ValueError("Combined response has an empty caption")
+    if not hashtags:
+        raise ValueError("Combined response has no usable hashtags")
     
-    return ' '.join(hashtag_list)
+    return caption, hashtags
 
+
+def generate_caption_and_hashtags(theme: str, prompt_template: str) -> Tuple[str, str]:
+    """
+    Generate caption and hashtags with a single Chat Completions request.
+    
+    The model is asked for a JSON object holding both. If the output can't be
+    validated, falls back to generate_caption followed by generate_hashtags.
+    
+    Args:
+        theme: The content theme
+        prompt_template: The combined prompt template to use
+        
+    Returns:
+        Tuple of (caption, hashtags)
+    """
+    content = _chat_completion(COMBINED_SYSTEM_PROMPT, prompt_template, temperature=0.7, max_tokens=250, response_format={"type": "json_object"})
+    
+    try:
+        return parse_caption_and_hashtags(content)
+    except ValueError as e:
+        print(f"Warning: {str(e)} - falling back to separate caption and hashtag requests")
+    
+    caption = generate_caption(theme, prompts.caption_prompt(theme))
+    hashtags = generate_hashtags(theme, caption, prompts.hashtag_prompt(theme, caption))
+    return caption, hashtags
@@ -9,10 +9,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # API Configuration
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable is not set")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")  # Checked when first needed (see require), not at import
 
 # Instagram Graph API Configuration (for business accounts)
 # Required credentials for Instagram Graph API:
@@ -28,7 +25,8 @@ GITHUB_USERNAME = os.getenv("GITHUB_USERNAME")  # GitHub username/org name
 # Output directories
 OUTPUT_DIR = "outputs"
 IMAGES_DIR = os.path.join(OUTPUT_DIR, "images")
-POSTS_JSON_PATH = os.path.join(OUTPUT_DIR, "posts.json")
+POSTS_LOG_PATH = os.path.join(OUTPUT_DIR, "posts.jsonl")  # Append-only post log, one JSON entry per line
+POSTS_JSON_PATH = os.path.join(OUTPUT_DIR, "posts.json")  # Legacy format: migrated from once, export target
 
 # Image generation settings
 IMAGE_WIDTH = 1024
@@ -39,3 +37,138 @@ IMAGE_SIZE = f"{IMAGE_WIDTH}x{IMAGE_HEIGHT}"
 CAPTION_MODEL = "gpt-4o-mini"
 IMAGE_MODEL = "dall-e-3"  # Generate at 1024x1792, then resize to 1024x1280
 
+# Variants mode: request this many images per slide concurrently and keep the
+# best-scoring one (see image_scoring.py); 1 requests a single image
+IMAGE_VARIANTS = int(os.getenv("IMAGE_VARIANTS", "1"))
+MAX_IMAGE_VARIANTS = 8
+
+
+# Batch settings (python main.py batch themes.txt)
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))  # Themes processed at the same time
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "3"))  # Simultaneous OpenAI requests
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "2"))  # Simultaneous Instagram/GitHub uploads
+
+# HTTP client settings (shared keep-alive connection pools, see transport.py)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))  # Connections kept open per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))  # Seconds
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))  # Seconds
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))  # Seconds per OpenAI request
+
+# Retries and rate-limit pacing for OpenAI, Graph API and GitHub (see ratelimit.py)
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "4"))  # Retries on 429/5xx, throttling errors and connection errors
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1"))  # Seconds; doubles per retry, with jitter
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))  # Seconds; cap for a single backoff
+RATE_LIMIT_HEADROOM = float(os.getenv("RATE_LIMIT_HEADROOM", "0.2"))  # Start pacing below this fraction of budget left
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "300"))  # Longest a request waits for the budget to reset
+
+# Caption mode: one JSON request for caption + hashtags instead of two requests
+COMBINED_CAPTION_MODE = os.getenv("COMBINED_CAPTION_MODE", "false").lower() in ("1", "true", "yes")
+
+# OpenAI response cache (captions, hashtags and raw image bytes, see response_cache.py)
+CACHE_DIR = os.path.join(OUTPUT_DIR, "cache")
+OPENAI_CACHE_ENABLED = os.getenv("OPENAI_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(500 * 1024 * 1024)))  # Evict oldest entries above this size
+CACHE_MAX_AGE_DAYS = float(os.getenv("CACHE_MAX_AGE_DAYS", "30"))  # Evict entries not used for this long
+
+# DALL-E output retrieval: "url" downloads the image from OpenAI's blob store,
+# "b64_json" returns it inline in the API response (one less round trip)
+IMAGE_RESPONSE_FORMAT = os.getenv("IMAGE_RESPONSE_FORMAT", "url")
+IMAGE_DOWNLOAD_RETRIES = int(os.getenv("IMAGE_DOWNLOAD_RETRIES", "3"))  # Retries on transient download errors
+IMAGE_DOWNLOAD_CHUNK_SIZE = 64 * 1024  # Bytes decoded per streamed chunk
+FETCH_STATS_PATH = os.path.join(OUTPUT_DIR, "fetch_stats.json")  # Running average of URL download times
+
+# Caption overlay fonts: extra font files to try first, separated by os.pathsep
+OVERLAY_FONT_PATHS = [p for p in os.getenv("OVERLAY_FONT_PATHS", "").split(os.pathsep) if p]
+FONT_CACHE_SIZE = int(os.getenv("FONT_CACHE_SIZE", "16"))  # Loaded font sizes kept in memory
+OVERLAY_MAX_TEXT_WIDTH = 0.8  # Caption lines wrap at this fraction of the image width
+# Default overlay style (python main.py rerender can override each of these)
+OVERLAY_FONT_SCALE = 0.045  # Font size as a fraction of the image width (clamped to 24-60px)
+OVERLAY_TEXT_Y = 0.62  # Top of the caption as a fraction of the image height
+OVERLAY_SHADE = 140  # Darkness of the band behind the caption, 0 (none) to 255 (black)
+OVERLAY_TEXT_COLOR = "#FFFFFF"
+
+# Output encoding for final images: "PNG", "JPEG" (progressive) or "WEBP".
+# Instagram's Graph API only accepts JPEG; with PNG or WEBP a JPEG copy is
+# made in PUBLISH_IMAGES_DIR for hosting (see instagram_poster.publishable_image).
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "JPEG").upper()
+OUTPUT_QUALITY = int(os.getenv("OUTPUT_QUALITY", "90"))  # 1-100, JPEG/WEBP only
+OUTPUT_OPTIMIZE = os.getenv("OUTPUT_OPTIMIZE", "true").lower() in ("1", "true", "yes")  # Extra encoder passes for smaller files
+OUTPUT_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp"}
+BASE_IMAGES_DIR = os.path.join(OUTPUT_DIR, "base_images")  # Lossless copies without overlay, for rerendering
+PUBLISH_IMAGES_DIR = os.path.join(IMAGES_DIR, "jpeg")  # JPEG copies of PNG/WEBP images for Instagram (inside IMAGES_DIR for the image server)
+
+# Post history index (SQLite, rebuilt incrementally from the post log)
+HISTORY_INDEX_PATH = os.path.join(OUTPUT_DIR, "history.sqlite")
+REPEAT_THEME_WINDOW_DAYS = int(os.getenv("REPEAT_THEME_WINDOW_DAYS", "14"))  # Warn if a theme was posted this recently
+
+# Cache of the Page Access Token and Instagram Business Account ID
+CREDENTIALS_CACHE_PATH = os.path.join(OUTPUT_DIR, "credentials_cache.json")
+CREDENTIALS_CACHE_TTL_HOURS = float(os.getenv("CREDENTIALS_CACHE_TTL_HOURS", "168"))  # Re-fetch after this long
+
+# Carousel posts (python main.py --carousel N "theme")
+CAROUSEL_MAX_SLIDES = 10  # Instagram's limit per carousel
+
+# Scheduler daemon (python main.py schedule run <schedule-file>)
+SCHEDULE_QUEUE_PATH = os.path.join(OUTPUT_DIR, "schedule_queue.json")  # Persistent queue of staged posts
+SCHEDULE_LEAD_MINUTES = float(os.getenv("SCHEDULE_LEAD_MINUTES", "30"))  # Generate and stage this long before the slot
+SCHEDULE_GRACE_MINUTES = float(os.getenv("SCHEDULE_GRACE_MINUTES", "30"))  # Still publish this late after a missed slot
+SCHEDULE_RETRY_MINUTES = float(os.getenv("SCHEDULE_RETRY_MINUTES", "5"))  # Wait before retrying a failed stage/publish
+SCHEDULE_POLL_SECONDS = 30  # Longest the daemon sleeps before re-reading the schedule
+
+# Built-in image server (python main.py serve). With PUBLIC_IMAGE_BASE_URL set
+# to where that server is publicly reachable, Instagram fetches images from it
+# and the GitHub/Facebook upload step is skipped.
+IMAGE_SERVER_HOST = os.getenv("IMAGE_SERVER_HOST", "0.0.0.0")
+IMAGE_SERVER_PORT = int(os.getenv("IMAGE_SERVER_PORT", "8080"))
+IMAGE_SERVER_MAX_AGE = int(os.getenv("IMAGE_SERVER_MAX_AGE", "300"))  # Seconds clients may cache before revalidating
+PUBLIC_IMAGE_BASE_URL = os.getenv("PUBLIC_IMAGE_BASE_URL", "").rstrip("/")  # e.g. https://example.com/images
+
+# Content-addressed image store: rendered images by SHA-256, plus an index of
+# where each digest is already hosted so the same bytes are never uploaded twice
+IMAGE_STORE_DIR = os.path.join(OUTPUT_DIR, "image_store")
+IMAGE_STORE_INDEX_PATH = os.path.join(IMAGE_STORE_DIR, "hosted_urls.sqlite")
+
+# Near-duplicate image detection (perceptual hash index, see perceptual_index.py)
+PERCEPTUAL_INDEX_PATH = os.path.join(OUTPUT_DIR, "perceptual_index.sqlite")
+DUPLICATE_CHECK = os.getenv("DUPLICATE_CHECK", "true").lower() in ("1", "true", "yes")  # Regenerate/reject near-duplicates
+DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", "8"))  # Hamming distance (of 64 bits) counted as a duplicate
+DUPLICATE_RETRIES = int(os.getenv("DUPLICATE_RETRIES", "2"))  # Regenerations before a duplicate is rejected
+
+# Library thumbnails and contact sheets (python main.py thumbnails)
+THUMBNAILS_DIR = os.path.join(OUTPUT_DIR, "thumbnails")
+CONTACT_SHEETS_DIR = os.path.join(OUTPUT_DIR, "contact_sheets")
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "256"))  # Longest edge in pixels
+THUMBNAIL_QUALITY = 80  # JPEG quality of thumbnails and contact sheets
+CONTACT_SHEET_COLUMNS = 10
+CONTACT_SHEET_ROWS = 10  # Images per sheet = columns x rows
+
+# Per-stage metrics recorded with every post (see metrics.py). With
+# METRICS_TEXTFILE_PATH set, p50/p95 per stage are exported there after each
+# post, e.g. into the node exporter's textfile collector directory.
+METRICS_TEXTFILE_PATH = os.getenv("METRICS_TEXTFILE_PATH", "")
+METRICS_WINDOW_POSTS = int(os.getenv("METRICS_WINDOW_POSTS", "500"))  # Recent posts the export aggregates
+
+# Settings each capability can't work without. Checked lazily by require()
+# where the capability is first used, so commands that don't need it
+# (history, serve, thumbnails, ...) run without them.
+REQUIRED_SETTINGS = {
+    "openai": ["OPENAI_API_KEY"],
+    "instagram": ["INSTAGRAM_ACCESS_TOKEN"],
+    "facebook_page": ["FACEBOOK_PAGE_ID"],
+    "github": ["GITHUB_TOKEN", "GITHUB_USERNAME"],
+}
+
+
+def require(capability: str):
+    """
+    Check that the settings a capability needs are present.
+
+    Args:
+        capability: Key of REQUIRED_SETTINGS, e.g. "openai"
+
+    Raises:
+        ValueError: If any of its settings is not set
+    """
+    missing = [name for name in REQUIRED_SETTINGS[capability] if not globals().get(name)]
+    if missing:
+        raise ValueError(f"{', '.join(missing)} not set in .env file")
@@ -0,0 +1,161 @@
+"""
+Process-wide font registry and pixel-based text wrapping for caption overlays.
+
+The font file is discovered once per process, loaded fonts are cached per
+size (least recently used sizes are dropped), and glyph advance widths are
+cached per font so wrapping a caption doesn't re-measure every character.
+"""
+
+import os
+import sys
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from PIL import ImageFont
+
+import config
+
+_discovery_lock = threading.Lock()
+_discovered = False
+_font_path: Optional[str] = None
+
+
+def _candidate_font_paths() -> List[str]:
+    """
+    List font files to try, configured paths first, then platform defaults.
+    
+    Returns:
+        Font file paths in order of preference
+    """
+    candidates = list(config.OVERLAY_FONT_PATHS)
+    if sys.platform == "win32":
+        # Try Calibri first, then Arial
+        candidates += [f"C:/Windows/Fonts/{name}" for name in ["calibri.ttf", "arial.ttf", "arialbd.ttf"]]
+    elif sys.platform == "darwin":
+        candidates.append("/Library/Fonts/Arial.ttf")
+    else:
+        candidates.append("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+    return candidates
+
+
+def font_path() -> Optional[str]:
+    """
+    Get the font file used for overlays, discovering it on first call.
+    
+    Returns:
+        Path to a loadable TrueType font, or None to use Pillow's default font
+    """
+    global _discovered, _font_path
+    if _discovered:
+        return _font_path
+    
+    with _discovery_lock:
+        if not _discovered:
+            for path in _candidate_font_paths():
+                if not os.path.exists(path):
+                    continue
+                try:
+                    ImageFont.truetype(path, 12)
+                except Exception:
+                    continue
+                _font_path = path
+                break
+            _discovered = True
+    return _font_path
+
+
+@lru_cache(maxsize=config.FONT_CACHE_SIZE)
+def get_font(size: int) -> ImageFont.ImageFont:
+    """
+    Get the overlay font at a given size, loading it once per size.
+    
+    Args:
+        size: Font size in pixels
+        
+    Returns:
+        Loaded font (Pillow's default font if no TrueType font is available)
+    """
+    path = font_path()
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except Exception:
+            pass
+    
+    # Use default font; scalable on Pillow >= 10.1, fixed size before that
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=config.FONT_CACHE_SIZE)
+def _glyph_advances(size: int) -> Dict[str, float]:
+    # Per-size advance width cache, filled lazily by text_width
+    return {}
+
+
+def text_width(text: str, size: int) -> float:
+    """
+    Estimate the rendered width of text from cached glyph advances.
+    
+    Kerning is ignored, so the result can be slightly wider than the real
+    rendered width, which keeps wrapped lines on the safe side.
+    
+    Args:
+        text: Text to measure
+        size: Font size in pixels
+        
+    Returns:
+        Width in pixels
+    """
+    advances = _glyph_advances(size)
+    font = None
+    width = 0.0
+    for char in text:
+        advance = advances.get(char)
+        if advance is None:
+            if font is None:
+                font = get_font(size)
+            try:
+                advance = font.getlength(char)
+            except Exception:
+                # Fonts without getlength (old bitmap default font)
+                advance = size / 2
+            advances[char] = advance
+        width += advance
+    return width
+
+
+def wrap_text(text: str, size: int, max_width: float) -> List[str]:
+    """
+    Greedily wrap text into lines no wider than max_width pixels.
+    
+    Words are never split; a single word wider than max_width gets a line
+    of its own.
+    
+    Args:
+        text: Text to wrap
+        size: Font size in pixels
+        max_width: Maximum line width in pixels
+        
+    Returns:
+        Wrapped lines
+    """
+    space_width = text_width(" ", size)
+    lines = []
+    current_words = []
+    current_width = 0.0
+    for word in text.split():
+        word_width = text_width(word, size)
+        if current_words and current_width + space_width + word_width > max_width:
+            lines.append(" ".join(current_words))
+            current_words = [word]
+            current_width = word_width
+        else:
+            current_width += (space_width if current_words else 0) + word_width
+            current_words.append(word)
+    if current_words:
+        lines.append(" ".join(current_words))
+    return lines
@@ -0,0 +1,276 @@
+"""
+Indexed queries over the post log.
+
+The append-only post log (posts.jsonl) is mirrored into a SQLite index with
+indexes on normalized theme, timestamp, upload status and Instagram media
+ID. Each query first syncs the index by reading only the log lines appended
+since the last sync, so lookups stay fast with tens of thousands of posts.
+"""
+
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import config
+import utils
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    log_offset INTEGER PRIMARY KEY,
+    theme TEXT,
+    theme_key TEXT,
+    timestamp TEXT,
+    uploaded INTEGER,
+    media_id TEXT,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_theme ON posts (theme_key, timestamp);
+CREATE INDEX IF NOT EXISTS posts_timestamp ON posts (timestamp);
+CREATE INDEX IF NOT EXISTS posts_uploaded ON posts (uploaded, timestamp);
+CREATE INDEX IF NOT EXISTS posts_media_id ON posts (media_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def normalize_theme(theme: str) -> str:
+    """
+    Normalize a theme for matching: lowercase, punctuation removed and
+    whitespace collapsed ("Peaceful  Mountain!" -> "peaceful mountain").
+
+    Args:
+        theme: The content theme
+
+    Returns:
+        Normalized theme key
+    """
+    theme = re.sub(r"[^\w\s]", " ", (theme or "").lower())
+    return " ".join(theme.split())
+
+
+def _synced_offset(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT value FROM sync_state WHERE key = 'log_offset'").fetchone()
+    return row[0] if row else 0
+
+
+def sync(conn: sqlite3.Connection) -> int:
+    """
+    Index post log entries appended since the last sync.
+
+    If the log is shorter than the synced position (it was replaced or
+    truncated), the index is rebuilt from scratch.
+
+    Args:
+        conn: Connection from open_index
+
+    Returns:
+        Number of entries added to the index
+    """
+    utils.migrate_posts_json()
+    log_size = os.path.getsize(config.POSTS_LOG_PATH) if os.path.exists(config.POSTS_LOG_PATH) else 0
+
+    with conn:
+        offset = _synced_offset(conn)
+        if log_size < offset:
+            conn.execute("DELETE FROM posts")
+            offset = 0
+        if log_size == offset:
+            return 0
+
+        rows = []
+        end_offset = offset
+        for start, end, entry in utils.iter_post_log(offset):
+            media_id = entry.get("instagram_media_id")
+            uploaded = entry.get("instagram_uploaded")
+            rows.append((
+                start,
+                entry.get("theme"),
+                normalize_theme(entry.get("theme", "")),
+                entry.get("timestamp"),
+                None if uploaded is None else int(bool(uploaded)),
+                str(media_id) if media_id is not None else None,
+                json.dumps(entry, ensure_ascii=False)
+            ))
+            end_offset = end
+
+        conn.executemany("INSERT OR IGNORE INTO posts VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('log_offset', ?)",
+            (end_offset,)
+        )
+    return len(rows)
+
+
+def open_index() -> sqlite3.Connection:
+    """
+    Open the history index, creating it if needed, and sync it with the log.
+
+    Returns:
+        SQLite connection (close it when done)
+    """
+    os.makedirs(os.path.dirname(config.HISTORY_INDEX_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(config.HISTORY_INDEX_PATH, timeout=30)
+    conn.executescript(_SCHEMA)
+    sync(conn)
+    return conn
+
+
+def rebuild() -> int:
+    """
+    Drop and rebuild the whole index from the post log.
+
+    Returns:
+        Number of entries indexed
+    """
+    if os.path.exists(config.HISTORY_INDEX_PATH):
+        os.remove(config.HISTORY_INDEX_PATH)
+    conn = open_index()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _query(sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+    conn = open_index()
+    try:
+        return [json.loads(row[0]) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+def _range_bounds(since: Optional[str], until: Optional[str]) -> tuple:
+    # Timestamps are ISO strings, so they compare correctly as text. A date
+    # without a time as the upper bound includes that whole day.
+    lower = since or ""
+    upper = until or "9999"
+    if until and "T" not in until:
+        upper = until + "T99"
+    return lower, upper
+
+
+def find_by_theme(theme: str, since: str = None, until: str = None) -> List[Dict[str, Any]]:
+    """
+    Find posts for a theme, matched after normalization.
+
+    Args:
+        theme: The content theme
+        since: Optional ISO date/time lower bound
+        until: Optional ISO date/time upper bound (a bare date includes the whole day)
+
+    Returns:
+        Matching post entries, oldest first
+    """
+    lower, upper = _range_bounds(since, until)
+    return _query(
+        "SELECT entry FROM posts WHERE theme_key = ? AND timestamp >= ? AND timestamp <= ? ORDER BY timestamp",
+        (normalize_theme(theme), lower, upper)
+    )
+
+
+def recent_theme_posts(theme: str, days: int = None) -> List[Dict[str, Any]]:
+    """
+    Find posts for a theme within the last few days.
+
+    Args:
+        theme: The content theme
+        days: Window size (default config.REPEAT_THEME_WINDOW_DAYS)
+
+    Returns:
+        Matching post entries, oldest first
+    """
+    days = config.REPEAT_THEME_WINDOW_DAYS if days is None else days
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    return find_by_theme(theme, since=since)
+
+
+def find_by_media_id(media_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Find the post with a given Instagram media ID.
+
+    Args:
+        media_id: Instagram media ID
+
+    Returns:
+        The post entry, or None if not found
+    """
+    posts = _query("SELECT entry FROM posts WHERE media_id = ? LIMIT 1", (str(media_id),))
+    return posts[0] if posts else None
+
+
+def posts_between(since: str = None, until: str = None, limit: int = None) -> List[Dict[str, Any]]:
+    """
+    List posts in a time range.
+
+    Args:
+        since: Optional ISO date/time lower bound (inclusive)
+        until: Optional ISO date/time upper bound (a bare date includes the whole day)
+        limit: Optional maximum number of posts
+
+    Returns:
+        Post entries, oldest first
+    """
+    lower, upper = _range_bounds(since, until)
+    return _query(
+        "SELECT entry FROM posts WHERE timestamp >= ? AND timestamp <= ? ORDER BY timestamp LIMIT ?",
+        (lower, upper, limit if limit is not None else -1)
+    )
+
+
+def latest_posts(limit: int) -> List[Dict[str, Any]]:
+    """
+    List the most recent posts. Reads only those rows (newest first on the
+    timestamp index), however long the log is.
+
+    Args:
+        limit: Number of posts
+
+    Returns:
+        Post entries, oldest first
+    """
+    return _query("SELECT entry FROM posts ORDER BY timestamp DESC LIMIT ?", (limit,))[::-1]
+
+
+def failed_uploads(since: str = None, until: str = None) -> List[Dict[str, Any]]:
+    """
+    List posts that were generated but not uploaded to Instagram.
+
+    Entries logged before upload status was recorded are not included.
+
+    Args:
+        since: Optional ISO date/time lower bound (inclusive)
+        until: Optional ISO date/time upper bound (a bare date includes the whole day)
+
+    Returns:
+        Post entries, oldest first
+    """
+    lower, upper = _range_bounds(since, until)
+    return _query(
+        "SELECT entry FROM posts WHERE uploaded = 0 AND timestamp >= ? AND timestamp <= ? ORDER BY timestamp",
+        (lower, upper)
+    )
+
+
+def format_post(post: Dict[str, Any]) -> str:
+    """
+    Format a post entry as one line for CLI output.
+
+    Args:
+        post: Post entry
+
+    Returns:
+        Line with timestamp, upload status, theme, media ID and image path
+    """
+    timestamp = (post.get("timestamp") or "")[:19]
+    if post.get("instagram_uploaded"):
+        status = f"uploaded {post.get('instagram_media_id')}"
+    elif "instagram_uploaded" in post:
+        status = "not uploaded"
+    else:
+        status = "-"
+    return f"{timestamp}  {status:<28}  {post.get('theme', '')}  ({post.get('image_path', '')})"
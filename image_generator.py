@@ -2,172 +2,483 @@
 Image generation using OpenAI image generation API.
 """
 
-import requests
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageColor, ImageDraw, ImageFile
+import base64
+import functools
 import io
+import json
 import os
-import sys
-import textwrap
-from openai import OpenAI
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+import requests
 import config
+import fonts
+import image_store
+import metrics
+import ratelimit
+import response_cache
+import transport
+
+# Download failures worth retrying
+_TRANSIENT_DOWNLOAD_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+_fetch_stats_lock = threading.Lock()
+
+OVERLAY_STYLE_KEYS = ("font_scale", "text_y", "shade", "text_color")
+
+
+@functools.lru_cache(maxsize=8)
+def _band_shade_lut(shade: int) -> list:
+    """
+    Per-channel lookup table for the caption band: black at alpha `shade`
+    over RGB.
+    """
+    return [(v * (255 - shade) + 127) // 255 for v in range(256)] * 3
+
+
+def overlay_style(style: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Complete an overlay style with the configured defaults.
+    
+    Args:
+        style: Optional overrides for font_scale, text_y, shade and
+            text_color (see the OVERLAY_* settings in config.py)
+        
+    Returns:
+        Style dictionary with every key set
+    """
+    resolved = {
+        "font_scale": config.OVERLAY_FONT_SCALE,
+        "text_y": config.OVERLAY_TEXT_Y,
+        "shade": config.OVERLAY_SHADE,
+        "text_color": config.OVERLAY_TEXT_COLOR,
+    }
+    resolved.update({key: value for key, value in (style or {}).items() if value is not None})
+    unknown = set(resolved) - set(OVERLAY_STYLE_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown overlay style options: {', '.join(sorted(unknown))}")
+    if not 0 <= int(resolved["shade"]) <= 255:
+        raise ValueError("Overlay shade must be between 0 and 255")
+    ImageColor.getrgb(resolved["text_color"])  # Raises ValueError for an unknown color
+    return resolved
 
 
-def add_text_overlay(image: Image.Image, caption: str) -> Image.Image:
+def add_text_overlay(image: Image.Image, caption: str, in_place: bool = False,
+                     style: Dict[str, Any] = None) -> Image.Image:
     """
     Add caption text overlay to the image with elegant styling.
     
+    Only the caption band is composited: it is cropped out, darkened, has the
+    text drawn on it and is pasted back, so the rest of the frame is never
+    converted or blended.
+    
     Args:
         image: PIL Image object
         caption: Text caption to overlay
+        in_place: Draw directly on image (must be RGB) instead of a copy
+        style: Optional overlay style overrides (see overlay_style)
         
     Returns:
-        PIL Image with text overlay
+        RGB PIL Image with text overlay
     """
-    # Convert to RGBA for transparency support
-    if image.mode != 'RGBA':
-        img_with_text = image.convert('RGBA')
+    style = overlay_style(style)
+    text_color = ImageColor.getrgb(style["text_color"])[:3]
+    
+    if image.mode != 'RGB':
+        img_with_text = image.convert('RGB')
+    elif in_place:
+        img_with_text = image
     else:
         img_with_text = image.copy()
     
-    draw = ImageDraw.Draw(img_with_text)
-    
     # Get image dimensions
     width, height = img_with_text.size
     
-    # Calculate font size based on image width (approximately 4.5% of width)
-    base_font_size = int(width * 0.045)
+    # Calculate font size based on image width (approximately 4.5% of width by default)
+    base_font_size = int(width * style["font_scale"])
     if base_font_size < 24:
         base_font_size = 24
     elif base_font_size > 60:
         base_font_size = 60
     
-    # Try to load a nice font, fallback to default if not available
-    font = None
-    try:
-        if sys.platform == "win32":
-            # Try Calibri first, then Arial
-            for font_name in ["calibri.ttf", "arial.ttf", "arialbd.ttf"]:
-                font_path = f"C:/Windows/Fonts/{font_name}"
-                if os.path.exists(font_path):
-                    font = ImageFont.truetype(font_path, base_font_size)
-                    break
-        elif sys.platform == "darwin":
-            font_path = "/Library/Fonts/Arial.ttf"
-            if os.path.exists(font_path):
-                font = ImageFont.truetype(font_path, base_font_size)
-        else:
-            font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
-            if os.path.exists(font_path):
-                font = ImageFont.truetype(font_path, base_font_size)
-    except Exception:
-        pass
-    
-    if font is None:
-        # Use default font, but it won't scale well
-        try:
-            font = ImageFont.load_default()
-        except:
-            font = ImageFont.load_default()
+    # Font comes from the process-wide registry (discovered and loaded once)
+    font = fonts.get_font(base_font_size)
     
-    # Calculate text wrapping - estimate chars per line
-    max_chars_per_line = int(width * 0.08)  # Rough estimate
-    if max_chars_per_line < 20:
-        max_chars_per_line = 20
-    wrapped_lines = textwrap.wrap(caption, width=max_chars_per_line, break_long_words=False, break_on_hyphens=False)
+    # Wrap by measured pixel width so every line fits inside the image
+    max_text_width = width * config.OVERLAY_MAX_TEXT_WIDTH
+    wrapped_lines = fonts.wrap_text(caption, base_font_size, max_text_width)
     
     # Calculate text dimensions by actually measuring
     line_heights = []
     line_widths = []
     for line in wrapped_lines:
         try:
-            bbox = draw.textbbox((0, 0), line, font=font)
+            bbox = font.getbbox(line)
             line_width = bbox[2] - bbox[0]
             line_height = bbox[3] - bbox[1]
         except:
-            # Fallback if textbbox fails
+            # Fallback if getbbox fails
             line_width = len(line) * (base_font_size // 2)
             line_height = base_font_size
         line_widths.append(line_width)
         line_heights.append(line_height)
     
     if not line_heights:
-        return image
+        return img_with_text
     
     total_text_height = sum(line_heights) + (len(wrapped_lines) - 1) * int(base_font_size * 0.3)
     max_line_width = max(line_widths) if line_widths else width * 0.8
     
     # Position: Center horizontally, lower third vertically
     text_x = int((width - max_line_width) // 2)
-    text_y = int(height * 0.62)
+    text_y = int(height * style["text_y"])
     
-    # Add semi-transparent background for readability
+    # Semi-transparent background box for readability
     padding = int(base_font_size * 0.6)
     bg_x1 = max(0, text_x - padding)
     bg_y1 = max(0, text_y - padding)
     bg_x2 = min(width, text_x + int(max_line_width) + padding)
     bg_y2 = min(height, text_y + total_text_height + padding)
     
-    # Draw semi-transparent background
-    overlay = Image.new('RGBA', (bg_x2 - bg_x1, bg_y2 - bg_y1), (0, 0, 0, 140))
-    img_with_text.paste(overlay, (bg_x1, bg_y1), overlay)
-    draw = ImageDraw.Draw(img_with_text)
+    # Darken just the band: same result as pasting black at alpha `shade`
+    band = img_with_text.crop((bg_x1, bg_y1, bg_x2, bg_y2))
+    band = band.point(_band_shade_lut(int(style["shade"])))
+    draw = ImageDraw.Draw(band)
     
-    # Draw text (white color for contrast)
+    # Draw text (white by default, for contrast), in band coordinates
     current_y = text_y
     for i, line in enumerate(wrapped_lines):
         line_x = int((width - line_widths[i]) // 2)  # Center each line
         try:
-            draw.text((line_x, current_y), line, fill=(255, 255, 255, 255), font=font)
+            draw.text((line_x - bg_x1, current_y - bg_y1), line, fill=text_color, font=font)
         except:
             # Fallback for systems with font issues
-            draw.text((line_x, current_y), line, fill=(255, 255, 255, 255))
+            draw.text((line_x - bg_x1, current_y - bg_y1), line, fill=text_color)
         current_y += line_heights[i] + int(base_font_size * 0.25)
     
-    # Convert back to RGB for saving
-    return img_with_text.convert('RGB')
+    img_with_text.paste(band, (bg_x1, bg_y1))
+    return img_with_text
 
 
-def generate_image(prompt: str, output_path: str, caption: str = None) -> str:
+def _load_fetch_stats() -> dict:
+    if os.path.exists(config.FETCH_STATS_PATH):
+        try:
+            with open(config.FETCH_STATS_PATH, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def _record_download_seconds(seconds: float):
     """
-    Generate an image using OpenAI image generation API and save it locally.
+    Fold a URL-mode download time into the running average kept on disk.
+    
+    Args:
+        seconds: Time spent downloading one image
+    """
+    with _fetch_stats_lock:
+        stats = _load_fetch_stats()
+        average = stats.get("avg_download_seconds")
+        stats["avg_download_seconds"] = seconds if average is None else average * 0.8 + seconds * 0.2
+        stats["downloads"] = stats.get("downloads", 0) + 1
+        os.makedirs(os.path.dirname(config.FETCH_STATS_PATH), exist_ok=True)
+        with open(config.FETCH_STATS_PATH, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+
+
+def _estimated_download_seconds() -> Optional[float]:
+    """
+    Get the average URL-mode download time, if any download has been measured.
+    
+    Returns:
+        Average seconds per download, or None
+    """
+    with _fetch_stats_lock:
+        return _load_fetch_stats().get("avg_download_seconds")
+
+
+def _download_image(image_url: str, cache_key: str) -> Tuple[Image.Image, int]:
+    """
+    Stream a generated image from its URL, decoding chunks as they arrive
+    instead of buffering the whole response first. Transient network errors
+    and 429/5xx responses are retried with jittered exponential backoff.
+    
+    Args:
+        image_url: URL returned by the images API
+        cache_key: Response cache key the raw bytes are written under
+        
+    Returns:
+        Tuple of (decoded PIL Image, bytes downloaded)
+    """
+    last_error = None
+    retry_after = None
+    for attempt in range(config.IMAGE_DOWNLOAD_RETRIES + 1):
+        if attempt:
+            delay = ratelimit.backoff_delay(attempt - 1, retry_after)
+            print(f"Warning: image download failed ({last_error}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            retry_after = None
+        try:
+            with response_cache.bytes_writer(cache_key) as cache_file:
+                # Retried here rather than in transport, since a failure
+                # can also happen part-way through the stream
+                with transport.get(image_url, stream=True, timeout=30, retries=0) as img_response:
+                    img_response.raise_for_status()
+                    parser = ImageFile.Parser()
+                    downloaded = 0
+                    for chunk in img_response.iter_content(chunk_size=config.IMAGE_DOWNLOAD_CHUNK_SIZE):
+                        parser.feed(chunk)
+                        if cache_file is not None:
+                            cache_file.write(chunk)
+                        downloaded += len(chunk)
+                    image = parser.close()
+            return image, downloaded
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code not in ratelimit.RETRY_STATUS_CODES:
+                raise
+            retry_after = ratelimit.parse_retry_after(e.response.headers)
+            last_error = e
+        except _TRANSIENT_DOWNLOAD_ERRORS as e:
+            last_error = e
+    
+    raise Exception(f"Failed to download generated image after {config.IMAGE_DOWNLOAD_RETRIES + 1} attempts: {last_error}")
+
+
+def fetch_base_image(prompt: str, stats: dict = None, refresh: bool = False, variant: int = 0) -> Image.Image:
+    """
+    Request an image from the OpenAI image generation API and resize it.
     DALL-E 3 doesn't support 1024x1280 directly, so we generate at 1024x1792
-    and resize to the target dimensions. Optionally adds caption text overlay.
+    and resize to the target dimensions. Raw image bytes are kept in the
+    response cache, so repeating a prompt skips the API call and download.
+    
+    With config.IMAGE_RESPONSE_FORMAT set to "b64_json" the image comes back
+    inline in the API response; otherwise it is streamed from the returned URL.
     
     Args:
         prompt: The image generation prompt
-        output_path: Full path where the image should be saved
-        caption: Optional caption text to overlay on the image
+        stats: Optional dictionary filled with response_format, cached,
+            request_seconds, download_seconds, bytes and saved_seconds
+            (estimated download time avoided by b64_json)
+        refresh: Ignore a cached image for this prompt and request a new one
+            (which then replaces the cached one)
+        variant: Index of this request among several for the same prompt;
+            each variant is cached separately
         
     Returns:
-        The path where the image was saved
+        PIL Image at config.IMAGE_WIDTH x config.IMAGE_HEIGHT, without overlay
     """
-    client = OpenAI(api_key=config.OPENAI_API_KEY)
-    
     # DALL-E 3 supports 1024x1792 (portrait), generate at that size
-    response = client.images.generate(
+    size = "1024x1792"
+    quality = "standard"
+    response_format = config.IMAGE_RESPONSE_FORMAT
+    
+    cache_key = response_cache.make_key(
+        kind="image",
         model=config.IMAGE_MODEL,
         prompt=prompt,
-        size="1024x1792",
-        quality="standard",
-        n=1,
+        size=size,
+        quality=quality,
+        **({"variant": variant} if variant else {})
     )
+    fetch_stats = {
+        "response_format": response_format,
+        "cached": False,
+        "request_seconds": 0.0,
+        "download_seconds": 0.0,
+        "bytes": 0,
+        "saved_seconds": None
+    }
+    
+    image_bytes = None if refresh else response_cache.get_bytes(cache_key)
+    if image_bytes is not None:
+        fetch_stats["cached"] = True
+        fetch_stats["bytes"] = len(image_bytes)
+        image = Image.open(io.BytesIO(image_bytes))
+    else:
+        client = transport.get_openai_client()
+        
+        started = time.perf_counter()
+        with metrics.span("image_request"):
+            # Billed per image: don't resend after a timeout or 5xx the
+            # server may have finished generating behind
+            response = transport.call_openai(
+                client.images.with_raw_response.generate,
+                idempotent=False,
+                model=config.IMAGE_MODEL,
+                prompt=prompt,
+                size=size,
+                quality=quality,
+                response_format=response_format,
+                n=1,
+            )
+        fetch_stats["request_seconds"] = time.perf_counter() - started
+        
+        if response_format == "b64_json":
+            image_bytes = base64.b64decode(response.data[0].b64_json)
+            response_cache.put_bytes(cache_key, image_bytes)
+            fetch_stats["bytes"] = len(image_bytes)
+            fetch_stats["saved_seconds"] = _estimated_download_seconds()
+            image = Image.open(io.BytesIO(image_bytes))
+        else:
+            started = time.perf_counter()
+            with metrics.span("download"):
+                image, fetch_stats["bytes"] = _download_image(response.data[0].url, cache_key)
+            fetch_stats["download_seconds"] = time.perf_counter() - started
+            _record_download_seconds(fetch_stats["download_seconds"])
+        metrics.add_bytes("download", fetch_stats["bytes"])
+    
+    if stats is not None:
+        stats.update(fetch_stats)
+    
+    # Resize to target dimensions (1024x1280)
+    with metrics.span("resize"):
+        return image.resize((config.IMAGE_WIDTH, config.IMAGE_HEIGHT), Image.Resampling.LANCZOS)
+
+
+def encode_image(image: Image.Image, output_path: str, image_format: str = None) -> str:
+    """
+    Encode and save an image using the configured output format.
+    
+    PNG is lossless; JPEG is saved progressive, converted to RGB first (it
+    has no alpha or palette modes); JPEG and WEBP use config.OUTPUT_QUALITY.
+    config.OUTPUT_OPTIMIZE enables the slower, smaller encoder settings for
+    each format.
     
-    image_url = response.data[0].url
+    Args:
+        image: PIL Image to save
+        output_path: Full path where the image should be saved
+        image_format: "PNG", "JPEG" or "WEBP" (default config.OUTPUT_FORMAT)
+        
+    Returns:
+        The path where the image was saved
+    """
+    image_format = (image_format or config.OUTPUT_FORMAT).upper()
     
-    # Download the image
-    img_response = requests.get(image_url, timeout=30)
-    img_response.raise_for_status()
+    if image_format == "PNG":
+        options = {"optimize": config.OUTPUT_OPTIMIZE}
+    elif image_format == "JPEG":
+        options = {"quality": config.OUTPUT_QUALITY, "optimize": config.OUTPUT_OPTIMIZE, "progressive": True}
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+    elif image_format == "WEBP":
+        options = {"quality": config.OUTPUT_QUALITY, "method": 6 if config.OUTPUT_OPTIMIZE else 4}
+    else:
+        raise ValueError(f"Unsupported output format: {image_format}")
     
-    # Open image and resize to target dimensions (1024x1280)
-    image = Image.open(io.BytesIO(img_response.content))
-    image_resized = image.resize((config.IMAGE_WIDTH, config.IMAGE_HEIGHT), Image.Resampling.LANCZOS)
+    # Write a new file and swap it in: the old one may be hard-linked into
+    # the image store and must not be changed in place
+    temp_path = f"{output_path}.tmp"
+    image.save(temp_path, image_format, **options)
+    os.replace(temp_path, output_path)
     
-    # Add caption overlay if provided
-    if caption:
-        image_resized = add_text_overlay(image_resized, caption)
+    return output_path
+
+
+def format_for_path(path: str) -> Optional[str]:
+    """
+    Output format matching an image file's extension (the reverse of
+    config.OUTPUT_EXTENSIONS).
+    
+    Args:
+        path: Image file path
+        
+    Returns:
+        "PNG", "JPEG" or "WEBP", or None for an unknown extension
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".jpeg":
+        return "JPEG"
+    for image_format, format_ext in config.OUTPUT_EXTENSIONS.items():
+        if ext == format_ext:
+            return image_format
+    return None
+
+
+def base_image_path(output_path: str) -> str:
+    """
+    Location of the overlay-free base image kept for a final image.
+    
+    Args:
+        output_path: Path of the final image
+        
+    Returns:
+        PNG path inside config.BASE_IMAGES_DIR
+    """
+    stem = os.path.splitext(os.path.basename(output_path))[0]
+    return os.path.join(config.BASE_IMAGES_DIR, stem + ".png")
+
+
+def save_base_image(image: Image.Image, output_path: str) -> str:
+    """
+    Keep a lossless copy of a base image (before the overlay), so the final
+    image can be re-rendered later without calling the API again.
     
-    # Save the final image
-    image_resized.save(output_path, "PNG")
+    Saved as PNG with light compression: lossless, so a re-render matches a
+    fresh one exactly, and quick to write and read back.
     
+    Args:
+        image: Base image from fetch_base_image
+        output_path: Path of the final image it belongs to
+        
+    Returns:
+        The path the base image was saved to
+    """
+    path = base_image_path(output_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    image.save(temp_path, "PNG", compress_level=1)
+    os.replace(temp_path, path)
+    return path
+
+
+def finish_image(image: Image.Image, output_path: str, caption: str = None,
+                 style: Dict[str, Any] = None, image_format: str = None) -> str:
+    """
+    Apply the caption overlay to a base image and save it. The overlay is
+    drawn onto the given image, which is modified.
+    
+    Args:
+        image: Base image from fetch_base_image
+        output_path: Full path where the image should be saved
+        caption: Optional caption text to overlay on the image
+        style: Optional overlay style overrides (see overlay_style)
+        image_format: Output format (default config.OUTPUT_FORMAT)
+        
+    Returns:
+        The path where the image was saved
+    """
+    # Add caption overlay if provided (the base image is drawn on directly)
+    if caption:
+        with metrics.span("overlay"):
+            image = add_text_overlay(image, caption, in_place=True, style=style)
+    
+    # Save the final image and add it to the content-addressed store
+    with metrics.span("encode"):
+        encode_image(image, output_path, image_format)
+    image_store.add(output_path)
     return output_path
 
+
+def generate_image(prompt: str, output_path: str, caption: str = None) -> str:
+    """
+    Generate an image using OpenAI image generation API and save it locally.
+    Optionally adds caption text overlay.
+    
+    Args:
+        prompt: The image generation prompt
+        output_path: Full path where the image should be saved
+        caption: Optional caption text to overlay on the image
+        
+    Returns:
+        The path where the image was saved
+    """
+    image = fetch_base_image(prompt)
+    if caption:
+        save_base_image(image, output_path)
+    return finish_image(image, output_path, caption=caption)
@@ -0,0 +1,114 @@
+"""
+Cheap quality scores for picking the best of several generated images.
+
+Each image is reduced to a 512px-wide grayscale NumPy array (a box
+downscale, a few milliseconds) and scored on four measures, each between
+0 and 1, higher is better:
+
+    exposure       mean brightness near mid-grey, few clipped pixels
+    band_contrast  contrast of the caption text against the darkened band
+                   (WCAG contrast ratio at the band's bright spots)
+    sharpness      variance of the Laplacian above the caption band
+    busyness       low edge density behind the caption, so text stays legible
+
+The caption isn't known when images are scored, so the caption region is
+approximated from the overlay style: from text_y down by
+CAPTION_REGION_HEIGHT, across config.OVERLAY_MAX_TEXT_WIDTH of the width.
+"""
+
+from typing import Any, Dict
+
+import numpy as np
+from PIL import Image, ImageColor
+
+import config
+import image_generator
+
+SCORE_WIDTH = 512  # Images are scored at this width
+
+# Height of a typical 2-4 line caption band, as a fraction of the image height
+CAPTION_REGION_HEIGHT = 0.22
+
+TARGET_BRIGHTNESS = 0.45  # Mean luminance (0-1) an image ideally has
+BRIGHTNESS_TOLERANCE = 0.1  # Deviation from the target that isn't penalized
+SHARPNESS_SCALE = 0.0005  # Laplacian variance that scores 0.5
+BUSYNESS_MAX = 0.15  # Mean gradient behind the caption that scores 0
+TARGET_CONTRAST = 7.0  # Contrast ratio that scores 1 (WCAG AAA)
+
+# Sharpness outweighs busyness: blur lowers busyness too, and must still lose
+WEIGHTS = {"exposure": 0.3, "band_contrast": 0.25, "sharpness": 0.3, "busyness": 0.15}
+
+
+def _linear(values: np.ndarray) -> np.ndarray:
+    # sRGB-ish gamma, good enough for a contrast ratio
+    return np.power(values, 2.2)
+
+
+def caption_region(height: int, width: int, style: Dict[str, Any]) -> tuple:
+    """
+    Approximate rows and columns the caption band will cover.
+
+    Args:
+        height: Image height in pixels
+        width: Image width in pixels
+        style: Complete overlay style (see image_generator.overlay_style)
+
+    Returns:
+        (top, bottom, left, right) pixel bounds
+    """
+    top = int(height * max(0.0, style["text_y"] - 0.03))
+    bottom = min(height, int(height * (style["text_y"] + CAPTION_REGION_HEIGHT)))
+    margin = int(width * (1 - config.OVERLAY_MAX_TEXT_WIDTH) / 2)
+    return top, bottom, margin, width - margin
+
+
+def score_image(image: Image.Image, style: Dict[str, Any] = None) -> Dict[str, float]:
+    """
+    Score a base image (without overlay) for use as a post image.
+
+    Args:
+        image: PIL Image
+        style: Optional overlay style overrides (see image_generator.overlay_style)
+
+    Returns:
+        Dictionary with exposure, band_contrast, sharpness, busyness and
+        score (their weighted sum), each between 0 and 1
+    """
+    style = image_generator.overlay_style(style)
+    height = max(1, round(image.height * SCORE_WIDTH / image.width))
+    gray = image.convert("L").resize((SCORE_WIDTH, height), Image.Resampling.BOX)
+    luma = np.asarray(gray, dtype=np.float32) / 255.0
+
+    top, bottom, left, right = caption_region(height, SCORE_WIDTH, style)
+    band = luma[top:bottom, left:right]
+
+    # Exposure: distance of the mean from the target, minus clipped shadows/highlights
+    clipped = np.count_nonzero((luma < 0.02) | (luma > 0.98)) / luma.size
+    deviation = max(0.0, abs(float(luma.mean()) - TARGET_BRIGHTNESS) - BRIGHTNESS_TOLERANCE)
+    exposure = 1.0 - deviation / (1.0 - TARGET_BRIGHTNESS - BRIGHTNESS_TOLERANCE) - clipped * 5
+
+    # Band contrast: text colour against the darkened band's bright spots
+    text = _linear(ImageColor.getcolor(style["text_color"], "L") / 255.0)
+    background = _linear(np.percentile(band, 90) * (255 - int(style["shade"])) / 255.0)
+    ratio = (max(text, background) + 0.05) / (min(text, background) + 0.05)
+    band_contrast = (ratio - 1.0) / (TARGET_CONTRAST - 1.0)
+
+    # Sharpness: 4-neighbour Laplacian over the subject above the caption
+    subject = luma[:max(top, 3)]
+    laplacian = (4 * subject[1:-1, 1:-1] - subject[:-2, 1:-1] - subject[2:, 1:-1]
+                 - subject[1:-1, :-2] - subject[1:-1, 2:])
+    variance = float(laplacian.var()) if laplacian.size else 0.0
+    sharpness = variance / (variance + SHARPNESS_SCALE)
+
+    # Busyness: mean absolute gradient behind the caption
+    gradient = (float(np.abs(np.diff(band, axis=1)).mean()) + float(np.abs(np.diff(band, axis=0)).mean())
+                if band.shape[0] > 1 and band.shape[1] > 1 else 0.0)
+    busyness = 1.0 - gradient / BUSYNESS_MAX
+
+    scores = {
+        name: round(min(1.0, max(0.0, float(value))), 3)
+        for name, value in (("exposure", exposure), ("band_contrast", band_contrast),
+                            ("sharpness", sharpness), ("busyness", busyness))
+    }
+    scores["score"] = round(sum(scores[name] * weight for name, weight in WEIGHTS.items()), 3)
+    return scores
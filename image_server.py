@@ -0,0 +1,238 @@
+"""
+Built-in static file server for generated images.
+
+Serves config.IMAGES_DIR over HTTP so that, on a publicly reachable
+machine, Instagram can fetch images straight from here and the GitHub /
+Facebook upload step is skipped (set PUBLIC_IMAGE_BASE_URL to the public
+address of this server). File bodies are sent with socket.sendfile, which
+uses zero-copy os.sendfile where the platform has it. Responses carry
+ETag and Last-Modified validators, and HEAD, conditional GETs and single
+byte ranges are supported. Each connection is handled on its own thread.
+"""
+
+import email.utils
+import mimetypes
+import os
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import config
+
+
+def url_prefix() -> str:
+    """
+    Path prefix images are published under, taken from PUBLIC_IMAGE_BASE_URL
+    (e.g. "/images" for "https://example.com/images"), so a reverse proxy can
+    pass the path through unchanged.
+
+    Returns:
+        Prefix without trailing slash ("" for none)
+    """
+    return urlsplit(config.PUBLIC_IMAGE_BASE_URL or "").path.rstrip("/")
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range Range header.
+
+    Args:
+        header: Range header value, e.g. "bytes=0-499", "bytes=500-" or "bytes=-500"
+        size: File size in bytes
+
+    Returns:
+        Inclusive (start, end) byte positions, or None if the header should be
+        ignored (malformed, or several ranges) and the whole file sent
+
+    Raises:
+        ValueError: If the range can't be satisfied
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    if not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class ImageRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET/HEAD handler for files under the server's root directory.
+    """
+
+    protocol_version = "HTTP/1.1"  # Keep-alive connections
+    server_version = "ig-image-host"
+    timeout = 60  # Close idle keep-alive connections
+    # Headers and the sendfile body go out as separate writes; without
+    # TCP_NODELAY the body waits on the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def _resolve(self) -> Optional[str]:
+        """
+        Map the request path to a file under the root, refusing anything
+        outside it.
+        """
+        path = unquote(urlsplit(self.path).path)
+        prefix = url_prefix()
+        if prefix:
+            if not path.startswith(prefix + "/"):
+                return None
+            path = path[len(prefix):]
+        root = os.path.realpath(self.server.root)
+        full_path = os.path.realpath(os.path.join(root, path.lstrip("/")))
+        if not full_path.startswith(root + os.sep) or not os.path.isfile(full_path):
+            return None
+        return full_path
+
+    def _not_modified(self, etag: str, mtime: float) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _serve(self, send_body: bool):
+        full_path = self._resolve()
+        if full_path is None:
+            self._send_empty(HTTPStatus.NOT_FOUND)
+            return
+
+        stat = os.stat(full_path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+
+        if self._not_modified(etag, stat.st_mtime):
+            self._send_empty(HTTPStatus.NOT_MODIFIED, etag, last_modified)
+            return
+
+        status = HTTPStatus.OK
+        start, end = 0, size - 1
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (not if_range or if_range.strip() in (etag, last_modified)):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if byte_range:
+                status = HTTPStatus.PARTIAL_CONTENT
+                start, end = byte_range
+
+        length = max(0, end - start + 1)
+        self.send_response(status)
+        self.send_header("Content-Type", mimetypes.guess_type(full_path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        # Not immutable: `main.py rerender` rewrites images under the same
+        # name, so clients revalidate with the ETag/Last-Modified after a while
+        self.send_header("Cache-Control", f"public, max-age={config.IMAGE_SERVER_MAX_AGE}")
+        if status == HTTPStatus.PARTIAL_CONTENT:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+
+        if send_body and length:
+            try:
+                with open(full_path, 'rb') as f:
+                    self.connection.sendfile(f, offset=start, count=length)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+    def _send_empty(self, status: HTTPStatus, etag: str = None, last_modified: str = None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def create_server(host: str = None, port: int = None, root: str = None) -> ThreadingHTTPServer:
+    """
+    Create (but don't start) the image server.
+
+    Args:
+        host: Interface to listen on (default config.IMAGE_SERVER_HOST)
+        port: Port to listen on (default config.IMAGE_SERVER_PORT; 0 picks a free one)
+        root: Directory to serve (default config.IMAGES_DIR)
+
+    Returns:
+        The server
+    """
+    server = ThreadingHTTPServer(
+        (host or config.IMAGE_SERVER_HOST, config.IMAGE_SERVER_PORT if port is None else port),
+        ImageRequestHandler
+    )
+    server.root = root or config.IMAGES_DIR
+    return server
+
+
+def start_in_background(host: str = None, port: int = None) -> ThreadingHTTPServer:
+    """
+    Start the image server on a daemon thread (e.g. next to the scheduler).
+
+    Args:
+        host: Interface to listen on (default config.IMAGE_SERVER_HOST)
+        port: Port to listen on (default config.IMAGE_SERVER_PORT)
+
+    Returns:
+        The running server; call shutdown() to stop it
+    """
+    server = create_server(host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving {server.root} on http://{server.server_address[0]}:{server.server_address[1]}{url_prefix()}/")
+    return server
+
+
+def serve(host: str = None, port: int = None):
+    """
+    Run the image server until interrupted.
+
+    Args:
+        host: Interface to listen on (default config.IMAGE_SERVER_HOST)
+        port: Port to listen on (default config.IMAGE_SERVER_PORT)
+    """
+    server = create_server(host, port)
+    print(f"Serving {server.root} on http://{server.server_address[0]}:{server.server_address[1]}{url_prefix()}/")
+    if config.PUBLIC_IMAGE_BASE_URL:
+        print(f"Instagram will fetch images from {config.PUBLIC_IMAGE_BASE_URL}")
+    else:
+        print("[INFO] PUBLIC_IMAGE_BASE_URL not set - uploads will still use GitHub/Facebook hosting")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nImage server stopped")
+    finally:
+        server.server_close()
@@ -0,0 +1,175 @@
+"""
+Content-addressed image storage and a digest -> hosted URL index.
+
+Every rendered image is hashed (SHA-256) and linked into
+IMAGE_STORE_DIR/<digest[:2]>/<digest><ext>, so byte-identical renders share
+one file on disk. Hosted URLs are indexed by digest, so hosting the same
+bytes again (an upload retry, a re-post, the same image in another
+carousel) reuses the existing URL without uploading anything.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosted_urls (
+    digest TEXT NOT NULL,
+    host TEXT NOT NULL,
+    url TEXT NOT NULL,
+    hosted_at TEXT NOT NULL,
+    PRIMARY KEY (digest, host)
+);
+"""
+
+# (absolute path, size, mtime_ns) -> digest, so a file is hashed once
+_digests: Dict[Tuple[str, int, int], str] = {}
+_digests_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """
+    SHA-256 of a file's contents, cached while the file is unchanged.
+
+    Args:
+        path: File path
+
+    Returns:
+        Hex digest
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with _digests_lock:
+            _digests[key] = digest
+    return digest
+
+
+def content_name(path: str) -> str:
+    """
+    Content-addressed filename for an image: <digest><ext>.
+
+    Args:
+        path: Image path
+
+    Returns:
+        Filename to host the image under
+    """
+    return file_digest(path) + os.path.splitext(path)[1].lower()
+
+
+def store_path(digest: str, ext: str) -> str:
+    """
+    Location of a digest in the store.
+
+    Args:
+        digest: Hex digest
+        ext: File extension including the dot
+
+    Returns:
+        Path inside config.IMAGE_STORE_DIR
+    """
+    return os.path.join(config.IMAGE_STORE_DIR, digest[:2], digest + ext.lower())
+
+
+def _link_or_copy(source: str, destination: str):
+    temp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        # No hard links here (e.g. FAT or another volume)
+        shutil.copy2(source, temp_path)
+    os.replace(temp_path, destination)
+
+
+def add(path: str) -> str:
+    """
+    Add a rendered image to the store.
+
+    If the same bytes are already stored, the given file is replaced by a
+    hard link to the stored copy, so duplicates take no extra space.
+
+    Args:
+        path: Image path
+
+    Returns:
+        Path of the stored copy
+    """
+    digest = file_digest(path)
+    stored = store_path(digest, os.path.splitext(path)[1])
+    if os.path.exists(stored):
+        if not os.path.samefile(stored, path):
+            _link_or_copy(stored, path)
+    else:
+        os.makedirs(os.path.dirname(stored), exist_ok=True)
+        _link_or_copy(path, stored)
+    return stored
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(config.IMAGE_STORE_INDEX_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(config.IMAGE_STORE_INDEX_PATH, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def lookup(path: str, host: str = None) -> Optional[str]:
+    """
+    Find a URL the image's bytes are already hosted at.
+
+    Args:
+        path: Image path
+        host: Optional hosting backend to restrict to (e.g. "github")
+
+    Returns:
+        Most recently recorded URL, or None
+    """
+    conn = _connect()
+    try:
+        if host:
+            row = conn.execute(
+                "SELECT url FROM hosted_urls WHERE digest = ? AND host = ?", (file_digest(path), host)
+            ).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT url FROM hosted_urls WHERE digest = ? ORDER BY hosted_at DESC LIMIT 1", (file_digest(path),)
+            ).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def record(path: str, url: str, host: str):
+    """
+    Remember where an image's bytes are hosted.
+
+    Only record URLs that stay valid: Facebook CDN URLs are signed and
+    expire, so they aren't indexed.
+
+    Args:
+        path: Image path
+        url: Public URL
+        host: Hosting backend (e.g. "github")
+    """
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO hosted_urls VALUES (?, ?, ?, ?)",
+                (file_digest(path), host, url, datetime.now().isoformat())
+            )
+    finally:
+        conn.close()
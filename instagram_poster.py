@@ -3,12 +3,81 @@ Instagram posting functionality using Instagram Graph API (Meta's official API).
 """
 
 import os
-import requests
+import re
 import json
+import time
 import base64
-from typing import Optional
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
 from datetime import datetime
 import config
+import image_store
+import metrics
+import transport
+
+# Default branch per (username, repo), looked up once per process
+_github_default_branches: Dict[tuple, str] = {}
+
+# Filenames made by utils.generate_image_filename: name_YYYYMMDD_HHMMSS[_N].ext
+_UNIQUE_FILENAME_PATTERN = re.compile(r"_\d{8}_\d{6}(_\d+)?\.\w+$")
+# Content-addressed names from image_store.content_name: same name, same bytes
+_CONTENT_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.\w+$")
+
+# Graph API error codes meaning the access token is invalid or expired
+_AUTH_ERROR_CODES = {102, 190}
+# Graph API error subcodes meaning a media container no longer exists or
+# has expired, so it can never be published
+_CONTAINER_GONE_SUBCODES = {33, 2207006, 2207008, 2207020}
+# Media container status codes after which it can't be published
+CONTAINER_UNUSABLE_STATUSES = ("EXPIRED", "ERROR")
+
+_credentials_cache_lock = threading.Lock()
+
+
+class GraphAPIError(Exception):
+    """
+    Error response from the Facebook Graph API.
+    
+    Attributes:
+        status_code: HTTP status code
+        code: Graph API error code (e.g. 190 for an invalid token), if given
+        subcode: Graph API error subcode, if given
+    """
+    
+    def __init__(self, message: str, status_code: int = None, code: int = None, subcode: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.subcode = subcode
+    
+    @property
+    def is_auth_error(self) -> bool:
+        """True if the error means the access token must be refreshed."""
+        return self.code in _AUTH_ERROR_CODES
+
+
+def _graph_error(message: str, response) -> GraphAPIError:
+    """
+    Build a GraphAPIError from a failed Graph API response.
+    
+    Args:
+        message: Description of what failed
+        response: The requests response
+        
+    Returns:
+        GraphAPIError whose message is "<message>: <response body>"
+    """
+    code = subcode = None
+    try:
+        error = response.json().get("error", {})
+        code = error.get("code")
+        subcode = error.get("error_subcode")
+    except (ValueError, AttributeError):
+        pass
+    return GraphAPIError(f"{message}: {response.text}", response.status_code, code, subcode)
 
 
 def upload_image_to_facebook(image_path: str, access_token: str, page_id: str) -> Optional[str]:
@@ -25,19 +94,20 @@ def upload_image_to_facebook(image_path: str, access_token: str, page_id: str) -
     """
     url = f"https://graph.facebook.com/v18.0/{page_id}/photos"
     
+    metrics.add_bytes("upload", os.path.getsize(image_path))
     with open(image_path, 'rb') as image_file:
         files = {'file': image_file}
         data = {
             'published': 'false',  # Don't publish to Facebook, just upload
             'access_token': access_token
         }
-        response = requests.post(url, files=files, data=data)
+        response = transport.post(url, files=files, data=data)
         
     if response.status_code == 200:
         result = response.json()
         return result.get('id')  # This is the photo ID on Facebook
     else:
-        raise Exception(f"Failed to upload image to Facebook: {response.text}")
+        raise _graph_error("Failed to upload image to Facebook", response)
 
 
 def create_instagram_media_container(instagram_account_id: str, image_url: str, caption: str, access_token: str) -> str:
@@ -62,13 +132,13 @@ def create_instagram_media_container(instagram_account_id: str, image_url: str,
         'access_token': access_token
     }
     
-    response = requests.post(url, params=params)
+    response = transport.post(url, params=params)
     
     if response.status_code == 200:
         result = response.json()
         return result.get('id')  # Creation ID
     else:
-        raise Exception(f"Failed to create media container: {response.text}")
+        raise _graph_error("Failed to create media container", response)
 
 
 def publish_instagram_media(instagram_account_id: str, creation_id: str, access_token: str) -> dict:
@@ -91,12 +161,38 @@ def publish_instagram_media(instagram_account_id: str, creation_id: str, access_
         'access_token': access_token
     }
     
-    response = requests.post(url, params=params)
+    response = transport.post(url, params=params)
     
     if response.status_code == 200:
         return response.json()
     else:
-        raise Exception(f"Failed to publish media: {response.text}")
+        raise _graph_error("Failed to publish media", response)
+
+
+def get_media_container_status(creation_id: str, access_token: str) -> str:
+    """
+    Look up the status of an Instagram media container.
+    
+    Args:
+        creation_id: Creation ID from create_instagram_media_container
+        access_token: Page Access Token with Instagram permissions
+        
+    Returns:
+        Status code: "EXPIRED", "ERROR", "FINISHED", "IN_PROGRESS" or "PUBLISHED"
+    """
+    url = f"https://graph.facebook.com/v18.0/{creation_id}"
+    
+    params = {
+        'fields': 'status_code',
+        'access_token': access_token
+    }
+    
+    response = transport.get(url, params=params)
+    
+    if response.status_code == 200:
+        return response.json().get('status_code')
+    else:
+        raise _graph_error("Failed to get media container status", response)
 
 
 def get_instagram_business_account_id(page_id: str, access_token: str) -> str:
@@ -117,7 +213,7 @@ def get_instagram_business_account_id(page_id: str, access_token: str) -> str:
         'access_token': access_token
     }
     
-    response = requests.get(url, params=params)
+    response = transport.get(url, params=params)
     
     if response.status_code == 200:
         result = response.json()
@@ -127,7 +223,7 @@ def get_instagram_business_account_id(page_id: str, access_token: str) -> str:
         else:
             raise Exception("No Instagram Business Account linked to this Facebook Page")
     else:
-        raise Exception(f"Failed to get Instagram account: {response.text}")
+        raise _graph_error("Failed to get Instagram account", response)
 
 
 def get_image_url_from_facebook_photo(photo_id: str, access_token: str) -> str:
@@ -148,7 +244,7 @@ def get_image_url_from_facebook_photo(photo_id: str, access_token: str) -> str:
         'access_token': access_token
     }
     
-    response = requests.get(url, params=params)
+    response = transport.get(url, params=params)
     
     if response.status_code == 200:
         result = response.json()
@@ -159,7 +255,24 @@ def get_image_url_from_facebook_photo(photo_id: str, access_token: str) -> str:
         else:
             raise Exception("No images found for photo ID")
     else:
-        raise Exception(f"Failed to get image URL: {response.text}")
+        raise _graph_error("Failed to get image URL", response)
+
+
+def _github_headers() -> dict:
+    return {
+        "Authorization": f"token {config.GITHUB_TOKEN}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+
+
+def github_hosting_configured() -> bool:
+    """
+    Check whether GitHub image hosting credentials are set.
+    
+    Returns:
+        True if GITHUB_TOKEN and GITHUB_USERNAME are configured
+    """
+    return bool(config.GITHUB_TOKEN and config.GITHUB_USERNAME)
 
 
 def get_github_default_branch(username: str, repo: str) -> str:
@@ -171,19 +284,20 @@ def get_github_default_branch(username: str, repo: str) -> str:
         repo: Repository name
         
     Returns:
-        Default branch name (usually "main" or "master")
+        Default branch name (usually "main" or "master"), cached per process
     """
-    headers = {
-        "Authorization": f"token {config.GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    cached_branch = _github_default_branches.get((username, repo))
+    if cached_branch:
+        return cached_branch
     
     url = f"https://api.github.com/repos/{username}/{repo}"
-    response = requests.get(url, headers=headers)
+    response = transport.get(url, headers=_github_headers())
     
     if response.status_code == 200:
         repo_info = response.json()
-        return repo_info.get("default_branch", "main")
+        branch = repo_info.get("default_branch", "main")
+        _github_default_branches[(username, repo)] = branch
+        return branch
     else:
         # Default to "main" if can't determine
         return "main"
@@ -200,10 +314,7 @@ def upload_image_to_github(image_path: str, filename: str) -> str:
     Returns:
         Raw GitHub URL of the uploaded image
     """
-    if not config.GITHUB_TOKEN:
-        raise ValueError("GITHUB_TOKEN not set in .env file")
-    if not config.GITHUB_USERNAME:
-        raise ValueError("GITHUB_USERNAME not set in .env file")
+    config.require("github")
     
     repo = config.GITHUB_REPO
     username = config.GITHUB_USERNAME
@@ -215,16 +326,14 @@ def upload_image_to_github(image_path: str, filename: str) -> str:
     with open(image_path, 'rb') as f:
         image_content = f.read()
         image_base64 = base64.b64encode(image_content).decode('utf-8')
+    metrics.add_bytes("upload", len(image_content))
     
     # GitHub API endpoint to create/update file
     # Store images in images/ directory in the repo
     github_path = f"images/{filename}"
     url = f"https://api.github.com/repos/{username}/{repo}/contents/{github_path}"
     
-    headers = {
-        "Authorization": f"token {config.GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    headers = _github_headers()
     
     # Commit message
     commit_message = f"Upload image: {filename}"
@@ -235,16 +344,22 @@ def upload_image_to_github(image_path: str, filename: str) -> str:
         "branch": default_branch
     }
     
-    # Check if file already exists (to get sha for update)
-    response = requests.get(url, headers=headers, params={"ref": default_branch})
-    if response.status_code == 200:
-        existing_file = response.json()
-        data["sha"] = existing_file["sha"]  # Include SHA to update existing file
+    # Check if file already exists (to get sha for update). Timestamped
+    # filenames from utils.generate_image_filename are unique, and an
+    # existing content-addressed file already has these bytes, so skip it.
+    content_addressed = bool(_CONTENT_NAME_PATTERN.match(filename))
+    if not content_addressed and not _UNIQUE_FILENAME_PATTERN.search(filename):
+        response = transport.get(url, headers=headers, params={"ref": default_branch})
+        if response.status_code == 200:
+            existing_file = response.json()
+            data["sha"] = existing_file["sha"]  # Include SHA to update existing file
     
     # Upload file
-    response = requests.put(url, headers=headers, json=data)
+    response = transport.put(url, headers=headers, json=data)
     
-    if response.status_code in [200, 201]:
+    # 422 without a sha means the file exists; with a content-addressed
+    # name that is the same image, so it counts as uploaded
+    if response.status_code in [200, 201] or (content_addressed and response.status_code == 422):
         # Return raw GitHub URL
         raw_url = f"https://raw.githubusercontent.com/{username}/{repo}/{default_branch}/{github_path}"
         return raw_url
@@ -256,6 +371,119 @@ def upload_image_to_github(image_path: str, filename: str) -> str:
             raise Exception(f"Failed to upload to GitHub: {response.status_code} - {error_msg}")
 
 
+def _github_api(method: str, path: str, **kwargs) -> dict:
+    """
+    Call the GitHub REST API for the configured image repository.
+    
+    Args:
+        method: HTTP method
+        path: Path below /repos/{username}/{repo}/
+        **kwargs: Passed through to requests (e.g. json=...)
+        
+    Returns:
+        Decoded JSON response
+    """
+    url = f"https://api.github.com/repos/{config.GITHUB_USERNAME}/{config.GITHUB_REPO}/{path}"
+    response = transport.request(method, url, headers=_github_headers(), **kwargs)
+    if response.status_code not in [200, 201]:
+        raise Exception(f"GitHub API {method} {path} failed: {response.status_code} - {response.text}")
+    return response.json()
+
+
+def upload_images_to_github_bulk(image_paths: List[str], message: str = None) -> Dict[str, str]:
+    """
+    Upload many images to GitHub in a single commit using the Git Data API.
+    
+    Creates one blob per image (concurrently), then one tree, one commit and
+    one ref update for the whole set, instead of three requests and one
+    commit per image. If the branch moved while uploading, the commit is
+    rebuilt on the new head once.
+    
+    Images are stored under their content-addressed name. Images whose
+    bytes are already hosted on GitHub (see image_store) and duplicates
+    within the set are not uploaded again. PNG and WEBP images are uploaded
+    as JPEG copies (see publishable_image).
+    
+    Args:
+        image_paths: Local image paths; each is stored as images/<digest><ext>
+        message: Optional commit message
+        
+    Returns:
+        Dictionary mapping each local path to its raw GitHub URL
+    """
+    config.require("github")
+    if not image_paths:
+        return {}
+    
+    repo = config.GITHUB_REPO
+    username = config.GITHUB_USERNAME
+    
+    # Results stay keyed by the given paths; what's uploaded is the JPEG
+    jpeg_paths = {image_path: publishable_image(image_path) for image_path in image_paths}
+    
+    raw_urls = {}
+    names = {}
+    for image_path, jpeg_path in jpeg_paths.items():
+        hosted_url = image_store.lookup(jpeg_path, "github")
+        if hosted_url:
+            raw_urls[image_path] = hosted_url
+        else:
+            names.setdefault(image_store.content_name(jpeg_path), jpeg_path)
+    if not names:
+        return raw_urls
+    
+    default_branch = get_github_default_branch(username, repo)
+    
+    def create_blob(image_path: str) -> str:
+        with open(image_path, 'rb') as f:
+            image_content = f.read()
+        metrics.add_bytes("upload", len(image_content))
+        image_base64 = base64.b64encode(image_content).decode('utf-8')
+        blob = _github_api("POST", "git/blobs", json={"content": image_base64, "encoding": "base64"})
+        return blob["sha"]
+    
+    with ThreadPoolExecutor(max_workers=max(1, config.UPLOAD_CONCURRENCY)) as executor:
+        blob_shas = list(executor.map(metrics.bind(create_blob), names.values()))
+    
+    tree_entries = [
+        {
+            "path": f"images/{name}",
+            "mode": "100644",
+            "type": "blob",
+            "sha": blob_sha
+        }
+        for name, blob_sha in zip(names, blob_shas)
+    ]
+    message = message or f"Upload {len(tree_entries)} images"
+    
+    for attempt in range(2):
+        head_sha = _github_api("GET", f"git/ref/heads/{default_branch}")["object"]["sha"]
+        base_tree_sha = _github_api("GET", f"git/commits/{head_sha}")["tree"]["sha"]
+        tree = _github_api("POST", "git/trees", json={"base_tree": base_tree_sha, "tree": tree_entries})
+        commit = _github_api("POST", "git/commits", json={
+            "message": message,
+            "tree": tree["sha"],
+            "parents": [head_sha]
+        })
+        try:
+            _github_api("PATCH", f"git/refs/heads/{default_branch}", json={"sha": commit["sha"]})
+            break
+        except Exception:
+            # Not a fast-forward: someone pushed meanwhile; retry on the new head
+            if attempt == 1:
+                raise
+    
+    urls_by_name = {
+        name: f"https://raw.githubusercontent.com/{username}/{repo}/{default_branch}/images/{name}"
+        for name in names
+    }
+    for name, image_path in names.items():
+        image_store.record(image_path, urls_by_name[name], "github")
+    for image_path, jpeg_path in jpeg_paths.items():
+        raw_urls.setdefault(image_path, urls_by_name[image_store.content_name(jpeg_path)])
+    return raw_urls
+
+
 def get_page_access_token(page_id: str, user_access_token: str) -> str:
     """
     Get Page Access Token from User Access Token.
@@ -273,16 +501,239 @@ def get_page_access_token(page_id: str, user_access_token: str) -> str:
         'access_token': user_access_token
     }
     
-    response = requests.get(url, params=params)
+    response = transport.get(url, params=params)
     
     if response.status_code == 200:
         result = response.json()
         return result.get('access_token')
     else:
-        raise Exception(f"Failed to get page access token: {response.text}")
+        raise _graph_error("Failed to get page access token", response)
+
+
+def _credentials_cache_key(page_id: str, user_access_token: str) -> str:
+    # Identifies the credentials the cache entry was fetched with, without
+    # storing the user token itself
+    return hashlib.sha256(f"{page_id}:{user_access_token}".encode("utf-8")).hexdigest()
+
+
+def invalidate_credentials_cache():
+    """
+    Forget the cached Page Access Token and Instagram Business Account ID.
+    """
+    with _credentials_cache_lock:
+        try:
+            os.remove(config.CREDENTIALS_CACHE_PATH)
+        except FileNotFoundError:
+            pass
+
+
+def get_publishing_identity(page_id: str, user_access_token: str, refresh: bool = False) -> Tuple[str, str, bool]:
+    """
+    Get the Page Access Token and Instagram Business Account ID, from the
+    on-disk cache when possible.
+    
+    Cached values are reused until config.CREDENTIALS_CACHE_TTL_HOURS have
+    passed or the configured page/user token changes.
+    
+    Args:
+        page_id: Facebook Page ID
+        user_access_token: User Access Token with pages permissions
+        refresh: Ignore the cache and fetch fresh values
+        
+    Returns:
+        Tuple of (page access token, Instagram account ID, whether it came from the cache)
+    """
+    key = _credentials_cache_key(page_id, user_access_token)
+    
+    with _credentials_cache_lock:
+        if not refresh and os.path.exists(config.CREDENTIALS_CACHE_PATH):
+            try:
+                with open(config.CREDENTIALS_CACHE_PATH, "r", encoding="utf-8") as f:
+                    cached = json.load(f)
+                age_hours = (time.time() - cached["fetched_at"]) / 3600
+                if cached["key"] == key and age_hours < config.CREDENTIALS_CACHE_TTL_HOURS:
+                    return cached["page_access_token"], cached["instagram_account_id"], True
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+        
+        # Get Page Access Token from User Access Token
+        print("Getting Page Access Token...")
+        page_access_token = get_page_access_token(page_id, user_access_token)
+        print("✓ Page Access Token obtained")
+        
+        # Get Instagram Business Account ID from Page (more reliable than hardcoded)
+        print("Getting Instagram Business Account ID...")
+        instagram_account_id = get_instagram_business_account_id(page_id, page_access_token)
+        print(f"✓ Instagram Account ID: {instagram_account_id}")
+        
+        # The file holds a live token: create it readable by the owner only
+        os.makedirs(os.path.dirname(config.CREDENTIALS_CACHE_PATH) or ".", exist_ok=True)
+        tmp_path = config.CREDENTIALS_CACHE_PATH + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({
+                "key": key,
+                "page_access_token": page_access_token,
+                "instagram_account_id": instagram_account_id,
+                "fetched_at": time.time()
+            }, f)
+        os.replace(tmp_path, config.CREDENTIALS_CACHE_PATH)
+        
+        return page_access_token, instagram_account_id, False
+
+
+def publishable_image(image_path: str) -> str:
+    """
+    A JPEG version of an image, for hosting. Instagram's Graph API only
+    accepts JPEG, so a PNG or WEBP image (OUTPUT_FORMAT) is converted to a
+    copy in config.PUBLISH_IMAGES_DIR. The copy carries the source's
+    modification time and is reused until the source changes (e.g. a
+    rerender).
+    
+    Args:
+        image_path: Local path to the image file
+        
+    Returns:
+        image_path itself if it is a JPEG, otherwise the JPEG copy's path
+    """
+    if os.path.splitext(image_path)[1].lower() in (".jpg", ".jpeg"):
+        return image_path
+    
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    path = os.path.join(config.PUBLISH_IMAGES_DIR, stem + ".jpg")
+    source_mtime = os.stat(image_path).st_mtime_ns
+    if os.path.exists(path) and os.stat(path).st_mtime_ns == source_mtime:
+        return path
+    
+    from PIL import Image
+    
+    print(f"Converting {os.path.basename(image_path)} to JPEG for Instagram...")
+    os.makedirs(config.PUBLISH_IMAGES_DIR, exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with Image.open(image_path) as image:
+        image.convert("RGB").save(temp_path, "JPEG", quality=config.OUTPUT_QUALITY, progressive=True)
+    os.utime(temp_path, ns=(source_mtime, source_mtime))
+    os.replace(temp_path, path)
+    return path
+
+
+def public_image_url(image_path: str) -> Optional[str]:
+    """
+    URL of an image on the built-in image server (see image_server.py).
+    
+    Args:
+        image_path: Local path to the image file
+        
+    Returns:
+        URL under config.PUBLIC_IMAGE_BASE_URL, or None if that isn't set or
+        the image is outside config.IMAGES_DIR
+    """
+    if not config.PUBLIC_IMAGE_BASE_URL:
+        return None
+    images_dir = os.path.abspath(config.IMAGES_DIR)
+    # Check the source before converting it: only library images are served
+    if os.path.relpath(os.path.abspath(image_path), images_dir).startswith(os.pardir):
+        return None
+    relative_path = os.path.relpath(os.path.abspath(publishable_image(image_path)), images_dir)
+    return f"{config.PUBLIC_IMAGE_BASE_URL}/{quote(relative_path.replace(os.sep, '/'))}"
+
+
+def _public_image_urls(image_paths: List[str]) -> Dict[str, str]:
+    urls = {path: public_image_url(path) for path in image_paths}
+    return {path: url for path, url in urls.items() if url}
+
+
+def _host_image(image_path: str, image_url: Optional[str], page_access_token: str) -> str:
+    """
+    Make sure the image has a public URL Instagram can fetch.
+    
+    Args:
+        image_path: Local path to the image file
+        image_url: URL the image is already hosted at, if any
+        page_access_token: Page Access Token for the Facebook fallback
+        
+    Returns:
+        Public image URL
+    """
+    image_path = publishable_image(image_path)
+    
+    # Served by the built-in image server: nothing to upload
+    image_url = image_url or public_image_url(image_path)
+    
+    # The same bytes were hosted before (a retry or a re-post)
+    if not image_url:
+        image_url = image_store.lookup(image_path)
+        if image_url:
+            print(f"✓ Image already hosted: {image_url}")
+    
+    # Get image URL (unless already hosted) - Try GitHub upload first
+    # (doesn't require pages_manage_posts), fallback to Facebook upload
+    # if GitHub not configured
+    
+    # Try GitHub upload first (works without pages_manage_posts permission)
+    if not image_url and github_hosting_configured():
+        try:
+            print("Uploading image to GitHub...")
+            image_url = upload_image_to_github(image_path, image_store.content_name(image_path))
+            image_store.record(image_path, image_url, "github")
+            print(f"✓ Image uploaded to GitHub: {image_url}")
+        except Exception as e:
+            print(f"Warning: GitHub upload failed: {str(e)}")
+            image_url = None
+    
+    # Fallback to Facebook upload if GitHub failed or not configured
+    if not image_url:
+        try:
+            print("Uploading image to Facebook...")
+            photo_id = upload_image_to_facebook(image_path, page_access_token, config.FACEBOOK_PAGE_ID)
+            
+            print("Getting image URL...")
+            image_url = get_image_url_from_facebook_photo(photo_id, page_access_token)
+            print("✓ Image uploaded and URL obtained")
+        except Exception as e:
+            # Let token errors through so the caller can refresh credentials
+            if isinstance(e, GraphAPIError) and e.is_auth_error:
+                raise
+            raise Exception(f"Failed to upload image: {str(e)}")
+    
+    return image_url
+
+
+def _run_with_identity(action: Callable[[str, str], dict]) -> dict:
+    """
+    Run a publishing action with the Page Access Token and Instagram account ID.
+    
+    Cached credentials may have been revoked: if the action fails with a
+    Graph API auth error while using cached values, fresh ones are fetched
+    and the action runs once more.
+    
+    Args:
+        action: Function called with (page_access_token, instagram_account_id)
+        
+    Returns:
+        The action's result
+    """
+    config.require("facebook_page")
+    
+    for attempt in range(2):
+        page_access_token, instagram_account_id, from_cache = get_publishing_identity(
+            config.FACEBOOK_PAGE_ID, config.INSTAGRAM_ACCESS_TOKEN, refresh=attempt > 0
+        )
+        
+        # Fallback to configured ID if fetching fails
+        if not instagram_account_id:
+            instagram_account_id = config.INSTAGRAM_BUSINESS_ACCOUNT_ID or "24947725968239405"
+        
+        try:
+            return action(page_access_token, instagram_account_id)
+        except GraphAPIError as e:
+            if not (e.is_auth_error and from_cache) or attempt > 0:
+                raise
+            print("Cached Page Access Token was rejected, fetching a new one...")
+            invalidate_credentials_cache()
 
 
-def upload_to_instagram(image_path: str, caption: str, hashtags: str = "") -> dict:
+def upload_to_instagram(image_path: str, caption: str, hashtags: str = "", image_url: str = None) -> dict:
     """
     Upload an image to Instagram using Instagram Graph API.
     
@@ -290,6 +741,8 @@ def upload_to_instagram(image_path: str, caption: str, hashtags: str = "") -> di
         image_path: Path to the image file
         caption: Caption text for the post
         hashtags: Optional hashtags to append to the caption
+        image_url: Optional public URL the image is already hosted at
+            (e.g. from upload_images_to_github_bulk); skips hosting
         
     Returns:
         Dictionary with upload result information
@@ -298,83 +751,338 @@ def upload_to_instagram(image_path: str, caption: str, hashtags: str = "") -> di
         raise ValueError(f"Image file not found: {image_path}")
     
     # Check for required credentials
-    if not config.INSTAGRAM_ACCESS_TOKEN:
-        raise ValueError("INSTAGRAM_ACCESS_TOKEN not set in .env file")
+    config.require("instagram")
     
     try:
-        user_access_token = config.INSTAGRAM_ACCESS_TOKEN
+        # Combine caption and hashtags
+        instagram_caption = caption
+        if hashtags:
+            instagram_caption = f"{caption}\n\n{hashtags}"
         
-        # Get Page Access Token from User Access Token
-        if config.FACEBOOK_PAGE_ID:
-            print("Getting Page Access Token...")
-            page_access_token = get_page_access_token(config.FACEBOOK_PAGE_ID, user_access_token)
-            print("✓ Page Access Token obtained")
+        hosted_url = [image_url]
+        
+        def publish(page_access_token: str, instagram_account_id: str) -> dict:
+            # Remember the hosted URL so a credential retry doesn't re-upload
+            with metrics.span("hosting"):
+                hosted_url[0] = _host_image(image_path, hosted_url[0], page_access_token)
             
-            # Get Instagram Business Account ID from Page (more reliable than hardcoded)
-            print("Getting Instagram Business Account ID...")
-            instagram_account_id = get_instagram_business_account_id(config.FACEBOOK_PAGE_ID, page_access_token)
-            print(f"✓ Instagram Account ID: {instagram_account_id}")
-        else:
-            raise ValueError("FACEBOOK_PAGE_ID not set in .env file")
+            # Step 3: Create Instagram media container
+            # Use Page Access Token for Instagram API (it should work for both Facebook and Instagram)
+            print("Creating Instagram media container...")
+            with metrics.span("container"):
+                creation_id = create_instagram_media_container(
+                    instagram_account_id, 
+                    hosted_url[0], 
+                    instagram_caption, 
+                    page_access_token
+                )
+            
+            # Step 4: Publish the media
+            print("Publishing to Instagram...")
+            with metrics.span("publish"):
+                return publish_instagram_media(instagram_account_id, creation_id, page_access_token)
         
-        # Fallback to configured ID if fetching fails
-        if not instagram_account_id:
-            instagram_account_id = config.INSTAGRAM_BUSINESS_ACCOUNT_ID or "24947725968239405"
+        published_media = _run_with_identity(publish)
         
-        # Combine caption and hashtags
+        return {
+            "success": True,
+            "media_id": published_media.get('id'),
+            "message": "Image uploaded successfully to Instagram"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "message": f"Failed to upload to Instagram: {str(e)}"
+        }
+
+
+def create_carousel_item_container(instagram_account_id: str, image_url: str, access_token: str) -> str:
+    """
+    Create a media container for one carousel slide.
+    
+    Args:
+        instagram_account_id: Instagram Business Account ID
+        image_url: Public URL of the slide image
+        access_token: Page Access Token with Instagram permissions
+        
+    Returns:
+        Creation ID of the slide container
+    """
+    url = f"https://graph.facebook.com/v18.0/{instagram_account_id}/media"
+    
+    params = {
+        'image_url': image_url,
+        'is_carousel_item': 'true',
+        'access_token': access_token
+    }
+    
+    response = transport.post(url, params=params)
+    
+    if response.status_code == 200:
+        return response.json().get('id')
+    else:
+        raise _graph_error("Failed to create carousel item container", response)
+
+
+def create_carousel_container(instagram_account_id: str, children: List[str], caption: str, access_token: str) -> str:
+    """
+    Create the parent CAROUSEL container from slide containers.
+    
+    Args:
+        instagram_account_id: Instagram Business Account ID
+        children: Creation IDs from create_carousel_item_container, in slide order
+        caption: Caption text for the post
+        access_token: Page Access Token with Instagram permissions
+        
+    Returns:
+        Creation ID for publishing
+    """
+    url = f"https://graph.facebook.com/v18.0/{instagram_account_id}/media"
+    
+    params = {
+        'media_type': 'CAROUSEL',
+        'children': ','.join(children),
+        'caption': caption,
+        'access_token': access_token
+    }
+    
+    response = transport.post(url, params=params)
+    
+    if response.status_code == 200:
+        return response.json().get('id')
+    else:
+        raise _graph_error("Failed to create carousel container", response)
+
+
+def _create_carousel(image_paths: List[str], caption: str, hosted_urls: Dict[str, str],
+                     page_access_token: str, instagram_account_id: str) -> str:
+    """
+    Host any remaining slides, then create the slide and CAROUSEL containers.
+    
+    Args:
+        image_paths: Slide image paths, in order
+        caption: Full caption including hashtags
+        hosted_urls: Mapping of image path to hosted URL; updated in place
+        page_access_token: Page Access Token
+        instagram_account_id: Instagram Business Account ID
+        
+    Returns:
+        Creation ID of the carousel container
+    """
+    with ThreadPoolExecutor(max_workers=min(len(image_paths), config.CAROUSEL_MAX_SLIDES)) as executor:
+        # Remaining images fall back to one-by-one hosting, concurrently
+        pending = [path for path in image_paths if not hosted_urls.get(path)]
+        with metrics.span("hosting"):
+            urls = executor.map(metrics.bind(lambda path: _host_image(path, None, page_access_token)), pending)
+            hosted_urls.update(zip(pending, urls))
+        
+        print(f"Creating {len(image_paths)} carousel item containers...")
+        with metrics.span("container"):
+            children = list(executor.map(
+                lambda path: create_carousel_item_container(instagram_account_id, hosted_urls[path], page_access_token),
+                image_paths
+            ))
+    
+    print("Creating carousel container...")
+    with metrics.span("container"):
+        return create_carousel_container(instagram_account_id, children, caption, page_access_token)
+
+
+def upload_carousel_to_instagram(image_paths: List[str], caption: str, hashtags: str = "",
+                                 image_urls: Dict[str, str] = None) -> dict:
+    """
+    Publish several images as one Instagram carousel post.
+    
+    Images are hosted concurrently (in a single GitHub commit when GitHub is
+    configured) and all slide containers are created in parallel before the
+    parent CAROUSEL container is created and published.
+    
+    Args:
+        image_paths: Paths to 2-10 image files, in slide order
+        caption: Caption text for the post
+        hashtags: Optional hashtags to append to the caption
+        image_urls: Optional mapping of image path to an already hosted URL
+        
+    Returns:
+        Dictionary with upload result information
+    """
+    if not 2 <= len(image_paths) <= config.CAROUSEL_MAX_SLIDES:
+        raise ValueError(f"A carousel needs 2-{config.CAROUSEL_MAX_SLIDES} images, got {len(image_paths)}")
+    for image_path in image_paths:
+        if not os.path.exists(image_path):
+            raise ValueError(f"Image file not found: {image_path}")
+    
+    # Check for required credentials
+    config.require("instagram")
+    
+    try:
         instagram_caption = caption
         if hashtags:
             instagram_caption = f"{caption}\n\n{hashtags}"
         
-        # Get image URL - Try GitHub upload first (doesn't require pages_manage_posts)
-        # Fallback to Facebook upload if GitHub not configured
-        image_url = None
+        hosted_urls = dict(_public_image_urls(image_paths), **(image_urls or {}))
         
-        # Try GitHub upload first (works without pages_manage_posts permission)
-        if config.GITHUB_TOKEN and config.GITHUB_USERNAME:
+        # Host everything not hosted yet; one commit for all of them on GitHub
+        missing = [path for path in image_paths if not hosted_urls.get(path)]
+        if missing and github_hosting_configured():
             try:
-                print("Uploading image to GitHub...")
-                filename = os.path.basename(image_path)
-                image_url = upload_image_to_github(image_path, filename)
-                print(f"✓ Image uploaded to GitHub: {image_url}")
+                print(f"Uploading {len(missing)} images to GitHub...")
+                with metrics.span("hosting"):
+                    hosted_urls.update(upload_images_to_github_bulk(missing))
+                print("✓ Carousel images uploaded to GitHub")
             except Exception as e:
                 print(f"Warning: GitHub upload failed: {str(e)}")
-                image_url = None
         
-        # Fallback to Facebook upload if GitHub failed or not configured
-        if not image_url:
+        def publish(page_access_token: str, instagram_account_id: str) -> dict:
+            creation_id = _create_carousel(image_paths, instagram_caption, hosted_urls,
+                                           page_access_token, instagram_account_id)
+            
+            print("Publishing to Instagram...")
+            with metrics.span("publish"):
+                return publish_instagram_media(instagram_account_id, creation_id, page_access_token)
+        
+        published_media = _run_with_identity(publish)
+        
+        return {
+            "success": True,
+            "media_id": published_media.get('id'),
+            "message": f"Carousel of {len(image_paths)} images uploaded successfully to Instagram"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "message": f"Failed to upload carousel to Instagram: {str(e)}"
+        }
+
+
+def prepare_instagram_post(image_paths: List[str], caption: str, hashtags: str = "",
+                           image_urls: Dict[str, str] = None) -> dict:
+    """
+    Host a post's images and create its media container without publishing.
+    
+    Used to stage scheduled posts ahead of time so that only the
+    media_publish call is left for the slot. Instagram discards unpublished
+    containers after 24 hours.
+    
+    Args:
+        image_paths: One image path, or 2-10 for a carousel, in order
+        caption: Caption text for the post
+        hashtags: Optional hashtags to append to the caption
+        image_urls: Optional mapping of image path to an already hosted URL
+        
+    Returns:
+        Dictionary with success, creation_id, image_urls (every hosted URL,
+        so a later retry doesn't re-host) and message
+    """
+    if len(image_paths) > 1 and not 2 <= len(image_paths) <= config.CAROUSEL_MAX_SLIDES:
+        raise ValueError(f"A carousel needs 2-{config.CAROUSEL_MAX_SLIDES} images, got {len(image_paths)}")
+    for image_path in image_paths:
+        if not os.path.exists(image_path):
+            raise ValueError(f"Image file not found: {image_path}")
+    
+    # Check for required credentials
+    config.require("instagram")
+    
+    hosted_urls = dict(_public_image_urls(image_paths), **(image_urls or {}))
+    try:
+        instagram_caption = caption
+        if hashtags:
+            instagram_caption = f"{caption}\n\n{hashtags}"
+        
+        missing = [path for path in image_paths if not hosted_urls.get(path)]
+        if len(missing) > 1 and github_hosting_configured():
             try:
-                print("Uploading image to Facebook...")
-                photo_id = upload_image_to_facebook(image_path, page_access_token, config.FACEBOOK_PAGE_ID)
-                
-                print("Getting image URL...")
-                image_url = get_image_url_from_facebook_photo(photo_id, page_access_token)
-                print("✓ Image uploaded and URL obtained")
+                print(f"Uploading {len(missing)} images to GitHub...")
+                with metrics.span("hosting"):
+                    hosted_urls.update(upload_images_to_github_bulk(missing))
             except Exception as e:
-                raise Exception(f"Failed to upload image: {str(e)}")
-        
-        # Step 3: Create Instagram media container
-        # Use Page Access Token for Instagram API (it should work for both Facebook and Instagram)
-        print("Creating Instagram media container...")
-        creation_id = create_instagram_media_container(
-            instagram_account_id, 
-            image_url, 
-            instagram_caption, 
-            page_access_token
-        )
+                print(f"Warning: GitHub upload failed: {str(e)}")
         
-        # Step 4: Publish the media
-        print("Publishing to Instagram...")
-        published_media = publish_instagram_media(instagram_account_id, creation_id, page_access_token)
+        def create(page_access_token: str, instagram_account_id: str) -> str:
+            if len(image_paths) > 1:
+                return _create_carousel(image_paths, instagram_caption, hosted_urls,
+                                        page_access_token, instagram_account_id)
+            image_path = image_paths[0]
+            with metrics.span("hosting"):
+                hosted_urls[image_path] = _host_image(image_path, hosted_urls.get(image_path), page_access_token)
+            print("Creating Instagram media container...")
+            with metrics.span("container"):
+                return create_instagram_media_container(
+                    instagram_account_id, hosted_urls[image_path], instagram_caption, page_access_token
+                )
+        
+        creation_id = _run_with_identity(create)
+        
+        return {
+            "success": True,
+            "creation_id": creation_id,
+            "image_urls": hosted_urls,
+            "message": "Media container created"
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "image_urls": hosted_urls,
+            "message": f"Failed to prepare Instagram post: {str(e)}"
+        }
+
+
+def publish_prepared_post(creation_id: str) -> dict:
+    """
+    Publish a media container created by prepare_instagram_post.
+    
+    If the publish call fails, the container's status is looked up before
+    anything is retried: a timeout or server error may come after Instagram
+    has already published the post.
+    
+    Args:
+        creation_id: Creation ID of the container
         
+    Returns:
+        Dictionary with upload result information; on failure,
+        container_status is the container's status ("EXPIRED" if it no
+        longer exists), or None if it couldn't be checked
+    """
+    config.require("instagram")
+    
+    try:
+        print("Publishing to Instagram...")
+        with metrics.span("publish"):
+            published_media = _run_with_identity(
+                lambda page_access_token, instagram_account_id: publish_instagram_media(
+                    instagram_account_id, creation_id, page_access_token
+                )
+            )
         return {
             "success": True,
             "media_id": published_media.get('id'),
-            "message": "Image uploaded successfully to Instagram"
+            "message": "Staged post published to Instagram"
         }
     except Exception as e:
+        if isinstance(e, GraphAPIError) and e.subcode in _CONTAINER_GONE_SUBCODES:
+            status = "EXPIRED"
+        else:
+            try:
+                status = _run_with_identity(
+                    lambda page_access_token, instagram_account_id: get_media_container_status(
+                        creation_id, page_access_token
+                    )
+                )
+            except Exception as status_error:
+                print(f"Warning: could not check the media container: {str(status_error)}")
+                status = None
+        if status == "PUBLISHED":
+            return {
+                "success": True,
+                "media_id": None,
+                "message": "Staged post was already published to Instagram"
+            }
         return {
             "success": False,
             "error": str(e),
-            "message": f"Failed to upload to Instagram: {str(e)}"
+            "container_status": status,
+            "message": f"Failed to publish staged post: {str(e)}"
         }
@@ -2,9 +2,10 @@
 CLI entry point for Instagram content generation pipeline.
 """
 
+import argparse
+import json
 import os
 import sys
-from datetime import datetime
 
 # Set UTF-8 encoding for stdout to handle emojis and special characters
 if sys.platform == "win32":
@@ -12,21 +13,525 @@ if sys.platform == "win32":
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 
 import config
-import prompts
-import caption_generator
-import image_generator
-import instagram_poster
+import history
+import response_cache
 import utils
 
+# Everything else (OpenAI, PIL, NumPy, HTTP clients) is imported by the
+# command that needs it, so e.g. `main.py history` starts in milliseconds.
+# benchmarks/startup.py guards the import time.
+
+
+USAGE = """usage: python main.py [--carousel N] [--variants K] [--no-cache] [theme ...]
+       python main.py <command> [options]
+
+Generate a post for a theme (prompted for if not given) and publish it.
+
+commands:
+  batch         Generate and publish posts for many themes concurrently
+  history       Query the post history
+  schedule      Publish posts at scheduled times
+  serve         Serve generated images over HTTP
+  duplicates    Index and check near-duplicate images
+  rerender      Re-apply the caption overlay from stored base images
+  thumbnails    Make thumbnails and contact sheets of the image library
+  metrics       Show or export per-stage timings
+  export-posts  Export the post log in the legacy posts.json format
+
+Run `python main.py <command> --help` for a command's options."""
+
+
+def require_openai() -> bool:
+    """
+    Check the OpenAI key before starting a command that generates posts.
+
+    Returns:
+        True if it is set; otherwise prints an error and returns False
+    """
+    try:
+        config.require("openai")
+        return True
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return False
+
+
+def run_batch_command(args):
+    """
+    Handle `python main.py batch <themes-file>`.
+
+    Args:
+        args: Command line arguments after the "batch" subcommand
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py batch",
+        description="Generate and publish posts for many themes concurrently."
+    )
+    parser.add_argument("themes_file", nargs="?", default="-",
+                        help="File with one theme per line, or - to read stdin (default)")
+    parser.add_argument("--workers", type=int, default=config.BATCH_WORKERS,
+                        help="Themes processed at the same time")
+    parser.add_argument("--openai-concurrency", type=int, default=config.OPENAI_CONCURRENCY,
+                        help="Max simultaneous OpenAI requests")
+    parser.add_argument("--upload-concurrency", type=int, default=config.UPLOAD_CONCURRENCY,
+                        help="Max simultaneous Instagram/GitHub uploads")
+    parser.add_argument("--carousel", type=int, default=1, metavar="N",
+                        help=f"Publish each theme as a carousel of N images (2-{config.CAROUSEL_MAX_SLIDES})")
+    parser.add_argument("--variants", type=int, default=config.IMAGE_VARIANTS, metavar="K",
+                        help=f"Request K images per slide and keep the best-scoring one (1-{config.MAX_IMAGE_VARIANTS})")
+    options = parser.parse_args(args)
+    if not valid_slide_count(options.carousel):
+        parser.error(f"--carousel must be between 2 and {config.CAROUSEL_MAX_SLIDES}")
+    if not 1 <= options.variants <= config.MAX_IMAGE_VARIANTS:
+        parser.error(f"--variants must be between 1 and {config.MAX_IMAGE_VARIANTS}")
+    if not require_openai():
+        return
+
+    import pipeline
+
+    themes = pipeline.read_themes(options.themes_file)
+    if not themes:
+        print("Error: No themes found.")
+        return
+
+    for theme in themes:
+        warn_repeated_theme(theme)
+
+    print(f"\nGenerating content for {len(themes)} themes with {options.workers} workers")
+    results = pipeline.run_batch(
+        themes,
+        workers=options.workers,
+        openai_concurrency=options.openai_concurrency,
+        upload_concurrency=options.upload_concurrency,
+        slides=options.carousel,
+        variants=options.variants
+    )
+    pipeline.print_batch_summary(results)
+
+
+def run_export_posts_command(args):
+    """
+    Handle `python main.py export-posts [output-file]`.
+
+    Args:
+        args: Command line arguments after the "export-posts" subcommand
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py export-posts",
+        description="Export the post log in the legacy posts.json format."
+    )
+    parser.add_argument("output_file", nargs="?", default=config.POSTS_JSON_PATH,
+                        help=f"Destination file (default {config.POSTS_JSON_PATH})")
+    options = parser.parse_args(args)
+
+    output_path = utils.export_posts_json(options.output_file)
+    print(f"Exported post log to: {output_path}")
+
+
+def run_history_command(args):
+    """
+    Handle `python main.py history ...`.
+
+    Args:
+        args: Command line arguments after the "history" subcommand
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py history",
+        description="Query the post history."
+    )
+    parser.add_argument("--json", action="store_true", help="Print entries as JSON lines")
+    queries = parser.add_subparsers(dest="query", required=True)
+
+    theme_parser = queries.add_parser("theme", help="Posts for a theme (normalized match)")
+    theme_parser.add_argument("theme", nargs="+")
+    theme_parser.add_argument("--days", type=int, help="Only the last N days")
+
+    failed_parser = queries.add_parser("failed", help="Posts that were not uploaded to Instagram")
+    failed_parser.add_argument("--since", help="ISO date/time lower bound")
+    failed_parser.add_argument("--until", help="ISO date/time upper bound")
+
+    range_parser = queries.add_parser("range", help="Posts in a time range")
+    range_parser.add_argument("--since", help="ISO date/time lower bound")
+    range_parser.add_argument("--until", help="ISO date/time upper bound")
+    range_parser.add_argument("--limit", type=int)
+
+    media_parser = queries.add_parser("media", help="Post with an Instagram media ID")
+    media_parser.add_argument("media_id")
+
+    queries.add_parser("rebuild", help="Rebuild the history index from the post log")
+    options = parser.parse_args(args)
+
+    if options.query == "rebuild":
+        print(f"Indexed {history.rebuild()} posts")
+        return
+    if options.query == "theme":
+        theme = " ".join(options.theme)
+        if options.days is not None:
+            posts = history.recent_theme_posts(theme, options.days)
+        else:
+            posts = history.find_by_theme(theme)
+    elif options.query == "failed":
+        posts = history.failed_uploads(options.since, options.until)
+    elif options.query == "range":
+        posts = history.posts_between(options.since, options.until, options.limit)
+    else:
+        post = history.find_by_media_id(options.media_id)
+        posts = [post] if post else []
+
+    for post in posts:
+        if options.json:
+            print(json.dumps(post, ensure_ascii=False))
+        else:
+            print(history.format_post(post))
+    if not options.json:
+        print(f"{len(posts)} posts")
+
+
+def run_schedule_command(args):
+    """
+    Handle `python main.py schedule ...`.
+
+    Args:
+        args: Command line arguments after the "schedule" subcommand
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py schedule",
+        description="Publish posts at scheduled times, generating them ahead of each slot."
+    )
+    actions = parser.add_subparsers(dest="action", required=True)
+
+    run_parser = actions.add_parser("run", help="Run the scheduler daemon")
+    run_parser.add_argument("schedule_file", help="Schedule file (see scheduler.py for the format)")
+    run_parser.add_argument("--once", action="store_true",
+                            help="Stage/publish whatever is due now, then exit (for cron)")
+    run_parser.add_argument("--serve", action="store_true",
+                            help="Also run the built-in image server (see `main.py serve`)")
+
+    actions.add_parser("status", help="Show the queue of staged and recent posts")
+    options = parser.parse_args(args)
+
+    import scheduler
+
+    if options.action == "run":
+        if options.serve:
+            import image_server
+            image_server.start_in_background()
+        try:
+            scheduler.run(options.schedule_file, once=options.once)
+        except (OSError, ValueError) as e:
+            print(f"Error: {str(e)}")
+        return
+
+    queue = scheduler.load_queue()
+    for item in sorted(queue.values(), key=lambda item: item["slot"]):
+        print(scheduler.format_item(item))
+    print(f"{len(queue)} queued posts")
+
+
+def run_serve_command(args):
+    """
+    Handle `python main.py serve`.
+
+    Args:
+        args: Command line arguments after the "serve" subcommand
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py serve",
+        description="Serve generated images over HTTP so Instagram can fetch them directly."
+    )
+    parser.add_argument("--host", default=config.IMAGE_SERVER_HOST, help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=config.IMAGE_SERVER_PORT, help="Port to listen on")
+    options = parser.parse_args(args)
+
+    import image_server
+
+    image_server.serve(options.host, options.port)
+
+
+def run_duplicates_command(args):
+    """
+    Handle `python main.py duplicates ...`.
+
+    Args:
+        args: Command line arguments after the "duplicates" subcommand
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py duplicates",
+        description="Manage the perceptual-hash index used to block near-duplicate images."
+    )
+    actions = parser.add_subparsers(dest="action", required=True)
+
+    backfill_parser = actions.add_parser("backfill", help="Index existing images")
+    backfill_parser.add_argument("directories", nargs="*", default=["images", config.IMAGES_DIR],
+                                 help=f"Directories to scan (default: images and {config.IMAGES_DIR})")
+
+    check_parser = actions.add_parser("check", help="List library images similar to an image")
+    check_parser.add_argument("image")
+    check_parser.add_argument("--max-distance", type=int, default=config.DUPLICATE_MAX_DISTANCE,
+                              help="Largest Hamming distance (of 64 bits) to report")
+    options = parser.parse_args(args)
+
+    import perceptual_index
+
+    if options.action == "backfill":
+        indexed, skipped = perceptual_index.backfill(options.directories)
+        print(f"Indexed {indexed} images ({skipped} unchanged, skipped)")
+        return
+
+    matches = perceptual_index.find_similar(perceptual_index.hash_file(options.image), options.max_distance)
+    matches = [(path, distance) for path, distance in matches
+               if os.path.abspath(path) != os.path.abspath(options.image)]
+    for path, distance in matches:
+        print(f"{distance:>3}  {path}")
+    print(f"{len(matches)} similar images")
+
+
+def run_rerender_command(args):
+    """
+    Handle `python main.py rerender ...`.
+
+    Args:
+        args: Command line arguments after the "rerender" subcommand
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py rerender",
+        description="Re-apply the caption overlay to logged posts from their stored base images "
+                    "(no OpenAI requests). Images already published on Instagram are not changed there."
+    )
+    parser.add_argument("images", nargs="*", help="Image paths of the posts to re-render")
+    parser.add_argument("--all", action="store_true", help="Re-render every post in the log")
+    parser.add_argument("--theme", help="Posts for a theme (normalized match)")
+    parser.add_argument("--since", help="ISO date/time lower bound")
+    parser.add_argument("--until", help="ISO date/time upper bound")
+    parser.add_argument("--media-id", help="Post with an Instagram media ID")
+    parser.add_argument("--caption", help="New overlay text (only when re-rendering a single post)")
+    parser.add_argument("--font-scale", type=float, help=f"Font size as a fraction of the width (default {config.OVERLAY_FONT_SCALE})")
+    parser.add_argument("--text-y", type=float, help=f"Top of the caption as a fraction of the height (default {config.OVERLAY_TEXT_Y})")
+    parser.add_argument("--shade", type=int, help=f"Darkness of the caption band, 0-255 (default {config.OVERLAY_SHADE})")
+    parser.add_argument("--text-color", help=f"Caption color, e.g. #FFFFFF or gold (default {config.OVERLAY_TEXT_COLOR})")
+    parser.add_argument("--output-dir", help="Write the images here instead of replacing the originals")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    options = parser.parse_args(args)
+
+    if not (options.images or options.all or options.theme or options.since or options.until or options.media_id):
+        parser.error("choose posts to re-render: image paths, --theme, --since/--until, --media-id or --all")
+
+    if options.media_id:
+        post = history.find_by_media_id(options.media_id)
+        posts = [post] if post else []
+    elif options.theme:
+        posts = history.find_by_theme(options.theme, since=options.since, until=options.until)
+    else:
+        posts = history.posts_between(options.since, options.until)
+    if options.images:
+        wanted = {os.path.normpath(path) for path in options.images}
+        posts = [post for post in posts if os.path.normpath(post.get("image_path") or "") in wanted]
+    if not posts:
+        print("No matching posts in the log.")
+        return
+    if options.caption and len(posts) > 1:
+        parser.error(f"--caption applies to a single post, but {len(posts)} match")
+
+    import rerender
+
+    style = {"font_scale": options.font_scale, "text_y": options.text_y,
+             "shade": options.shade, "text_color": options.text_color}
+    try:
+        result = rerender.rerender_posts(posts, caption=options.caption, style=style,
+                                         output_dir=options.output_dir, workers=options.workers)
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        return
+
+    for error in result["errors"]:
+        print(f"Warning: {error}")
+    if result["missing_base"]:
+        print(f"Skipped {len(result['missing_base'])} posts without a stored base image "
+              f"(generated before base images were kept)")
+    print(f"Re-rendered {len(result['rendered'])} images in {result['seconds']:.2f}s")
+
+
+def run_thumbnails_command(args):
+    """
+    Handle `python main.py thumbnails`.
+
+    Args:
+        args: Command line arguments after the "thumbnails" subcommand
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py thumbnails",
+        description=f"Make thumbnails and contact sheets for every image in {config.IMAGES_DIR}."
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Regenerate everything, even if up to date")
+    options = parser.parse_args(args)
+
+    import thumbnails
+
+    result = thumbnails.build(workers=options.workers, force=options.force)
+    for error in result["errors"]:
+        print(f"Warning: {error}")
+    thumbnails_failed = f", {result['thumbnails_failed']} failed" if result["thumbnails_failed"] else ""
+    sheets_failed = f", {result['sheets_failed']} failed" if result["sheets_failed"] else ""
+    print(f"Thumbnails: {result['thumbnails_made']} made{thumbnails_failed}, {result['thumbnails_skipped']} up to date "
+          f"({result['images']} images) -> {config.THUMBNAILS_DIR}")
+    print(f"Contact sheets: {result['sheets_made']} made{sheets_failed}, {result['sheets_skipped']} up to date "
+          f"-> {config.CONTACT_SHEETS_DIR}")
+    if result["removed"]:
+        print(f"Removed {result['removed']} files for images no longer in the library")
+    print(f"Done in {result['seconds']:.2f}s")
+
+
+def run_metrics_command(args):
+    """
+    Handle `python main.py metrics ...`.
+
+    Args:
+        args: Command line arguments after the "metrics" subcommand
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py metrics",
+        description="Per-stage timings, bytes and tokens over the most recent posts."
+    )
+    actions = parser.add_subparsers(dest="action", required=True)
+
+    show_parser = actions.add_parser("show", help="Print p50/p95 per stage")
+    show_parser.add_argument("--window", type=int, default=None,
+                             help=f"Recent posts to aggregate (default: {config.METRICS_WINDOW_POSTS})")
+    show_parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+
+    export_parser = actions.add_parser("export", help="Write a Prometheus text file for the node exporter")
+    export_parser.add_argument("--output", default=None,
+                               help="Output file (default: METRICS_TEXTFILE_PATH or outputs/metrics/instagram_pipeline.prom)")
+    export_parser.add_argument("--window", type=int, default=None,
+                               help=f"Recent posts to aggregate (default: {config.METRICS_WINDOW_POSTS})")
+    options = parser.parse_args(args)
+
+    import metrics
+
+    if options.action == "export":
+        path = metrics.export_textfile(options.output, window=options.window)
+        print(f"Metrics written to {path}")
+        return
+
+    summary = metrics.aggregate(metrics.recent_posts(options.window))
+    if options.json:
+        print(json.dumps(summary, indent=2))
+        return
+    if not summary["posts"]:
+        print("No posts with metrics yet")
+        return
+    print(f"{'stage':<22}{'p50 s':>9}{'p95 s':>9}{'posts':>7}")
+    for stage, stats in summary["stages"].items():
+        print(f"{stage:<22}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['count']:>7}")
+    transferred = summary["bytes"]
+    print(f"\n{summary['posts']} posts ({summary['uploaded']} uploaded), "
+          f"{transferred.get('download', 0) / 1e6:.1f} MB downloaded, {transferred.get('upload', 0) / 1e6:.1f} MB uploaded, "
+          f"{sum(summary['tokens'].values())} tokens")
+
+
+def valid_slide_count(slides: int) -> bool:
+    """
+    Check an image count: 1 for a single-image post, or a carousel size.
+
+    Args:
+        slides: Requested number of images
+
+    Returns:
+        True if Instagram accepts that many images in one post
+    """
+    return slides == 1 or 2 <= slides <= config.CAROUSEL_MAX_SLIDES
+
+
+def warn_repeated_theme(theme: str):
+    """
+    Print a warning if the theme was already posted recently.
+
+    Args:
+        theme: The content theme
+    """
+    try:
+        recent = history.recent_theme_posts(theme)
+    except Exception as e:
+        print(f"[WARNING] Could not check post history: {str(e)}")
+        return
+    if recent:
+        print(f"[WARNING] '{theme}' was already posted {len(recent)} time(s) in the last "
+              f"{config.REPEAT_THEME_WINDOW_DAYS} days (most recently {recent[-1].get('timestamp', '')[:16]})")
+
 
 def main():
     """Main CLI entry point."""
     # Ensure output directories exist
     utils.ensure_output_directories()
     
+    args = sys.argv[1:]
+    
+    # --no-cache: always call OpenAI, ignoring cached responses
+    if "--no-cache" in args:
+        args.remove("--no-cache")
+        response_cache.set_bypass(True)
+    
+    if args and args[0] in ("-h", "--help"):
+        print(USAGE)
+        return
+    if args and args[0] == "batch":
+        run_batch_command(args[1:])
+        return
+    if args and args[0] == "export-posts":
+        run_export_posts_command(args[1:])
+        return
+    if args and args[0] == "history":
+        run_history_command(args[1:])
+        return
+    if args and args[0] == "schedule":
+        run_schedule_command(args[1:])
+        return
+    if args and args[0] == "serve":
+        run_serve_command(args[1:])
+        return
+    if args and args[0] == "duplicates":
+        run_duplicates_command(args[1:])
+        return
+    if args and args[0] == "rerender":
+        run_rerender_command(args[1:])
+        return
+    if args and args[0] == "thumbnails":
+        run_thumbnails_command(args[1:])
+        return
+    if args and args[0] == "metrics":
+        run_metrics_command(args[1:])
+        return
+    
+    # --carousel N: publish N images as one carousel post
+    slides = 1
+    if "--carousel" in args:
+        index = args.index("--carousel")
+        try:
+            slides = int(args[index + 1])
+        except (IndexError, ValueError):
+            slides = 0
+        if not valid_slide_count(slides):
+            print(f"Error: --carousel must be followed by a number between 2 and {config.CAROUSEL_MAX_SLIDES}.")
+            return
+        del args[index:index + 2]
+    
+    # --variants K: request K images and keep the best-scoring one
+    variants = config.IMAGE_VARIANTS
+    if "--variants" in args:
+        index = args.index("--variants")
+        try:
+            variants = int(args[index + 1])
+        except (IndexError, ValueError):
+            variants = 0
+        if not 1 <= variants <= config.MAX_IMAGE_VARIANTS:
+            print(f"Error: --variants must be followed by a number between 1 and {config.MAX_IMAGE_VARIANTS}.")
+            return
+        del args[index:index + 2]
+    
     # Get theme from command line argument or prompt user
-    if len(sys.argv) > 1:
-        theme = " ".join(sys.argv[1:]).strip()
+    if args:
+        theme = " ".join(args).strip()
     else:
         print("\n=== Instagram Content Generator ===")
         theme = input("Enter a theme (e.g., 'life motivation', 'sunset travel'): ").strip()
@@ -34,69 +539,47 @@ def main():
     if not theme:
         print("Error: Theme cannot be empty.")
         return
+    if theme.startswith("-"):
+        print(f"Error: Unknown option {theme.split()[0]} (see `python main.py --help`).")
+        return
     
-    print(f"\nGenerating content for theme: {theme}")
-    print("Generating caption...")
-    
-    # Generate caption
-    caption_prompt_text = prompts.caption_prompt(theme)
-    caption = caption_generator.generate_caption(theme, caption_prompt_text)
-    
-    print("Generating hashtags...")
-    
-    # Generate hashtags
-    hashtag_prompt_text = prompts.hashtag_prompt(theme, caption)
-    hashtags = caption_generator.generate_hashtags(theme, caption, hashtag_prompt_text)
-    
-    print("Generating image...")
+    if not require_openai():
+        return
     
-    # Generate image with caption overlay
-    image_prompt_text = prompts.image_prompt(theme)
-    image_filename = utils.generate_image_filename(theme)
-    image_path = os.path.join(config.IMAGES_DIR, image_filename)
-    image_generator.generate_image(image_prompt_text, image_path, caption=caption)
+    import perceptual_index
+    import pipeline
     
-    # Upload to Instagram if credentials are available
-    instagram_result = None
-    if config.INSTAGRAM_ACCESS_TOKEN:
-        print("Uploading to Instagram...")
-        try:
-            instagram_result = instagram_poster.upload_to_instagram(image_path, caption, hashtags)
-            if instagram_result["success"]:
-                print(f"[SUCCESS] Uploaded to Instagram: {instagram_result['message']}")
-            else:
-                print(f"[WARNING] Instagram upload failed: {instagram_result['message']}")
-        except Exception as e:
-            print(f"[WARNING] Instagram upload error: {str(e)}")
-            instagram_result = {"success": False, "error": str(e)}
-    else:
-        print("[INFO] Instagram credentials not set - skipping upload")
+    warn_repeated_theme(theme)
+    print(f"\nGenerating content for theme: {theme}")
     
-    # Log post data
-    post_data = {
-        "theme": theme,
-        "caption": caption,
-        "hashtags": hashtags,
-        "image_path": image_path,
-        "timestamp": datetime.now().isoformat(),
-        "instagram_uploaded": instagram_result["success"] if instagram_result else False,
-        "instagram_media_id": instagram_result.get("media_id") if instagram_result and instagram_result.get("success") else None
-    }
-    utils.save_post_log(post_data)
+    try:
+        post_data = pipeline.run_post(theme, slides=slides, variants=variants)
+    except perceptual_index.DuplicateImageError as e:
+        print(f"\n[REJECTED] {str(e)}")
+        return
     
     # Print success summary
     print("\n" + "="*50)
     print("[SUCCESS] Content generated successfully!")
     print(f"Theme: {theme}")
-    print(f"Caption: {caption}")
-    print(f"Hashtags: {hashtags}")
-    print(f"Image saved to: {image_path}")
-    if instagram_result and instagram_result.get("success"):
-        print(f"Instagram: Uploaded successfully (Media ID: {instagram_result.get('media_id')})")
-    print(f"Post logged to: {config.POSTS_JSON_PATH}")
+    print(f"Caption: {post_data['caption']}")
+    print(f"Hashtags: {post_data['hashtags']}")
+    if post_data.get("image_paths"):
+        print(f"Carousel images saved to: {', '.join(post_data['image_paths'])}")
+    else:
+        print(f"Image saved to: {post_data['image_path']}")
+    print(f"Image: {pipeline.describe_image_fetch(post_data['image_fetch'])}")
+    if post_data.get("metrics"):
+        import metrics
+        print(f"Timings: {metrics.describe(post_data['metrics'])}")
+    if post_data["instagram_uploaded"]:
+        print(f"Instagram: Uploaded successfully (Media ID: {post_data['instagram_media_id']})")
+    cache_summary = pipeline.cache_summary()
+    if cache_summary:
+        print(cache_summary)
+    print(f"Post logged to: {config.POSTS_LOG_PATH}")
     print("="*50 + "\n")
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,348 @@
+"""
+Per-post timing spans, byte and token counters, and a Prometheus export.
+
+While a post is generated and published, its metrics are collected into a
+plain dictionary held in a context variable, so stages running on other
+threads (see pipeline.run_stages) record into the right post without
+passing anything around:
+
+    {"seconds": {"caption": 1.8, "image_request": 11.2, ...},
+     "bytes": {"download": 2318120, "upload": 1623041},
+     "tokens": {"prompt": 412, "completion": 96}}
+
+The dictionary is stored with the post log entry. Seconds are summed when
+a stage runs again for a post (regenerated duplicates, retries); for work
+running concurrently (image variants, carousel slides) the slowest branch
+counts, see merge_parallel. export_textfile() aggregates the recent entries into a
+Prometheus text file (p50/p95 per stage) for the node exporter's textfile
+collector.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import config
+
+# Stages in pipeline order, for display; unknown stages are listed after these
+STAGES = ("caption", "hashtags", "caption_and_hashtags", "image_request", "download", "resize",
+          "overlay", "encode", "hosting", "container", "publish", "generate", "upload")
+
+QUANTILES = (0.5, 0.95)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("post_metrics", default=None)
+_lock = threading.Lock()
+
+
+@contextmanager
+def collect(data: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Record metrics into a dictionary for the duration of the block.
+
+    Args:
+        data: Dictionary to record into, e.g. a post's existing "metrics"
+            entry to continue it (default: a new one)
+
+    Yields:
+        The dictionary being recorded into
+    """
+    data = {} if data is None else data
+    token = _current.set(data)
+    try:
+        yield data
+    finally:
+        _current.reset(token)
+
+
+def bind(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Make a function record into the current post's metrics when it runs on
+    another thread (thread pools don't carry context variables over).
+
+    Args:
+        func: Function to be submitted to an executor
+
+    Returns:
+        Wrapped function
+    """
+    data = _current.get()
+    if data is None:
+        return func
+
+    def bound(*args, **kwargs):
+        token = _current.set(data)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return bound
+
+
+def _add(group: str, name: str, value: float):
+    data = _current.get()
+    if data is None:
+        return
+    with _lock:
+        values = data.setdefault(group, {})
+        values[name] = values.get(name, 0) + value
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time a stage of the current post. Does nothing outside collect().
+
+    Args:
+        stage: Stage name, e.g. "caption" or "hosting"
+    """
+    if _current.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add("seconds", stage, round(time.perf_counter() - started, 4))
+
+
+def merge_parallel(parts: List[Dict[str, Any]]):
+    """
+    Add the metrics of branches that ran concurrently (image variants,
+    carousel slides) to the current post. Each stage counts the slowest
+    branch's seconds, roughly the group's wall time, rather than their sum;
+    bytes and tokens are summed. Does nothing outside collect().
+
+    Args:
+        parts: One metrics dictionary per branch (see collect)
+    """
+    data = _current.get()
+    if data is None:
+        return
+    with _lock:
+        seconds = data.setdefault("seconds", {})
+        for stage in {stage for part in parts for stage in part.get("seconds", {})}:
+            slowest = max(part.get("seconds", {}).get(stage, 0) for part in parts)
+            seconds[stage] = round(seconds.get(stage, 0) + slowest, 4)
+        for group in ("bytes", "tokens"):
+            for part in parts:
+                for name, value in part.get(group, {}).items():
+                    values = data.setdefault(group, {})
+                    values[name] = values.get(name, 0) + value
+
+
+def add_bytes(direction: str, count: int):
+    """
+    Count bytes transferred for the current post.
+
+    Args:
+        direction: "download" or "upload"
+        count: Number of bytes
+    """
+    _add("bytes", direction, int(count))
+
+
+def add_tokens(usage: Any):
+    """
+    Count OpenAI token usage for the current post.
+
+    Args:
+        usage: The usage object of an API response (may be None)
+    """
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", None)
+    if prompt is None:
+        prompt = getattr(usage, "input_tokens", None)  # Image API naming
+    completion = getattr(usage, "completion_tokens", None)
+    if completion is None:
+        completion = getattr(usage, "output_tokens", None)
+    if prompt:
+        _add("tokens", "prompt", int(prompt))
+    if completion:
+        _add("tokens", "completion", int(completion))
+
+
+def _ordered_stages(names) -> List[str]:
+    return [stage for stage in STAGES if stage in names] + sorted(set(names) - set(STAGES))
+
+
+def describe(data: Optional[Dict[str, Any]]) -> str:
+    """
+    One-line summary of a post's metrics.
+
+    Args:
+        data: A post's "metrics" entry
+
+    Returns:
+        e.g. "caption 1.8s, image_request 11.2s, ... | 2.2 MB down, 1.5 MB up | 508 tokens"
+    """
+    if not data:
+        return "no metrics"
+    seconds = data.get("seconds", {})
+    parts = [", ".join(f"{stage} {seconds[stage]:.1f}s" for stage in _ordered_stages(seconds))]
+    transferred = data.get("bytes", {})
+    if transferred:
+        parts.append(f"{transferred.get('download', 0) / 1e6:.1f} MB down, {transferred.get('upload', 0) / 1e6:.1f} MB up")
+    tokens = data.get("tokens", {})
+    if tokens:
+        parts.append(f"{sum(tokens.values())} tokens")
+    return " | ".join(part for part in parts if part)
+
+
+def quantile(values: List[float], q: float) -> float:
+    """
+    Quantile with linear interpolation between closest ranks.
+
+    Args:
+        values: Non-empty list of numbers
+        q: Quantile between 0 and 1
+
+    Returns:
+        The quantile
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def aggregate(posts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregate the metrics of many post log entries.
+
+    Args:
+        posts: Post log entries (entries without metrics are ignored)
+
+    Returns:
+        Dictionary with posts, uploaded, stages ({stage: {p50, p95, sum,
+        count}}), bytes and tokens (totals)
+    """
+    samples: Dict[str, List[float]] = {}
+    totals = {"bytes": {}, "tokens": {}}
+    measured = [post for post in posts if post.get("metrics")]
+    for post in measured:
+        for stage, seconds in post["metrics"].get("seconds", {}).items():
+            samples.setdefault(stage, []).append(seconds)
+        for group in totals:
+            for name, value in post["metrics"].get(group, {}).items():
+                totals[group][name] = totals[group].get(name, 0) + value
+
+    stages = {}
+    for stage in _ordered_stages(samples):
+        values = samples[stage]
+        stages[stage] = {f"p{int(q * 100)}": quantile(values, q) for q in QUANTILES}
+        stages[stage].update({"sum": sum(values), "count": len(values)})
+    return {
+        "posts": len(measured),
+        "uploaded": sum(1 for post in measured if post.get("instagram_uploaded")),
+        "stages": stages,
+        "bytes": totals["bytes"],
+        "tokens": totals["tokens"],
+    }
+
+
+def render_prometheus(summary: Dict[str, Any]) -> str:
+    """
+    Format aggregated metrics in the Prometheus text exposition format.
+
+    Every value describes the current window of recent posts and can go
+    down as old posts leave it, so all are gauges; the window's sum and
+    count get their own names rather than a summary's _sum/_count, which
+    Prometheus would treat as counters.
+
+    Args:
+        summary: Result of aggregate
+
+    Returns:
+        Text file contents
+    """
+    stages = summary["stages"].items()
+    lines = [
+        "# HELP instagram_pipeline_stage_seconds Quantiles of the time spent in each pipeline stage per post in the window.",
+        "# TYPE instagram_pipeline_stage_seconds gauge",
+    ]
+    for stage, stats in stages:
+        for q in QUANTILES:
+            lines.append(f'instagram_pipeline_stage_seconds{{stage="{stage}",quantile="{q:g}"}} '
+                         f'{stats[f"p{int(q * 100)}"]:.6g}')
+    lines += [
+        "# HELP instagram_pipeline_stage_seconds_window_sum Total time spent in each pipeline stage by the posts in the window.",
+        "# TYPE instagram_pipeline_stage_seconds_window_sum gauge",
+    ]
+    lines += [f'instagram_pipeline_stage_seconds_window_sum{{stage="{stage}"}} {stats["sum"]:.6g}' for stage, stats in stages]
+    lines += [
+        "# HELP instagram_pipeline_stage_seconds_window_count Posts in the window that ran each pipeline stage.",
+        "# TYPE instagram_pipeline_stage_seconds_window_count gauge",
+    ]
+    lines += [f'instagram_pipeline_stage_seconds_window_count{{stage="{stage}"}} {stats["count"]}' for stage, stats in stages]
+
+    lines += [
+        "# HELP instagram_pipeline_bytes Bytes transferred for the posts in the window.",
+        "# TYPE instagram_pipeline_bytes gauge",
+    ]
+    lines += [f'instagram_pipeline_bytes{{direction="{name}"}} {value}' for name, value in sorted(summary["bytes"].items())]
+    lines += [
+        "# HELP instagram_pipeline_tokens OpenAI tokens used for the posts in the window.",
+        "# TYPE instagram_pipeline_tokens gauge",
+    ]
+    lines += [f'instagram_pipeline_tokens{{kind="{name}"}} {value}' for name, value in sorted(summary["tokens"].items())]
+    lines += [
+        "# HELP instagram_pipeline_posts Posts in the window, and how many were uploaded.",
+        "# TYPE instagram_pipeline_posts gauge",
+        f'instagram_pipeline_posts{{state="generated"}} {summary["posts"]}',
+        f'instagram_pipeline_posts{{state="uploaded"}} {summary["uploaded"]}',
+        "# HELP instagram_pipeline_metrics_updated_seconds When this file was written.",
+        "# TYPE instagram_pipeline_metrics_updated_seconds gauge",
+        f"instagram_pipeline_metrics_updated_seconds {time.time():.0f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def recent_posts(window: int = None) -> List[Dict[str, Any]]:
+    """
+    The most recent post log entries that carry metrics.
+
+    Reads them from the history index, which only parses log lines appended
+    since its last sync, so exporting after every post stays cheap.
+
+    Args:
+        window: Number of recent entries to look at (default
+            config.METRICS_WINDOW_POSTS); older entries logged without
+            metrics are left out
+
+    Returns:
+        Post entries, oldest first
+    """
+    import history
+
+    window = window or config.METRICS_WINDOW_POSTS
+    return [post for post in history.latest_posts(window) if post.get("metrics")]
+
+
+def export_textfile(path: str = None, window: int = None) -> str:
+    """
+    Write p50/p95 per stage (and byte/token totals) over the recent posts to
+    a Prometheus text file. The file is replaced atomically, as the node
+    exporter's textfile collector requires.
+
+    Args:
+        path: Output file (default config.METRICS_TEXTFILE_PATH, or
+            outputs/metrics/instagram_pipeline.prom)
+        window: Number of recent posts to aggregate (default config.METRICS_WINDOW_POSTS)
+
+    Returns:
+        The path written
+    """
+    path = path or config.METRICS_TEXTFILE_PATH or os.path.join(config.OUTPUT_DIR, "metrics", "instagram_pipeline.prom")
+    text = render_prometheus(aggregate(recent_posts(window)))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Batch runs export from several threads at once
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+    return path
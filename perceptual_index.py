@@ -0,0 +1,261 @@
+"""
+Perceptual-hash index for spotting near-duplicate images.
+
+Each image gets a 64-bit difference hash (dHash) of the top part of the
+frame, above the caption band, so the same picture with a different caption
+still matches. Hashes are kept in a SQLite table and mirrored into a NumPy
+array, so a near-duplicate search over the whole library is one vectorized
+XOR + popcount, a few milliseconds even for tens of thousands of images.
+"""
+
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_hashes (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    hash INTEGER NOT NULL,
+    mtime REAL,
+    theme TEXT,
+    added_at TEXT NOT NULL
+);
+"""
+
+HASH_SIZE = 8  # 8x8 comparisons -> 64-bit hash
+# The caption band starts at ~60% of the height; hash only what's above it
+HASH_REGION = 0.55
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# In-memory mirror of the table: row ids, paths and hashes, loaded incrementally
+_lock = threading.Lock()
+_loaded_id = 0
+_paths: List[str] = []
+_hashes = np.zeros(0, dtype=np.uint64)
+
+# Popcount lookup for NumPy builds without np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class DuplicateImageError(Exception):
+    """
+    Raised when a generated image is too close to one already in the library.
+    """
+
+    def __init__(self, message: str, match_path: str = None, distance: int = None):
+        super().__init__(message)
+        self.match_path = match_path
+        self.distance = distance
+
+
+def compute_hash(image: Image.Image) -> int:
+    """
+    Compute the dHash of an image's region above the caption band.
+
+    Args:
+        image: PIL Image (any mode)
+
+    Returns:
+        64-bit hash as an int
+    """
+    width, height = image.size
+    region = image.crop((0, 0, width, max(1, int(height * HASH_REGION))))
+    small = region.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hash_file(path: str) -> int:
+    """
+    Compute the dHash of an image file.
+
+    JPEGs are decoded at reduced size (draft mode), which is enough for a
+    9x8 hash and several times faster than a full decode.
+
+    Args:
+        path: Image path
+
+    Returns:
+        64-bit hash as an int
+    """
+    with Image.open(path) as image:
+        image.draft("L", (HASH_SIZE * 16, HASH_SIZE * 16))
+        return compute_hash(image)
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(config.PERCEPTUAL_INDEX_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(config.PERCEPTUAL_INDEX_PATH, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _refresh(conn: sqlite3.Connection):
+    """
+    Append rows added since the last load (by any process) to the in-memory
+    arrays. Caller holds _lock.
+    """
+    global _loaded_id, _hashes
+    rows = conn.execute(
+        "SELECT id, path, hash FROM image_hashes WHERE id > ? ORDER BY id", (_loaded_id,)
+    ).fetchall()
+    if not rows:
+        return
+    _paths.extend(row[1] for row in rows)
+    new_hashes = np.array([row[2] for row in rows], dtype=np.int64).view(np.uint64)
+    _hashes = np.concatenate([_hashes, new_hashes])
+    _loaded_id = rows[-1][0]
+
+
+def add(path: str, image_hash: int, theme: str = None):
+    """
+    Add (or update) an image in the index.
+
+    Args:
+        path: Image path
+        image_hash: Hash from compute_hash or hash_file
+        theme: Optional theme the image was generated for
+    """
+    _add_many([(path, image_hash, theme)])
+
+
+def _add_many(entries: Iterable[Tuple[str, int, Optional[str]]]):
+    global _loaded_id, _paths, _hashes
+    now = datetime.now().isoformat()
+    rows = [
+        (path, _to_signed(image_hash), os.path.getmtime(path) if os.path.exists(path) else None, theme, now)
+        for path, image_hash, theme in entries
+    ]
+    if not rows:
+        return
+    with _lock:
+        conn = _connect()
+        try:
+            with conn:
+                replaced = conn.executemany(
+                    "DELETE FROM image_hashes WHERE path = ?", [(row[0],) for row in rows]
+                ).rowcount
+                conn.executemany(
+                    "INSERT INTO image_hashes (path, hash, mtime, theme, added_at) VALUES (?, ?, ?, ?, ?)", rows
+                )
+            # Replaced paths leave stale entries in memory; reload from scratch
+            if replaced:
+                _loaded_id, _paths, _hashes = 0, [], np.zeros(0, dtype=np.uint64)
+            _refresh(conn)
+        finally:
+            conn.close()
+
+
+def hamming_distances(image_hash: int, hashes: np.ndarray) -> np.ndarray:
+    """
+    Hamming distance between one hash and an array of hashes.
+
+    Args:
+        image_hash: 64-bit hash
+        hashes: uint64 array
+
+    Returns:
+        Array of bit distances
+    """
+    xor = np.bitwise_xor(hashes, np.uint64(image_hash))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor)
+    return _BYTE_POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def find_similar(image_hash: int, max_distance: int = None, limit: int = 5) -> List[Tuple[str, int]]:
+    """
+    Find library images within a Hamming distance of a hash.
+
+    Args:
+        image_hash: Hash of the image to check
+        max_distance: Largest distance that counts as similar
+            (default config.DUPLICATE_MAX_DISTANCE)
+        limit: Maximum number of matches returned
+
+    Returns:
+        (path, distance) pairs, closest first
+    """
+    max_distance = config.DUPLICATE_MAX_DISTANCE if max_distance is None else max_distance
+    with _lock:
+        conn = _connect()
+        try:
+            _refresh(conn)
+        finally:
+            conn.close()
+        paths, hashes = _paths, _hashes
+    if not len(hashes):
+        return []
+
+    distances = hamming_distances(image_hash, hashes)
+    matches = np.flatnonzero(distances <= max_distance)
+    if len(matches) > limit:
+        matches = matches[np.argpartition(distances[matches], limit)[:limit]]
+    matches = matches[np.argsort(distances[matches], kind="stable")]
+    return [(paths[i], int(distances[i])) for i in matches]
+
+
+def backfill(directories: List[str], workers: int = None) -> Tuple[int, int]:
+    """
+    Hash and index every image in some directories (not recursive).
+
+    Images already indexed with the same modification time are skipped, so
+    re-running only hashes new or changed files. Decoding runs on a thread
+    pool; Pillow releases the GIL while decoding.
+
+    Args:
+        directories: Directories to scan
+        workers: Hashing threads (default: CPU count)
+
+    Returns:
+        Tuple of (images indexed, images skipped as unchanged)
+    """
+    conn = _connect()
+    try:
+        indexed = dict(conn.execute("SELECT path, mtime FROM image_hashes"))
+    finally:
+        conn.close()
+
+    paths = []
+    skipped = 0
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            if indexed.get(path) == os.path.getmtime(path):
+                skipped += 1
+            else:
+                paths.append(path)
+
+    def hash_or_none(path: str) -> Optional[int]:
+        try:
+            return hash_file(path)
+        except Exception as e:
+            print(f"Warning: could not hash {path}: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 4) as executor:
+        hashes = list(executor.map(hash_or_none, paths))
+
+    entries = [(path, image_hash, None) for path, image_hash in zip(paths, hashes) if image_hash is not None]
+    _add_many(entries)
+    return len(entries), skipped
@@ -0,0 +1,611 @@
+"""
+Post pipeline: caption, hashtags, image and Instagram upload for one theme,
+plus a batch runner that processes many themes with a bounded worker pool.
+"""
+
+import os
+import sys
+import threading
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import config
+import prompts
+import response_cache
+import caption_generator
+import image_generator
+import image_scoring
+import instagram_poster
+import metrics
+import perceptual_index
+import utils
+
+# Image paths handed out in this process, so two workers on the same theme
+# within the same second don't overwrite each other's file
+_reserved_paths = set()
+_reserved_paths_lock = threading.Lock()
+
+
+def _reserve_image_path(theme: str) -> str:
+    """
+    Build a unique output path for a theme's image.
+
+    Args:
+        theme: The content theme
+
+    Returns:
+        Path inside config.IMAGES_DIR that no other worker has been given
+    """
+    filename = utils.generate_image_filename(theme)
+    stem, ext = os.path.splitext(filename)
+    with _reserved_paths_lock:
+        image_path = os.path.join(config.IMAGES_DIR, filename)
+        counter = 2
+        while image_path in _reserved_paths or os.path.exists(image_path):
+            image_path = os.path.join(config.IMAGES_DIR, f"{stem}_{counter}{ext}")
+            counter += 1
+        _reserved_paths.add(image_path)
+    return image_path
+
+
+def _run_stage(func: Callable[..., Any], dependencies: Dict[str, Future]) -> Any:
+    """
+    Wait for a stage's dependencies, then run it with their results.
+
+    Args:
+        func: Stage function, called with one keyword argument per dependency
+        dependencies: Mapping of dependency name to its future
+
+    Returns:
+        The stage function's result
+    """
+    inputs = {name: future.result() for name, future in dependencies.items()}
+    return func(**inputs)
+
+
+def run_stages(stages: Dict[str, Tuple[Callable[..., Any], List[str]]]) -> Dict[str, Any]:
+    """
+    Run a small graph of pipeline stages, overlapping independent ones.
+
+    Every stage gets its own thread and starts as soon as the stages it
+    depends on have finished. If a stage raises, stages depending on it
+    re-raise the same error. Stages record into the caller's post metrics
+    (see metrics.collect).
+
+    Args:
+        stages: Mapping of stage name to (function, dependency names).
+            Dependencies must appear earlier in the mapping.
+
+    Returns:
+        Mapping of stage name to result
+    """
+    futures = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(stages))) as executor:
+        for name, (func, dependencies) in stages.items():
+            dependency_futures = {dep: futures[dep] for dep in dependencies}
+            futures[name] = executor.submit(metrics.bind(_run_stage), func, dependency_futures)
+        return {name: future.result() for name, future in futures.items()}
+
+
+def fetch_image_variants(prompt: str,
+                         variants: int,
+                         log: Callable[[str], None] = print,
+                         openai_slots: Optional[threading.Semaphore] = None,
+                         refresh: bool = False) -> List[Tuple[Any, Dict[str, Any]]]:
+    """
+    Request several images for one prompt concurrently and rank them.
+
+    DALL-E 3 returns one image per request (n=1), so each variant is its own
+    request (and its own response cache entry). Variants are scored with
+    image_scoring.score_image as they arrive. A failed variant is skipped
+    as long as another one succeeds.
+
+    Args:
+        prompt: The image generation prompt
+        variants: Number of images to request; 1 skips scoring
+        log: Function used to print progress messages
+        openai_slots: Optional semaphore bounding concurrent OpenAI requests
+        refresh: Ignore cached images and request new ones
+
+    Returns:
+        List of (image, fetch stats) best first. With several variants the
+        stats include variant (its index) and variants (the scores of all
+        of them, best first).
+    """
+    openai_slot = openai_slots or nullcontext()
+
+    def fetch(variant):
+        stats = {"variant": variant}
+        with openai_slot:
+            image = image_generator.fetch_base_image(prompt, stats=stats, refresh=refresh, variant=variant)
+        if variants > 1:
+            stats["score"] = image_scoring.score_image(image)
+        return image, stats
+
+    if variants <= 1:
+        image, stats = fetch(0)
+        del stats["variant"]
+        return [(image, stats)]
+
+    # Each variant records its own metrics; merged as concurrent work
+    variant_metrics = [{} for _ in range(variants)]
+
+    def fetch_variant(variant):
+        with metrics.collect(variant_metrics[variant]):
+            return fetch(variant)
+
+    with ThreadPoolExecutor(max_workers=variants) as executor:
+        futures = [executor.submit(fetch_variant, variant) for variant in range(variants)]
+    metrics.merge_parallel(variant_metrics)
+    results = []
+    errors = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    if not results:
+        raise errors[0]
+    if errors:
+        log(f"[WARNING] {len(errors)} of {variants} image variants failed: {str(errors[0])}")
+
+    results.sort(key=lambda result: result[1]["score"]["score"], reverse=True)
+    ranking = [{"variant": stats["variant"], **stats.pop("score")} for _, stats in results]
+    for _, stats in results:
+        stats["variants"] = ranking
+    return results
+
+
+def generate_post(theme: str,
+                  log: Callable[[str], None] = print,
+                  openai_slots: Optional[threading.Semaphore] = None,
+                  slides: int = 1,
+                  variants: int = None) -> Dict[str, Any]:
+    """
+    Generate caption, hashtags and the final image(s) for one theme.
+
+    The image requests run alongside the caption and hashtag requests; each
+    overlay is applied once its base image and the caption are ready. For a
+    carousel (slides > 1) every slide gets its own image request and only
+    the first slide carries the caption overlay.
+
+    With variants > 1, that many images are requested concurrently for each
+    slide and the best-scoring one is kept (see fetch_image_variants).
+
+    Each base image, including one from the response cache, is checked
+    against the perceptual-hash index; a near-duplicate of a library image
+    is passed over for the next-best variant, or regenerated up to
+    config.DUPLICATE_RETRIES times, then rejected with DuplicateImageError.
+
+    Args:
+        theme: The content theme
+        log: Function used to print progress messages
+        openai_slots: Optional semaphore bounding concurrent OpenAI requests
+        slides: Number of images to generate
+        variants: Images requested per slide to pick from (default
+            config.IMAGE_VARIANTS)
+
+    Returns:
+        Dictionary with theme, caption, hashtags, image_path, base_image_path
+        (the first image without overlay), image_fetch, metrics (per-stage
+        seconds, bytes and tokens; see metrics.py) and, for carousels,
+        image_paths
+    """
+    variants = variants or config.IMAGE_VARIANTS
+    if not 1 <= variants <= config.MAX_IMAGE_VARIANTS:
+        raise ValueError(f"Image variants must be between 1 and {config.MAX_IMAGE_VARIANTS}")
+    openai_slot = openai_slots or nullcontext()
+    image_paths = [_reserve_image_path(theme) for _ in range(slides)]
+    image_fetches = [{} for _ in range(slides)]
+    image_hashes = [None] * slides
+    # Slides run concurrently; each records its own metrics, merged at the end
+    slide_metrics = [{} for _ in range(slides)]
+
+    def per_slide(func, index):
+        def run(**inputs):
+            with metrics.collect(slide_metrics[index]):
+                return func(index, **inputs)
+        return run
+
+    def caption_stage():
+        log("Generating caption...")
+        with openai_slot, metrics.span("caption"):
+            return caption_generator.generate_caption(theme, prompts.caption_prompt(theme))
+
+    def hashtags_stage(caption):
+        log("Generating hashtags...")
+        with openai_slot, metrics.span("hashtags"):
+            return caption_generator.generate_hashtags(theme, caption, prompts.hashtag_prompt(theme, caption))
+
+    def text_stage():
+        log("Generating caption and hashtags...")
+        with openai_slot, metrics.span("caption_and_hashtags"):
+            return caption_generator.generate_caption_and_hashtags(theme, prompts.caption_and_hashtags_prompt(theme))
+
+    def image_stage(index):
+        best_of = f" (best of {variants})" if variants > 1 else ""
+        if slides == 1:
+            log(f"Generating image{best_of}...")
+            prompt = prompts.image_prompt(theme)
+        else:
+            log(f"Generating image {index + 1}/{slides}{best_of}...")
+            prompt = prompts.carousel_image_prompt(theme, index + 1, slides)
+        # A near-duplicate of a library image is passed over for the next-best
+        # variant; if all are duplicates they're regenerated, bypassing the
+        # response cache (which would just return the same images again, e.g.
+        # when a theme is re-run and the cached image was already posted)
+        for attempt in range(config.DUPLICATE_RETRIES + 1):
+            candidates = fetch_image_variants(prompt, variants, log=log, openai_slots=openai_slots,
+                                              refresh=attempt > 0)
+            for image, fetch_stats in candidates:
+                image_hash = perceptual_index.compute_hash(image)
+                matches = perceptual_index.find_similar(image_hash) if config.DUPLICATE_CHECK else []
+                if not matches:
+                    if variants > 1:
+                        score = next(v["score"] for v in fetch_stats["variants"] if v["variant"] == fetch_stats["variant"])
+                        log(f"Picked image variant {fetch_stats['variant'] + 1}/{variants} (score {score:.2f})")
+                    image_fetches[index].update(fetch_stats)
+                    image_hashes[index] = image_hash
+                    if index == 0:
+                        # Keep the caption slide's base image for `main.py rerender`
+                        image_generator.save_base_image(image, image_paths[index])
+                    return image
+            match_path, distance = matches[0]
+            if attempt < config.DUPLICATE_RETRIES:
+                log(f"[WARNING] Image is a near-duplicate of {match_path} (distance {distance}), regenerating...")
+        raise perceptual_index.DuplicateImageError(
+            f"Image is still a near-duplicate of {match_path} (distance {distance}) "
+            f"after {config.DUPLICATE_RETRIES} regenerations",
+            match_path, distance
+        )
+
+    def render_stage(index, caption, **images):
+        log("Applying caption overlay..." if index == 0 else f"Saving image {index + 1}/{slides}...")
+        image_path = image_generator.finish_image(
+            images[f"image_{index}"], image_paths[index], caption=caption if index == 0 else None
+        )
+        perceptual_index.add(image_path, image_hashes[index], theme)
+        return image_path
+
+    stages = {}
+    for index in range(slides):
+        stages[f"image_{index}"] = (per_slide(image_stage, index), [])
+    if config.COMBINED_CAPTION_MODE:
+        stages["text"] = (text_stage, [])
+        stages["caption"] = (lambda text: text[0], ["text"])
+        stages["hashtags"] = (lambda text: text[1], ["text"])
+    else:
+        stages["caption"] = (caption_stage, [])
+        stages["hashtags"] = (hashtags_stage, ["caption"])
+    for index in range(slides):
+        stages[f"render_{index}"] = (per_slide(render_stage, index), [f"image_{index}", "caption"])
+
+    with metrics.collect() as post_metrics:
+        with metrics.span("generate"):
+            results = run_stages(stages)
+        metrics.merge_parallel(slide_metrics)
+
+    post = {
+        "theme": theme,
+        "caption": results["caption"],
+        "hashtags": results["hashtags"],
+        "image_path": image_paths[0],
+        "base_image_path": image_generator.base_image_path(image_paths[0]),
+        "image_fetch": image_fetches[0],
+        "metrics": post_metrics
+    }
+    if slides > 1:
+        post["image_paths"] = image_paths
+    return post
+
+
+def upload_post(post: Dict[str, Any],
+                log: Callable[[str], None] = print,
+                upload_slots: Optional[threading.Semaphore] = None,
+                hosted_urls: Dict[str, str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Upload a generated post to Instagram if credentials are set.
+
+    Args:
+        post: Result of generate_post
+        log: Function used to print progress messages
+        upload_slots: Optional semaphore bounding concurrent uploads
+        hosted_urls: Public URLs images are already hosted at, by image path
+
+    Returns:
+        The upload result, or None if no upload was attempted
+    """
+    upload_slot = upload_slots or nullcontext()
+    hosted_urls = hosted_urls or {}
+    image_paths = post.get("image_paths")
+
+    if not config.INSTAGRAM_ACCESS_TOKEN:
+        log("[INFO] Instagram credentials not set - skipping upload")
+        return None
+
+    log("Uploading to Instagram...")
+    try:
+        with upload_slot, metrics.collect(post.setdefault("metrics", {})), metrics.span("upload"):
+            if image_paths:
+                instagram_result = instagram_poster.upload_carousel_to_instagram(
+                    image_paths, post["caption"], post["hashtags"], image_urls=hosted_urls
+                )
+            else:
+                instagram_result = instagram_poster.upload_to_instagram(
+                    post["image_path"], post["caption"], post["hashtags"],
+                    image_url=hosted_urls.get(post["image_path"])
+                )
+        if instagram_result["success"]:
+            log(f"[SUCCESS] Uploaded to Instagram: {instagram_result['message']}")
+        else:
+            log(f"[WARNING] Instagram upload failed: {instagram_result['message']}")
+    except Exception as e:
+        log(f"[WARNING] Instagram upload error: {str(e)}")
+        instagram_result = {"success": False, "error": str(e)}
+    return instagram_result
+
+
+def publish_post(post: Dict[str, Any],
+                 log: Callable[[str], None] = print,
+                 upload_slots: Optional[threading.Semaphore] = None,
+                 hosted_urls: Dict[str, str] = None) -> Dict[str, Any]:
+    """
+    Upload a generated post to Instagram (if credentials are set) and log it.
+
+    Args:
+        post: Result of generate_post
+        log: Function used to print progress messages
+        upload_slots: Optional semaphore bounding concurrent uploads
+        hosted_urls: Public URLs images are already hosted at, by image path
+
+    Returns:
+        The post entry written to the post log
+    """
+    instagram_result = upload_post(post, log=log, upload_slots=upload_slots, hosted_urls=hosted_urls)
+    return record_post(post, instagram_result)
+
+
+def record_post(post: Dict[str, Any], instagram_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Write a generated post and its upload result to the post log.
+
+    Args:
+        post: Result of generate_post
+        instagram_result: Upload result, or None if no upload was attempted
+
+    Returns:
+        The post entry written to the post log
+    """
+    post_data = {
+        "theme": post["theme"],
+        "caption": post["caption"],
+        "hashtags": post["hashtags"],
+        "image_path": post["image_path"],
+        "base_image_path": post.get("base_image_path"),
+        "timestamp": datetime.now().isoformat(),
+        "instagram_uploaded": instagram_result["success"] if instagram_result else False,
+        "instagram_media_id": instagram_result.get("media_id") if instagram_result and instagram_result.get("success") else None,
+        "image_fetch": post["image_fetch"],
+        "metrics": post.get("metrics")
+    }
+    if post.get("image_paths"):
+        post_data["media_type"] = "CAROUSEL"
+        post_data["image_paths"] = post["image_paths"]
+    utils.save_post_log(post_data)
+
+    if config.METRICS_TEXTFILE_PATH:
+        try:
+            metrics.export_textfile()
+        except Exception as e:
+            print(f"[WARNING] Could not export metrics: {str(e)}")
+
+    return post_data
+
+
+def run_post(theme: str,
+             log: Callable[[str], None] = print,
+             openai_slots: Optional[threading.Semaphore] = None,
+             upload_slots: Optional[threading.Semaphore] = None,
+             slides: int = 1,
+             variants: int = None) -> Dict[str, Any]:
+    """
+    Run the full pipeline for one theme and log the post.
+
+    Args:
+        theme: The content theme
+        log: Function used to print progress messages
+        openai_slots: Optional semaphore bounding concurrent OpenAI requests
+        upload_slots: Optional semaphore bounding concurrent uploads
+        slides: Number of images; more than one publishes a carousel
+        variants: Images requested per slide to pick from (default config.IMAGE_VARIANTS)
+
+    Returns:
+        The post entry written to the post log
+    """
+    post = generate_post(theme, log=log, openai_slots=openai_slots, slides=slides, variants=variants)
+    return publish_post(post, log=log, upload_slots=upload_slots)
+
+
+def read_themes(source: str) -> List[str]:
+    """
+    Read themes, one per line, from a file or from stdin.
+
+    Blank lines and lines starting with '#' are ignored.
+
+    Args:
+        source: Path to a themes file, or "-" for stdin
+
+    Returns:
+        List of themes in file order
+    """
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+
+def run_batch(themes: List[str],
+              workers: int = None,
+              openai_concurrency: int = None,
+              upload_concurrency: int = None,
+              slides: int = 1,
+              variants: int = None) -> List[Dict[str, Any]]:
+    """
+    Run the pipeline for many themes concurrently.
+
+    When posts will be published and GitHub hosting is configured (and
+    images aren't served by the built-in image server), all images are
+    generated first, then hosted together in a single GitHub commit, then
+    published. Otherwise each worker runs the full pipeline for its theme.
+
+    A failure in one theme does not stop the others; it is reported in that
+    theme's result instead.
+
+    Args:
+        themes: Themes to generate posts for
+        workers: Number of themes processed at once (default config.BATCH_WORKERS)
+        openai_concurrency: Max simultaneous OpenAI requests (default config.OPENAI_CONCURRENCY)
+        upload_concurrency: Max simultaneous uploads (default config.UPLOAD_CONCURRENCY)
+        slides: Images per post; more than one publishes carousels
+        variants: Images requested per slide to pick from (default config.IMAGE_VARIANTS)
+
+    Returns:
+        One result per theme, in input order, with theme, success, post and error keys
+    """
+    workers = workers or config.BATCH_WORKERS
+    openai_slots = threading.BoundedSemaphore(openai_concurrency or config.OPENAI_CONCURRENCY)
+    upload_slots = threading.BoundedSemaphore(upload_concurrency or config.UPLOAD_CONCURRENCY)
+    bulk_hosting = (bool(config.INSTAGRAM_ACCESS_TOKEN) and instagram_poster.github_hosting_configured()
+                    and not config.PUBLIC_IMAGE_BASE_URL)
+
+    def logger(index: int, theme: str) -> Callable[[str], None]:
+        prefix = f"[{index + 1}/{len(themes)}] {theme}:"
+        return lambda message: print(f"{prefix} {message}", flush=True)
+
+    def guarded(index: int, theme: str, func: Callable[[Callable[[str], None]], Dict[str, Any]]) -> Dict[str, Any]:
+        log = logger(index, theme)
+        try:
+            return {"theme": theme, "success": True, "post": func(log), "error": None}
+        except Exception as e:
+            log(f"[ERROR] {str(e)}")
+            return {"theme": theme, "success": False, "post": None, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        if not bulk_hosting:
+            futures = [
+                executor.submit(guarded, i, theme, lambda log, theme=theme: run_post(
+                    theme, log=log, openai_slots=openai_slots, upload_slots=upload_slots, slides=slides,
+                    variants=variants))
+                for i, theme in enumerate(themes)
+            ]
+            return [future.result() for future in futures]
+
+        # Phase 1: generate everything
+        futures = [
+            executor.submit(guarded, i, theme, lambda log, theme=theme: generate_post(
+                theme, log=log, openai_slots=openai_slots, slides=slides, variants=variants))
+            for i, theme in enumerate(themes)
+        ]
+        generated = [future.result() for future in futures]
+
+        # Phase 2: host all images with one commit; on failure each post
+        # falls back to regular per-image hosting
+        image_paths = [path for r in generated if r["success"]
+                       for path in r["post"].get("image_paths", [r["post"]["image_path"]])]
+        hosted_urls = {}
+        if image_paths:
+            print(f"Hosting {len(image_paths)} images on GitHub in one commit...", flush=True)
+            try:
+                hosted_urls = instagram_poster.upload_images_to_github_bulk(image_paths)
+                print(f"✓ {len(hosted_urls)} images hosted on GitHub", flush=True)
+            except Exception as e:
+                print(f"Warning: bulk GitHub upload failed, hosting images one by one: {str(e)}", flush=True)
+
+        # Phase 3: publish
+        futures = []
+        for i, result in enumerate(generated):
+            if not result["success"]:
+                futures.append(None)
+                continue
+            post = result["post"]
+            futures.append(executor.submit(guarded, i, result["theme"], lambda log, post=post: publish_post(
+                post, log=log, upload_slots=upload_slots, hosted_urls=hosted_urls)))
+        return [future.result() if future else result for future, result in zip(futures, generated)]
+
+
+def describe_image_fetch(stats: Dict[str, Any]) -> str:
+    """
+    Describe how a post's base image was retrieved and the time saved.
+
+    Args:
+        stats: The post's "image_fetch" entry (see image_generator.fetch_base_image)
+
+    Returns:
+        One-line description
+    """
+    if not stats:
+        return "image fetch: n/a"
+    if stats.get("variants"):
+        picked = next(v for v in stats["variants"] if v["variant"] == stats["variant"])
+        return (f"variant {stats['variant'] + 1} of {len(stats['variants'])} (score {picked['score']:.2f}: "
+                f"exposure {picked['exposure']:.2f}, band contrast {picked['band_contrast']:.2f}, "
+                f"sharpness {picked['sharpness']:.2f}, busyness {picked['busyness']:.2f}); "
+                f"{describe_image_fetch(dict(stats, variants=None))}")
+    if stats.get("cached"):
+        return f"image from cache ({stats['bytes'] // 1024} KB)"
+    if stats.get("response_format") == "b64_json":
+        saved = stats.get("saved_seconds")
+        saved_text = f"saved ~{saved:.1f}s download" if saved is not None else "download skipped (no url-mode timing yet)"
+        return f"image via b64_json in {stats['request_seconds']:.1f}s, {saved_text}"
+    return (f"image via url: request {stats['request_seconds']:.1f}s + "
+            f"streamed download {stats['download_seconds']:.1f}s ({stats['bytes'] // 1024} KB)")
+
+
+def cache_summary() -> Optional[str]:
+    """
+    Describe OpenAI response cache usage for this run.
+
+    Returns:
+        Summary line, or None if the cache wasn't consulted
+    """
+    stats = response_cache.stats()
+    if not stats["hits"] and not stats["misses"]:
+        return None
+    return f"OpenAI cache: {stats['hits']} hits, {stats['misses']} misses"
+
+
+def print_batch_summary(results: List[Dict[str, Any]]):
+    """
+    Print a per-theme summary of a batch run.
+
+    Args:
+        results: Results returned by run_batch
+    """
+    generated = sum(1 for r in results if r["success"])
+    uploaded = sum(1 for r in results if r["success"] and r["post"]["instagram_uploaded"])
+
+    print("\n" + "="*50)
+    print(f"Batch finished: {generated}/{len(results)} generated, {uploaded} uploaded to Instagram")
+    for result in results:
+        if not result["success"]:
+            print(f"[FAILED]   {result['theme']}: {result['error']}")
+        elif result["post"]["instagram_uploaded"]:
+            print(f"[UPLOADED] {result['theme']}: {result['post']['image_path']} (Media ID: {result['post']['instagram_media_id']})")
+        else:
+            print(f"[SAVED]    {result['theme']}: {result['post']['image_path']}")
+        if result["success"]:
+            print(f"           {describe_image_fetch(result['post'].get('image_fetch'))}")
+    saved = [r["post"]["image_fetch"].get("saved_seconds") for r in results
+             if r["success"] and r["post"].get("image_fetch", {}).get("saved_seconds") is not None]
+    if saved:
+        print(f"Download time saved by b64_json: ~{sum(saved):.1f}s total over {len(saved)} images")
+    cache_line = cache_summary()
+    if cache_line:
+        print(cache_line)
+    print(f"Posts logged to: {config.POSTS_LOG_PATH}")
+    print("="*50 + "\n")
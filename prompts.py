@@ -29,6 +29,28 @@ Style requirements:
 - Realistic, tasteful imagery"""
 
 
+def carousel_image_prompt(theme: str, slide: int, slide_count: int) -> str:
+    """
+    Generate a prompt for one slide of a carousel post.
+    
+    Uses the same style as image_prompt, asking for a distinct composition
+    per slide so the series doesn't repeat itself.
+    
+    Args:
+        theme: The content theme (e.g., "life motivation", "sunset travel")
+        slide: Slide number, starting at 1
+        slide_count: Total number of slides
+        
+    Returns:
+        Formatted prompt string for image generation
+    """
+    return f"""{image_prompt(theme)}
+
+This is image {slide} of {slide_count} in a cohesive carousel series on this theme.
+- Keep the same mood, color palette and lighting as the rest of the series
+- Use a distinct composition, subject or viewpoint from the other images"""
+
+
 def caption_prompt(theme: str) -> str:
     """
     Generate a prompt for caption generation based on a theme.
@@ -84,3 +106,38 @@ Requirements:
 
 Generate the hashtags now:"""
 
+
+def caption_and_hashtags_prompt(theme: str) -> str:
+    """
+    Generate a prompt asking for a caption and hashtags in one JSON response.
+    
+    Combines the tone rules of caption_prompt with the hashtag rules of
+    hashtag_prompt so both can be produced in a single request.
+    
+    Args:
+        theme: The content theme (e.g., "life motivation", "sunset travel")
+        
+    Returns:
+        Formatted prompt string for combined caption and hashtag generation
+    """
+    return f"""Write a short Instagram caption (1-2 lines maximum) inspired by the theme: {theme}, and 10-15 relevant hashtags for the post.
+
+Caption tone requirements:
+- Calm and confident
+- Grounded and emotionally mature
+- Quiet ambition, peaceful abundance
+- Non-hype, non-hustle energy
+- No hashtags in the caption
+- No emojis, or maximum one subtle emoji
+- No quotation marks
+- No exclamation marks
+- Plain text only
+
+Hashtag requirements:
+- Generate 10-15 hashtags maximum
+- Mix of popular and niche hashtags
+- Relevant to the theme and caption
+- Include motivational, inspirational, lifestyle, or photography-related tags as appropriate
+
+Respond with ONLY a JSON object in this exact format:
+{{"caption": "your caption", "hashtags": ["#hashtag1", "#hashtag2"]}}"""
@@ -0,0 +1,279 @@
+"""
+Per-host rate-limit pacing and retry backoff.
+
+Every response from OpenAI, the Graph API and GitHub carries rate-limit
+headers. They are read into a limiter per host: while plenty of budget is
+left requests go out immediately; once less than RATE_LIMIT_HEADROOM of the
+budget remains, requests are spaced out so the rest lasts until the window
+resets, and when the budget is exhausted (or the server says Retry-After)
+the host is paused. Throughput therefore slows down gradually instead of
+running into 429s. Transient failures are retried by the callers in
+transport.py with jittered exponential backoff.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+import config
+
+# Graph API error codes for throttling and temporary failures
+# (https://developers.facebook.com/docs/graph-api/guides/error-handling)
+GRAPH_RETRY_CODES = {1, 2, 4, 17, 32, 341, 613}
+# The subset that means the request was rejected for rate limiting, so it
+# didn't take effect and is safe to send again even if it isn't idempotent
+GRAPH_THROTTLE_CODES = {4, 17, 32, 341, 613}
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+_limiters_lock = threading.Lock()
+_limiters: Dict[str, "HostLimiter"] = {}
+
+
+class HostLimiter:
+    """
+    Pacing state for one host, shared by every thread calling it.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self._lock = threading.Lock()
+        self._interval = 0.0      # Minimum seconds between request starts
+        self._next_start = 0.0    # Monotonic time the next request may start
+        self._paused_until = 0.0  # Monotonic time a pause (budget exhausted) ends
+
+    def wait(self):
+        """
+        Block until this host may be called again, then claim the slot.
+
+        Waits are capped at RATE_LIMIT_MAX_WAIT; past that the request is
+        sent anyway and the server's answer decides.
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start, self._paused_until)
+            start = min(start, now + config.RATE_LIMIT_MAX_WAIT)
+            self._next_start = start + self._interval
+        if start > now:
+            time.sleep(start - now)
+
+    def pace(self, interval: float):
+        """
+        Set the minimum spacing between requests (0 to stop pacing).
+
+        Args:
+            interval: Seconds between request starts
+        """
+        with self._lock:
+            self._interval = max(0.0, interval)
+
+    def pause(self, seconds: float):
+        """
+        Hold every request to this host for a while.
+
+        Args:
+            seconds: Pause length from now
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + max(0.0, seconds))
+
+
+def get_limiter(host: str) -> HostLimiter:
+    """
+    Get the shared limiter for a host, creating it on first use.
+
+    Args:
+        host: Host name, e.g. "graph.facebook.com"
+
+    Returns:
+        The host's limiter
+    """
+    host = host.lower()
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = HostLimiter(host)
+        return limiter
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    Parse an OpenAI reset duration such as "20ms", "1s" or "6m0s".
+
+    Args:
+        value: Duration string
+
+    Returns:
+        Seconds, or None if the value can't be parsed
+    """
+    parts = _DURATION_PART.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    Read a Retry-After header (seconds or HTTP date).
+
+    Args:
+        headers: Response headers (case-insensitive mapping)
+
+    Returns:
+        Seconds to wait, or None if the header is absent or invalid
+    """
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _budget_interval(remaining: float, limit: float, reset_seconds: float) -> float:
+    """
+    Spacing that makes a remaining budget last until it resets.
+
+    Nothing is paced while more than RATE_LIMIT_HEADROOM of the budget is
+    left; below that, requests are spread evenly over the reset window.
+    """
+    if limit <= 0 or reset_seconds <= 0 or remaining / limit > config.RATE_LIMIT_HEADROOM:
+        return 0.0
+    return reset_seconds / max(remaining, 1)
+
+
+def _pressure_interval(fraction_left: float, max_interval: float) -> float:
+    """
+    Spacing for budgets that aren't counted in requests (tokens, usage %).
+
+    Grows quadratically from 0 at RATE_LIMIT_HEADROOM left to max_interval
+    when the budget is used up.
+    """
+    if fraction_left >= config.RATE_LIMIT_HEADROOM:
+        return 0.0
+    pressure = min(1.0, (config.RATE_LIMIT_HEADROOM - fraction_left) / config.RATE_LIMIT_HEADROOM)
+    return max_interval * pressure ** 2
+
+
+def _graph_usage(headers) -> Tuple[float, float]:
+    """
+    Highest usage percentage and regain-access minutes from Graph headers.
+    """
+    usage = 0.0
+    regain_minutes = 0.0
+    reports = []
+    try:
+        if headers.get("x-app-usage"):
+            reports.append(json.loads(headers["x-app-usage"]))
+        if headers.get("x-business-use-case-usage"):
+            for entries in json.loads(headers["x-business-use-case-usage"]).values():
+                reports.extend(entries)
+    except (ValueError, AttributeError):
+        return usage, regain_minutes
+    for report in reports:
+        usage = max([usage] + [float(report.get(key) or 0) for key in ("call_count", "total_cputime", "total_time")])
+        regain_minutes = max(regain_minutes, float(report.get("estimated_time_to_regain_access") or 0))
+    return usage, regain_minutes
+
+
+def update_from_headers(limiter: HostLimiter, headers):
+    """
+    Adjust a host's pacing from the rate-limit headers of a response.
+
+    Understands OpenAI x-ratelimit-* (requests and tokens), GitHub
+    X-RateLimit-* and Graph API X-App-Usage / X-Business-Use-Case-Usage.
+    Responses without any of these leave the pacing unchanged.
+
+    Args:
+        limiter: The host's limiter
+        headers: Response headers (case-insensitive mapping)
+    """
+    intervals = []
+
+    # OpenAI: separate request and token budgets, reset given as a duration
+    for kind in ("requests", "tokens"):
+        remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+        limit = headers.get(f"x-ratelimit-limit-{kind}")
+        reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+        if remaining is None or limit is None or reset is None:
+            continue
+        remaining, limit = float(remaining), float(limit)
+        if remaining <= 0:
+            limiter.pause(reset)
+        if kind == "requests":
+            intervals.append(_budget_interval(remaining, limit, reset))
+        elif limit > 0:
+            intervals.append(_pressure_interval(remaining / limit, reset))
+
+    # GitHub: one budget, reset given as an epoch timestamp
+    if headers.get("x-ratelimit-remaining") is not None and headers.get("x-ratelimit-reset") is not None:
+        remaining = float(headers["x-ratelimit-remaining"])
+        limit = float(headers.get("x-ratelimit-limit") or 0)
+        reset = max(0.0, float(headers["x-ratelimit-reset"]) - time.time())
+        if remaining <= 0:
+            limiter.pause(reset)
+        intervals.append(_budget_interval(remaining, limit, reset))
+
+    # Graph API: usage percentages of a rolling one-hour window
+    if headers.get("x-app-usage") or headers.get("x-business-use-case-usage"):
+        usage, regain_minutes = _graph_usage(headers)
+        if usage >= 100 or regain_minutes > 0:
+            limiter.pause(max(regain_minutes * 60, config.RETRY_MAX_DELAY))
+        # No call counts here, so slow down in proportion to how deep into
+        # the headroom usage has gone
+        intervals.append(_pressure_interval(1 - usage / 100, config.RETRY_MAX_DELAY))
+
+    if intervals:
+        limiter.pace(max(intervals))
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """
+    Delay before a retry: exponential backoff with full jitter, never less
+    than the server's Retry-After.
+
+    Args:
+        attempt: Number of the retry, starting at 0
+        retry_after: Optional seconds requested by the server
+
+    Returns:
+        Seconds to sleep
+    """
+    delay = random.uniform(0, min(config.RETRY_MAX_DELAY, config.RETRY_BASE_DELAY * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def graph_error_is_transient(body: str, throttling_only: bool = False) -> bool:
+    """
+    Check whether a Graph API error response is throttling or temporary.
+
+    Args:
+        body: Response text
+        throttling_only: Only count rate-limit rejections, not temporary
+            server errors (which may have happened after the request acted)
+
+    Returns:
+        True if the request should be retried
+    """
+    try:
+        error = json.loads(body).get("error") or {}
+    except (ValueError, AttributeError):
+        return False
+    if throttling_only:
+        return error.get("code") in GRAPH_THROTTLE_CODES
+    return bool(error.get("is_transient")) or error.get("code") in GRAPH_RETRY_CODES
@@ -0,0 +1,157 @@
+"""
+Re-render final images from their stored base images.
+
+The pipeline keeps the overlay-free base image of every post (see
+image_generator.save_base_image), so fixing a caption or changing the
+overlay style only re-applies add_text_overlay and re-encodes; no OpenAI
+request is made. Posts are rendered in parallel on a process pool, since
+the overlay and the encoder are CPU-bound.
+
+The post log is append-only, so a caption fixed with a re-render is kept
+next to the base image (see overlay_caption_path) and used by later
+re-renders instead of the caption in the log.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+import image_generator
+
+
+def overlay_caption_path(base_path: str) -> str:
+    """
+    Location of the overlay text a post was last re-rendered with.
+
+    Args:
+        base_path: The post's base image
+
+    Returns:
+        Text file next to the base image
+    """
+    return os.path.splitext(base_path)[0] + ".caption.txt"
+
+
+def overlay_caption(post: Dict[str, Any]) -> str:
+    """
+    The text currently drawn on a post's image: the caption from the last
+    re-render with a new caption, or else the logged caption.
+
+    Args:
+        post: Post log entry
+
+    Returns:
+        Overlay text
+    """
+    base_path = post.get("base_image_path")
+    if base_path:
+        try:
+            with open(overlay_caption_path(base_path), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+    return post["caption"]
+
+
+def _save_overlay_caption(base_path: str, caption: str):
+    path = overlay_caption_path(base_path)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(caption)
+    os.replace(temp_path, path)
+
+
+def rerender_image(base_path: str, output_path: str, caption: str, style: Dict[str, Any] = None) -> Optional[str]:
+    """
+    Re-apply the caption overlay to a stored base image (runs in a worker
+    process). The image is encoded in the format its extension names, which
+    may differ from the current config.OUTPUT_FORMAT.
+
+    Args:
+        base_path: Base image saved by the pipeline
+        output_path: Where to save the re-rendered image
+        caption: Caption text to overlay
+        style: Optional overlay style overrides (see image_generator.overlay_style)
+
+    Returns:
+        None on success, or an error message
+    """
+    try:
+        with Image.open(base_path) as base:
+            image = base.convert("RGB")
+        image_generator.finish_image(image, output_path, caption=caption, style=style,
+                                     image_format=image_generator.format_for_path(output_path))
+        return None
+    except Exception as e:
+        return f"{output_path}: {str(e)}"
+
+
+def _rerender_job(job: Tuple[str, str, str, Optional[Dict[str, Any]]]) -> Optional[str]:
+    return rerender_image(*job)
+
+
+def rerender_posts(posts: List[Dict[str, Any]],
+                   caption: str = None,
+                   style: Dict[str, Any] = None,
+                   output_dir: str = None,
+                   workers: int = None) -> Dict[str, Any]:
+    """
+    Re-render the final image of each post from its base image.
+
+    Args:
+        posts: Post log entries
+        caption: New overlay text to use instead of each post's current
+            one; recorded for later re-renders unless output_dir is set
+        style: Optional overlay style overrides (see image_generator.overlay_style)
+        output_dir: Write the new images here instead of replacing the
+            originals (e.g. to preview a style)
+        workers: Worker processes (default: CPU count)
+
+    Returns:
+        Dictionary with rendered (output paths), missing_base (image paths
+        of posts without a stored base image), errors and seconds
+    """
+    started = time.perf_counter()
+    # Fail on a bad style here rather than once per worker
+    style = image_generator.overlay_style(style)
+
+    jobs = []
+    missing_base = []
+    seen = set()
+    for post in posts:
+        if post.get("image_path") in seen:
+            continue
+        seen.add(post.get("image_path"))
+        base_path = post.get("base_image_path")
+        if not base_path or not os.path.exists(base_path):
+            missing_base.append(post.get("image_path"))
+            continue
+        output_path = post["image_path"]
+        if output_dir:
+            output_path = os.path.join(output_dir, os.path.basename(output_path))
+        jobs.append((base_path, output_path, caption or overlay_caption(post), style))
+
+    results = []
+    if jobs:
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        workers = min(len(jobs), workers or os.cpu_count() or 4)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            results = list(executor.map(_rerender_job, jobs, chunksize=chunksize))
+
+    # Remember a new caption, so the next style change doesn't bring back the old one
+    if caption and not output_dir:
+        for job, error in zip(jobs, results):
+            if not error:
+                _save_overlay_caption(job[0], caption)
+
+    return {
+        "rendered": [job[1] for job, error in zip(jobs, results) if not error],
+        "missing_base": missing_base,
+        "errors": [error for error in results if error],
+        "seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,247 @@
+"""
+Persistent on-disk cache for OpenAI responses.
+
+Entries are keyed on a hash of the request parameters (model, prompt text,
+temperature, size/quality...) and stored under config.CACHE_DIR: text
+responses as .txt files and raw image bytes as .bin files. Reading an entry
+refreshes its modification time, so eviction drops the least recently used
+entries first once the cache is over config.CACHE_MAX_BYTES, and drops any
+entry unused for config.CACHE_MAX_AGE_DAYS.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+import config
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+_bypass = False
+
+
+def set_bypass(bypass: bool):
+    """
+    Turn cache lookups and writes off (or back on) for this process.
+    
+    Args:
+        bypass: True to always call OpenAI and never store responses
+    """
+    global _bypass
+    _bypass = bypass
+
+
+def is_enabled() -> bool:
+    """
+    Check whether the cache is in use.
+    
+    Returns:
+        True unless disabled in config or bypassed with set_bypass
+    """
+    return config.OPENAI_CACHE_ENABLED and not _bypass
+
+
+def make_key(**parts: Any) -> str:
+    """
+    Build a cache key from request parameters.
+    
+    Args:
+        **parts: JSON-serializable request parameters
+        
+    Returns:
+        Hex digest identifying the request
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key: str, suffix: str) -> str:
+    return os.path.join(config.CACHE_DIR, key[:2], f"{key}{suffix}")
+
+
+def _record(hit: bool):
+    with _stats_lock:
+        _stats["hits" if hit else "misses"] += 1
+
+
+def _read(key: str, suffix: str) -> Optional[bytes]:
+    if not is_enabled():
+        return None
+    
+    path = _entry_path(key, suffix)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        _record(False)
+        return None
+    
+    # Mark as recently used for eviction
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    _record(True)
+    return data
+
+
+def _write(key: str, suffix: str, data: bytes):
+    if not is_enabled():
+        return
+    
+    path = _entry_path(key, suffix)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    
+    # Write to a temporary file first so readers never see a partial entry
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    
+    evict()
+
+
+def get_text(key: str) -> Optional[str]:
+    """
+    Look up a cached text response.
+    
+    Args:
+        key: Key from make_key
+        
+    Returns:
+        The cached text, or None on a miss
+    """
+    data = _read(key, ".txt")
+    return data.decode("utf-8") if data is not None else None
+
+
+def put_text(key: str, text: str):
+    """
+    Store a text response.
+    
+    Args:
+        key: Key from make_key
+        text: Response text to cache
+    """
+    _write(key, ".txt", text.encode("utf-8"))
+
+
+def get_bytes(key: str) -> Optional[bytes]:
+    """
+    Look up cached binary data (e.g. raw image bytes).
+    
+    Args:
+        key: Key from make_key
+        
+    Returns:
+        The cached bytes, or None on a miss
+    """
+    return _read(key, ".bin")
+
+
+def put_bytes(key: str, data: bytes):
+    """
+    Store binary data (e.g. raw image bytes).
+    
+    Args:
+        key: Key from make_key
+        data: Bytes to cache
+    """
+    _write(key, ".bin", data)
+
+
+@contextmanager
+def bytes_writer(key: str) -> Iterator[Optional[BinaryIO]]:
+    """
+    Stream binary data into a cache entry without holding it all in memory.
+    
+    The entry only becomes visible if the block exits without an exception;
+    otherwise the partial file is discarded.
+    
+    Args:
+        key: Key from make_key
+        
+    Yields:
+        Writable binary file, or None when the cache is disabled
+    """
+    if not is_enabled():
+        yield None
+        return
+    
+    path = _entry_path(key, ".bin")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            yield f
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    os.replace(tmp_path, path)
+    
+    evict()
+
+
+def evict(max_bytes: int = None, max_age_days: float = None) -> int:
+    """
+    Remove expired entries, then least recently used ones until the cache
+    fits in max_bytes.
+    
+    Args:
+        max_bytes: Size limit (default config.CACHE_MAX_BYTES)
+        max_age_days: Age limit (default config.CACHE_MAX_AGE_DAYS)
+        
+    Returns:
+        Number of entries removed
+    """
+    max_bytes = config.CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age_days = config.CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    if not os.path.isdir(config.CACHE_DIR):
+        return 0
+    
+    entries = []
+    for root, _, files in os.walk(config.CACHE_DIR):
+        for name in files:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    
+    # Oldest first
+    entries.sort()
+    cutoff = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    
+    return removed
+
+
+def stats() -> Dict[str, int]:
+    """
+    Get hit/miss counters for this process.
+    
+    Returns:
+        Dictionary with hits and misses
+    """
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,454 @@
+"""
+Scheduler daemon: publishes posts at fixed times from a schedule file.
+
+Each post is generated and staged SCHEDULE_LEAD_MINUTES before its slot:
+caption, hashtags and image are created, the image is hosted and the
+Instagram media container is created, so only the publish call is left
+when the slot arrives. Staged posts are kept in a persistent queue
+(SCHEDULE_QUEUE_PATH), so a restart picks up where it left off instead of
+generating them again.
+
+Schedule file, one post per line (blank lines and # comments are skipped):
+
+    2026-10-20T09:00 autumn forest walk
+    daily 18:30 sunset travel
+    daily 12:00 --carousel 3 city lights at night
+"""
+
+import copy
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+
+# pipeline and instagram_poster (and with them PIL, NumPy and the HTTP
+# clients) are imported in the functions that stage and publish, so reading
+# the queue (`main.py schedule status`) stays fast
+
+# Instagram discards unpublished media containers after 24 hours
+CONTAINER_LIFETIME = timedelta(hours=23)
+
+_queue_lock = threading.Lock()
+
+
+def parse_schedule_line(line: str) -> Dict[str, Any]:
+    """
+    Parse one schedule line.
+
+    Args:
+        line: "<YYYY-MM-DDTHH:MM> [--carousel N] <theme>" for a one-off post,
+            or "daily <HH:MM> [--carousel N] <theme>" for a daily one
+
+    Returns:
+        Dictionary with theme, slides and either "at" (datetime) or "daily" (HH:MM)
+    """
+    parts = line.split()
+    entry = {"slides": 1}
+    if parts and parts[0].lower() == "daily":
+        if len(parts) < 2:
+            raise ValueError("missing time after 'daily'")
+        datetime.strptime(parts[1], "%H:%M")
+        entry["daily"] = parts[1]
+        parts = parts[2:]
+    elif parts:
+        entry["at"] = datetime.fromisoformat(parts[0])
+        parts = parts[1:]
+
+    if parts[:1] == ["--carousel"]:
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise ValueError("--carousel must be followed by a number")
+        entry["slides"] = int(parts[1])
+        if not 2 <= entry["slides"] <= config.CAROUSEL_MAX_SLIDES:
+            raise ValueError(f"--carousel must be between 2 and {config.CAROUSEL_MAX_SLIDES}")
+        parts = parts[2:]
+
+    entry["theme"] = " ".join(parts).strip()
+    if not entry["theme"]:
+        raise ValueError("missing theme")
+    return entry
+
+
+def read_schedule(schedule_path: str) -> List[Dict[str, Any]]:
+    """
+    Read a schedule file.
+
+    Args:
+        schedule_path: Path to the schedule file
+
+    Returns:
+        Parsed entries (see parse_schedule_line)
+    """
+    entries = []
+    with open(schedule_path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entries.append(parse_schedule_line(line))
+            except ValueError as e:
+                raise ValueError(f"{schedule_path}, line {number}: {str(e)}")
+    return entries
+
+
+def next_slot(entry: Dict[str, Any], now: datetime) -> datetime:
+    """
+    Find the slot a schedule entry should be published at next.
+
+    A daily slot that passed less than SCHEDULE_GRACE_MINUTES ago still
+    counts as today's, so a late start can catch up on it.
+
+    Args:
+        entry: Parsed schedule entry
+        now: Current time
+
+    Returns:
+        Slot time
+    """
+    if "at" in entry:
+        return entry["at"]
+    hour, minute = map(int, entry["daily"].split(":"))
+    slot = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if slot < now - timedelta(minutes=config.SCHEDULE_GRACE_MINUTES):
+        slot += timedelta(days=1)
+    return slot
+
+
+def load_queue() -> Dict[str, Dict[str, Any]]:
+    """
+    Load the persistent queue.
+
+    Returns:
+        Mapping of queue ID to queue entry
+    """
+    if not os.path.exists(config.SCHEDULE_QUEUE_PATH):
+        return {}
+    with open(config.SCHEDULE_QUEUE_PATH, 'r', encoding='utf-8') as f:
+        return {item["id"]: item for item in json.load(f)}
+
+
+def save_queue(queue: Dict[str, Dict[str, Any]]):
+    """
+    Write the queue atomically, so a crash mid-write can't corrupt it.
+
+    Args:
+        queue: Mapping of queue ID to queue entry
+    """
+    os.makedirs(os.path.dirname(config.SCHEDULE_QUEUE_PATH) or ".", exist_ok=True)
+    items = sorted(queue.values(), key=lambda item: item["slot"])
+    temp_path = f"{config.SCHEDULE_QUEUE_PATH}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(items, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, config.SCHEDULE_QUEUE_PATH)
+
+
+def enqueue_due(queue: Dict[str, Dict[str, Any]], schedule: List[Dict[str, Any]], now: datetime) -> int:
+    """
+    Add schedule entries whose staging time has come to the queue.
+
+    Entries already in the queue (by slot and theme) are left alone, so
+    re-reading the schedule never stages a post twice.
+
+    Args:
+        queue: Mapping of queue ID to queue entry; updated in place
+        schedule: Parsed schedule entries
+        now: Current time
+
+    Returns:
+        Number of entries added
+    """
+    lead = timedelta(minutes=config.SCHEDULE_LEAD_MINUTES)
+    grace = timedelta(minutes=config.SCHEDULE_GRACE_MINUTES)
+    added = 0
+    for entry in schedule:
+        slot = next_slot(entry, now)
+        if not now - grace <= slot <= now + lead:
+            continue
+        queue_id = f"{slot.isoformat(timespec='seconds')} {entry['theme']}"
+        if queue_id in queue:
+            continue
+        queue[queue_id] = {
+            "id": queue_id,
+            "theme": entry["theme"],
+            "slides": entry["slides"],
+            "slot": slot.isoformat(timespec='seconds'),
+            "status": "pending",
+            "attempts": 0,
+            "retry_at": None,
+            "post": None,
+            "image_urls": {},
+            "creation_id": None,
+            "media_id": None,
+            "error": None
+        }
+        added += 1
+    return added
+
+
+def prune_queue(queue: Dict[str, Dict[str, Any]], now: datetime, keep_days: int = 7):
+    """
+    Drop finished queue entries whose slot is more than keep_days old.
+
+    Args:
+        queue: Mapping of queue ID to queue entry; updated in place
+        now: Current time
+        keep_days: Days finished entries are kept for `schedule status`
+    """
+    cutoff = (now - timedelta(days=keep_days)).isoformat()
+    for queue_id in [i for i, item in queue.items() if item["status"] not in ("pending", "staged") and item["slot"] < cutoff]:
+        del queue[queue_id]
+
+
+def stage_item(item: Dict[str, Any], log: Callable[[str], None] = print,
+               openai_slots: Optional[threading.Semaphore] = None) -> Dict[str, Any]:
+    """
+    Generate a queued post and prepare it for publishing.
+
+    The generated post is stored on the item before hosting starts, so a
+    failed (or restarted) staging attempt doesn't generate it again.
+
+    Args:
+        item: Queue entry; updated in place
+        log: Function used to print progress messages
+        openai_slots: Optional semaphore bounding concurrent OpenAI requests
+
+    Returns:
+        The queue entry
+    """
+    import instagram_poster
+    import metrics
+    import pipeline
+
+    if not item["post"]:
+        item["post"] = pipeline.generate_post(item["theme"], log=log, openai_slots=openai_slots, slides=item["slides"])
+        _save_item(item)
+
+    slot = datetime.fromisoformat(item["slot"])
+    if config.INSTAGRAM_ACCESS_TOKEN and slot - datetime.now() < CONTAINER_LIFETIME:
+        post = item["post"]
+        log("Staging Instagram media container...")
+        with metrics.collect(post.setdefault("metrics", {})):
+            result = instagram_poster.prepare_instagram_post(
+                post.get("image_paths") or [post["image_path"]],
+                post["caption"], post["hashtags"], image_urls=item["image_urls"]
+            )
+        item["image_urls"] = result["image_urls"]
+        if not result["success"]:
+            raise Exception(result["message"])
+        item["creation_id"] = result["creation_id"]
+
+    item["status"] = "staged"
+    log(f"Staged for {item['slot']}")
+    return item
+
+
+def publish_item(item: Dict[str, Any], log: Callable[[str], None] = print) -> Dict[str, Any]:
+    """
+    Publish a staged post and write it to the post log.
+
+    The staged container is published; only if it has expired or failed is
+    the post uploaded again from its hosted images. Any other failure (a
+    timeout, a server error) keeps the container, since the publish may
+    still have gone through, and the next attempt starts by checking it.
+    Failed attempts are retried until SCHEDULE_GRACE_MINUTES after the slot.
+
+    Args:
+        item: Queue entry; updated in place
+        log: Function used to print progress messages
+
+    Returns:
+        The queue entry
+    """
+    import instagram_poster
+    import metrics
+    import pipeline
+
+    post = item["post"]
+    result = None
+    if item["creation_id"]:
+        with metrics.collect(post.setdefault("metrics", {})):
+            result = instagram_poster.publish_prepared_post(item["creation_id"])
+        if result["success"]:
+            media = f" (Media ID: {result['media_id']})" if result["media_id"] else ""
+            log(f"[SUCCESS] {result['message']}{media}")
+        elif result.get("container_status") in instagram_poster.CONTAINER_UNUSABLE_STATUSES:
+            log(f"[WARNING] {result['message']} - uploading again")
+            item["creation_id"] = None
+    if not item["creation_id"]:
+        result = pipeline.upload_post(post, log=log, hosted_urls=item["image_urls"])
+
+    if result is None:
+        item["status"] = "logged"
+    elif result["success"]:
+        item["status"] = "published"
+        item["media_id"] = result.get("media_id")
+    else:
+        deadline = datetime.fromisoformat(item["slot"]) + timedelta(minutes=config.SCHEDULE_GRACE_MINUTES)
+        retry_at = datetime.now() + timedelta(minutes=config.SCHEDULE_RETRY_MINUTES)
+        if retry_at < deadline:
+            raise Exception(result.get("error") or result.get("message"))
+        item["status"] = "failed"
+        item["error"] = result.get("error") or result.get("message")
+    pipeline.record_post(post, result)
+    return item
+
+
+def _save_item(item: Dict[str, Any]):
+    # The daemon's queue is re-read from the file on every pass; re-save the
+    # whole queue with this item's current state
+    with _queue_lock:
+        queue = load_queue()
+        queue[item["id"]] = item
+        save_queue(queue)
+
+
+def _next_action(item: Dict[str, Any], now: datetime) -> Optional[str]:
+    """
+    Decide what a queue entry needs next: "stage", "publish", "miss" or nothing.
+    """
+    if item["status"] not in ("pending", "staged"):
+        return None
+    if item["retry_at"] and now < datetime.fromisoformat(item["retry_at"]):
+        return None
+    slot = datetime.fromisoformat(item["slot"])
+    if now > slot + timedelta(minutes=config.SCHEDULE_GRACE_MINUTES):
+        return "miss"
+    if item["status"] == "staged" or (item["post"] and now >= slot):
+        return "publish" if now >= slot else None
+    return "stage"
+
+
+def run(schedule_path: str, once: bool = False):
+    """
+    Run the scheduler until interrupted.
+
+    Staging runs on a pool of BATCH_WORKERS threads and publishing on its
+    own pool, so a long generation never holds up a post whose slot has
+    arrived. The schedule file is re-read on every pass, so edits take
+    effect without a restart.
+
+    Each job works on its own copy of a queue entry and saves it (under the
+    queue lock) as it goes; the main loop only reads the queue file, so it
+    never serializes an entry a job is changing.
+
+    Args:
+        schedule_path: Path to the schedule file
+        once: Process whatever is due now, wait for it, then return
+    """
+    import pipeline
+
+    config.require("openai")
+    schedule = read_schedule(schedule_path)
+    print(f"Scheduler started with {len(schedule)} schedule entries from {schedule_path}")
+    print(f"Posts are staged {config.SCHEDULE_LEAD_MINUTES:g} minutes before their slot; queue: {config.SCHEDULE_QUEUE_PATH}")
+    if not config.INSTAGRAM_ACCESS_TOKEN:
+        print("[INFO] Instagram credentials not set - posts will be generated and logged without uploading")
+
+    openai_slots = threading.BoundedSemaphore(config.OPENAI_CONCURRENCY)
+    stage_executor = ThreadPoolExecutor(max_workers=config.BATCH_WORKERS)
+    publish_executor = ThreadPoolExecutor(max_workers=config.UPLOAD_CONCURRENCY)
+    wake = threading.Event()
+    running = {}
+
+    def job(action: str, item: Dict[str, Any]):
+        log = lambda message: print(f"[{item['slot']}] {item['theme']}: {message}", flush=True)
+        try:
+            if action == "stage":
+                stage_item(item, log=log, openai_slots=openai_slots)
+            else:
+                publish_item(item, log=log)
+            item["retry_at"] = None
+            if item["status"] != "failed":
+                item["error"] = None
+        except Exception as e:
+            item["attempts"] += 1
+            item["error"] = str(e)
+            item["retry_at"] = (datetime.now() + timedelta(minutes=config.SCHEDULE_RETRY_MINUTES)).isoformat()
+            log(f"[ERROR] {action} failed (attempt {item['attempts']}), retrying at {item['retry_at'][11:19]}: {str(e)}")
+        finally:
+            _save_item(item)
+            # Under the lock the main loop holds while it checks `running`,
+            # and before waking it, so --once never waits on a finished job
+            with _queue_lock:
+                running.pop(item["id"], None)
+            wake.set()
+
+    try:
+        while True:
+            now = datetime.now()
+            try:
+                schedule = read_schedule(schedule_path)
+            except Exception as e:
+                print(f"[WARNING] Could not re-read schedule, keeping the previous one: {str(e)}")
+
+            with _queue_lock:
+                queue = load_queue()
+                enqueue_due(queue, schedule, now)
+                prune_queue(queue, now)
+                for queue_id, item in queue.items():
+                    if queue_id in running:
+                        continue
+                    action = _next_action(item, now)
+                    if action == "miss":
+                        print(f"[WARNING] Missed slot {item['slot']} for '{item['theme']}'")
+                        item["status"] = "missed"
+                        if item["post"]:
+                            pipeline.record_post(item["post"], {"success": False, "error": "missed slot"})
+                    elif action:
+                        running[queue_id] = action
+                        executor = stage_executor if action == "stage" else publish_executor
+                        executor.submit(job, action, copy.deepcopy(item))
+                save_queue(queue)
+
+            if once:
+                if not running:
+                    return
+                wake.wait()
+                wake.clear()
+                continue
+
+            # Sleep until the next slot or staging time, but re-read the
+            # schedule at least every SCHEDULE_POLL_SECONDS
+            wake.wait(_seconds_until_next_event(queue, schedule, datetime.now()))
+            wake.clear()
+    except KeyboardInterrupt:
+        print("\nScheduler stopping; staged posts stay queued for the next start")
+    finally:
+        stage_executor.shutdown(wait=False, cancel_futures=True)
+        publish_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _seconds_until_next_event(queue: Dict[str, Dict[str, Any]], schedule: List[Dict[str, Any]], now: datetime) -> float:
+    lead = timedelta(minutes=config.SCHEDULE_LEAD_MINUTES)
+    times = [next_slot(entry, now) - lead for entry in schedule]
+    for item in queue.values():
+        if item["status"] == "staged" and not item["retry_at"]:
+            times.append(datetime.fromisoformat(item["slot"]))
+        elif item["retry_at"] and item["status"] in ("pending", "staged"):
+            times.append(datetime.fromisoformat(item["retry_at"]))
+    upcoming = [(t - now).total_seconds() for t in times if t > now]
+    return max(0.0, min(upcoming + [config.SCHEDULE_POLL_SECONDS]))
+
+
+def format_item(item: Dict[str, Any]) -> str:
+    """
+    Format a queue entry as one line for CLI output.
+
+    Args:
+        item: Queue entry
+
+    Returns:
+        Line with slot, status, theme and media ID or error
+    """
+    detail = ""
+    if item.get("media_id"):
+        detail = f"  (Media ID: {item['media_id']})"
+    elif item.get("error"):
+        detail = f"  ({item['error']})"
+    return f"{item['slot']}  {item['status']:<9}  {item['theme']}{detail}"
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+from PIL import Image
+
+import config
+import image_generator
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "P", "LA"])
+def test_finish_image_saves_jpeg_from_any_mode(monkeypatch, mode):
+    monkeypatch.setattr(config, "OUTPUT_FORMAT", "JPEG")
+    os.makedirs(config.IMAGES_DIR)
+    output_path = os.path.join(config.IMAGES_DIR, "slide_2.jpg")
+
+    # Carousel slides after the first are saved without the overlay, in their own mode
+    image_generator.finish_image(Image.new(mode, (64, 80)), output_path)
+
+    with Image.open(output_path) as image:
+        assert image.format == "JPEG"
+        assert image.mode == "RGB"
+
+
+def test_encode_image_keeps_alpha_for_png(tmp_path):
+    output_path = str(tmp_path / "image.png")
+
+    image_generator.encode_image(Image.new("RGBA", (8, 8), (0, 0, 0, 0)), output_path, "PNG")
+
+    with Image.open(output_path) as image:
+        assert image.mode == "RGBA"
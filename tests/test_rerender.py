@@ -0,0 +1,31 @@
+import os
+
+from PIL import Image
+
+import config
+import image_generator
+import rerender
+
+
+def test_rerender_keeps_the_format_of_the_existing_file(monkeypatch):
+    monkeypatch.setattr(config, "OUTPUT_FORMAT", "JPEG")
+    os.makedirs(config.IMAGES_DIR)
+    output_path = os.path.join(config.IMAGES_DIR, "lake.png")
+    base_path = image_generator.save_base_image(Image.new("RGB", (256, 320), "steelblue"), output_path)
+
+    result = rerender.rerender_posts(
+        [{"image_path": output_path, "base_image_path": base_path, "caption": "Calm lake"}],
+        workers=1,
+    )
+
+    assert result["errors"] == []
+    assert result["rendered"] == [output_path]
+    with Image.open(output_path) as image:
+        assert image.format == "PNG"
+
+
+def test_format_for_path():
+    assert image_generator.format_for_path("a/b.JPG") == "JPEG"
+    assert image_generator.format_for_path("a/b.jpeg") == "JPEG"
+    assert image_generator.format_for_path("a/b.webp") == "WEBP"
+    assert image_generator.format_for_path("a/b.gif") is None
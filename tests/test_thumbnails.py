@@ -0,0 +1,21 @@
+import os
+
+from PIL import Image
+
+import config
+import thumbnails
+
+
+def test_build_counts_failed_thumbnails_separately():
+    os.makedirs(config.IMAGES_DIR)
+    for name in ("a.jpg", "b.jpg"):
+        Image.new("RGB", (64, 80), "teal").save(os.path.join(config.IMAGES_DIR, name))
+    with open(os.path.join(config.IMAGES_DIR, "broken.jpg"), "wb") as f:
+        f.write(b"not an image")
+
+    result = thumbnails.build(workers=1)
+
+    assert result["images"] == 3
+    assert result["thumbnails_made"] == 2
+    assert result["thumbnails_failed"] == 1
+    assert len(result["errors"]) == 1
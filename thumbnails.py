@@ -0,0 +1,269 @@
+"""
+Thumbnails and contact sheets for reviewing the image library.
+
+Every image in config.IMAGES_DIR gets a small JPEG thumbnail in
+config.THUMBNAILS_DIR, and the thumbnails are tiled into numbered contact
+sheets in config.CONTACT_SHEETS_DIR. Work is spread over a process pool.
+Decoding takes Pillow's fast paths: JPEGs are decoded at reduced scale
+(draft) and other formats are shrunk by an integer factor (reduce) before
+the final resample, so a full-size frame is rarely materialized.
+
+Runs are incremental. A thumbnail carries its source's modification time,
+so unchanged images are skipped, and a contact sheet is only redrawn when
+one of its images changed or the set of images on it did.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+import config
+import fonts
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Which images each contact sheet shows, to tell when a sheet is stale
+_MANIFEST_NAME = "manifest.json"
+
+LABEL_HEIGHT = 18
+CELL_PADDING = 6
+
+
+def list_images(directory: str = None) -> List[str]:
+    """
+    List the images in the library (not recursive), sorted by name.
+
+    Args:
+        directory: Directory to scan (default config.IMAGES_DIR)
+
+    Returns:
+        Image paths
+    """
+    directory = directory or config.IMAGES_DIR
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        entry.path for entry in os.scandir(directory)
+        if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def thumbnail_path(source: str) -> str:
+    """
+    Thumbnail location for an image.
+
+    Args:
+        source: Image path
+
+    Returns:
+        Path inside config.THUMBNAILS_DIR
+    """
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(config.THUMBNAILS_DIR, name + ".jpg")
+
+
+def is_up_to_date(source: str, thumbnail: str) -> bool:
+    """
+    Check whether a thumbnail was made from the current version of an image.
+
+    Thumbnails are stamped with their source's mtime, so any change to the
+    source (including being swapped for an older file) makes them stale.
+
+    Args:
+        source: Image path
+        thumbnail: Thumbnail path
+
+    Returns:
+        True if the thumbnail can be reused
+    """
+    try:
+        return os.stat(thumbnail).st_mtime_ns == os.stat(source).st_mtime_ns
+    except OSError:
+        return False
+
+
+def make_thumbnail(source: str, destination: str, size: int) -> Optional[str]:
+    """
+    Write a thumbnail of an image (runs in a worker process).
+
+    Args:
+        source: Image path
+        destination: Thumbnail path
+        size: Longest edge of the thumbnail in pixels
+
+    Returns:
+        None on success, or an error message
+    """
+    try:
+        with Image.open(source) as image:
+            # JPEG: let the decoder scale by 1/2, 1/4 or 1/8 instead of
+            # decoding every pixel (no-op for other formats)
+            image.draft("RGB", (size, size))
+            image = image.convert("RGB")
+            # reduce() first by an integer factor (a cheap box average), then
+            # resample only the last step
+            image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            temp_path = f"{destination}.{os.getpid()}.tmp"
+            image.save(temp_path, "JPEG", quality=config.THUMBNAIL_QUALITY)
+        source_mtime = os.stat(source).st_mtime_ns
+        os.utime(temp_path, ns=(source_mtime, source_mtime))
+        os.replace(temp_path, destination)
+        return None
+    except Exception as e:
+        return f"{source}: {str(e)}"
+
+
+def _make_thumbnail_job(job: Tuple[str, str, int]) -> Optional[str]:
+    return make_thumbnail(*job)
+
+
+def render_contact_sheet(thumbnails: List[str], destination: str, size: int, columns: int) -> Optional[str]:
+    """
+    Tile thumbnails into one contact sheet, each labelled with its filename
+    (runs in a worker process).
+
+    Args:
+        thumbnails: Thumbnail paths, in display order
+        destination: Contact sheet path
+        size: Thumbnail size the cells are laid out for
+        columns: Thumbnails per row
+
+    Returns:
+        None on success, or an error message
+    """
+    try:
+        cell_width = size + CELL_PADDING * 2
+        cell_height = size + LABEL_HEIGHT + CELL_PADDING * 2
+        rows = (len(thumbnails) + columns - 1) // columns
+        sheet = Image.new("RGB", (cell_width * columns, cell_height * rows), (24, 24, 24))
+        draw = ImageDraw.Draw(sheet)
+        font = fonts.get_font(LABEL_HEIGHT - 6)
+        for index, path in enumerate(thumbnails):
+            if not os.path.exists(path):
+                continue  # Thumbnail failed; leave the cell empty
+            left = (index % columns) * cell_width
+            top = (index // columns) * cell_height
+            with Image.open(path) as thumbnail:
+                thumbnail.load()
+                offset = (left + CELL_PADDING + (size - thumbnail.width) // 2,
+                          top + CELL_PADDING + (size - thumbnail.height) // 2)
+                sheet.paste(thumbnail, offset)
+            label = os.path.splitext(os.path.basename(path))[0]
+            while label and draw.textlength(label, font=font) > size:
+                label = label[:-1]
+            draw.text((left + CELL_PADDING, top + CELL_PADDING + size + 3), label, fill=(200, 200, 200), font=font)
+        temp_path = f"{destination}.{os.getpid()}.tmp"
+        sheet.save(temp_path, "JPEG", quality=config.THUMBNAIL_QUALITY)
+        os.replace(temp_path, destination)
+        return None
+    except Exception as e:
+        return f"{destination}: {str(e)}"
+
+
+def _render_contact_sheet_job(job: Tuple[List[str], str, int, int]) -> Optional[str]:
+    return render_contact_sheet(*job)
+
+
+def _load_manifest() -> Dict[str, List[str]]:
+    path = os.path.join(config.CONTACT_SHEETS_DIR, _MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: Dict[str, List[str]]):
+    path = os.path.join(config.CONTACT_SHEETS_DIR, _MANIFEST_NAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def _remove_stale(directory: str, keep: set, extension: str) -> int:
+    """
+    Delete generated files that no longer belong to any image.
+    """
+    removed = 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(extension) and entry.path not in keep:
+            os.remove(entry.path)
+            removed += 1
+    return removed
+
+
+def build(workers: int = None, force: bool = False, source_dir: str = None) -> dict:
+    """
+    Bring thumbnails and contact sheets up to date with the library.
+
+    Args:
+        workers: Worker processes (default: CPU count)
+        force: Regenerate everything, even if up to date
+        source_dir: Image directory (default config.IMAGES_DIR)
+
+    Returns:
+        Dictionary with images, thumbnails_made, thumbnails_failed,
+        thumbnails_skipped, sheets_made, sheets_failed, sheets_skipped,
+        removed, errors and seconds
+    """
+    started = time.perf_counter()
+    os.makedirs(config.THUMBNAILS_DIR, exist_ok=True)
+    os.makedirs(config.CONTACT_SHEETS_DIR, exist_ok=True)
+    size = config.THUMBNAIL_SIZE
+    workers = workers or os.cpu_count() or 4
+
+    sources = list_images(source_dir)
+    thumbnails = [thumbnail_path(source) for source in sources]
+    jobs = [
+        (source, thumbnail, size) for source, thumbnail in zip(sources, thumbnails)
+        if force or not is_up_to_date(source, thumbnail)
+    ]
+    changed = {job[1] for job in jobs}
+
+    # Contact sheets: fixed-size pages of thumbnails in library order
+    per_sheet = config.CONTACT_SHEET_COLUMNS * config.CONTACT_SHEET_ROWS
+    manifest = _load_manifest()
+    new_manifest = {}
+    sheet_jobs = []
+    for page, first in enumerate(range(0, len(thumbnails), per_sheet), start=1):
+        members = thumbnails[first:first + per_sheet]
+        sheet = os.path.join(config.CONTACT_SHEETS_DIR, f"contact_sheet_{page:03d}.jpg")
+        new_manifest[sheet] = members
+        if force or manifest.get(sheet) != members or not os.path.exists(sheet) or changed.intersection(members):
+            sheet_jobs.append((members, sheet, size, config.CONTACT_SHEET_COLUMNS))
+
+    sheet_count = len(new_manifest)
+
+    thumbnail_errors = []
+    sheet_errors = []
+    if jobs or sheet_jobs:
+        # Thumbnails first: the sheets are drawn from them
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            thumbnail_errors = [error for error in executor.map(_make_thumbnail_job, jobs, chunksize=chunksize) if error]
+            for job, error in zip(sheet_jobs, executor.map(_render_contact_sheet_job, sheet_jobs)):
+                if error:
+                    sheet_errors.append(error)
+                    new_manifest.pop(job[1])  # Redraw on the next run
+
+    removed = _remove_stale(config.THUMBNAILS_DIR, set(thumbnails), ".jpg")
+    removed += _remove_stale(config.CONTACT_SHEETS_DIR, set(new_manifest), ".jpg")
+    _save_manifest(new_manifest)
+
+    return {
+        "images": len(sources),
+        "thumbnails_made": len(jobs) - len(thumbnail_errors),
+        "thumbnails_failed": len(thumbnail_errors),
+        "thumbnails_skipped": len(sources) - len(jobs),
+        "sheets_made": len(sheet_jobs) - len(sheet_errors),
+        "sheets_failed": len(sheet_errors),
+        "sheets_skipped": sheet_count - len(sheet_jobs),
+        "removed": removed,
+        "errors": thumbnail_errors + sheet_errors,
+        "seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,276 @@
+"""
+Shared, pooled HTTP and OpenAI clients.
+
+Each host gets one long-lived requests.Session with a keep-alive connection
+pool, so repeated calls to graph.facebook.com, api.github.com and friends
+reuse connections instead of paying a new TCP and TLS handshake. A single
+OpenAI client is reused the same way. All clients are safe to share between
+threads.
+
+Every request goes through the host's rate limiter (see ratelimit.py) and
+transient failures (429/5xx, Graph API throttling errors, connection
+errors) are retried with jittered exponential backoff.
+"""
+
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+import config
+import metrics
+import ratelimit
+
+# The openai package takes most of a second to import, so it is loaded on
+# first use rather than by everything that imports this module
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+_lock = threading.Lock()
+_sessions: Dict[str, requests.Session] = {}
+_openai_client = None
+
+
+class _PooledSession(requests.Session):
+    """
+    requests.Session that applies the configured timeouts when a call doesn't
+    pass its own.
+    """
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", (config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT))
+        return super().request(method, url, **kwargs)
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Get the shared session for the host of a URL, creating it on first use.
+    
+    Args:
+        url: Any URL on the target host
+        
+    Returns:
+        Keep-alive session dedicated to that host
+    """
+    host = urlparse(url).netloc.lower()
+    session = _sessions.get(host)
+    if session is not None:
+        return session
+    
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _PooledSession()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+
+# Methods safe to resend after the server may already have acted on them.
+# Others (Graph container creation, photo uploads, GitHub blobs/trees/commits)
+# are only retried when the request was rejected or never sent.
+_IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+
+def _should_retry(response: requests.Response, idempotent: bool = True) -> bool:
+    """
+    Check whether a response is a transient failure worth retrying.
+    
+    For non-idempotent requests only rate-limit rejections count; a 5xx
+    may come after the server created the container, photo or commit.
+    """
+    if response.status_code == 429:
+        return True
+    if idempotent and response.status_code in ratelimit.RETRY_STATUS_CODES:
+        return True
+    if "graph.facebook.com" in response.url and response.status_code in (400, 403):
+        return ratelimit.graph_error_is_transient(response.text, throttling_only=not idempotent)
+    # GitHub signals primary and secondary rate limits with 403
+    if response.status_code == 403 and (response.headers.get("x-ratelimit-remaining") == "0"
+                                        or response.headers.get("retry-after")):
+        return True
+    return False
+
+
+def _failed_to_connect(error: requests.RequestException) -> bool:
+    """
+    Check whether a request failed before any of it was sent.
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", error.args[0]) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def _rewind_files(kwargs: dict):
+    # A retried multipart upload must send the files from the start again
+    for value in (kwargs.get("files") or {}).values():
+        file = value[1] if isinstance(value, tuple) else value
+        if hasattr(file, "seek"):
+            file.seek(0)
+
+
+def request(method: str, url: str, retries: int = None, **kwargs) -> requests.Response:
+    """
+    Send a request through the shared session for the URL's host.
+    
+    The call waits for the host's rate limiter, and transient failures are
+    retried with backoff. GET and HEAD are retried on 5xx, throttling and
+    any connection error. Other methods may already have taken effect, so
+    they are only retried on 429, Graph throttling errors and errors
+    raised before the request was sent.
+    
+    Args:
+        method: HTTP method
+        url: Request URL
+        retries: Retries on transient failures (default config.HTTP_RETRIES)
+        **kwargs: Passed through to requests
+        
+    Returns:
+        The response (the last one, if every attempt failed)
+    """
+    retries = config.HTTP_RETRIES if retries is None else retries
+    session = get_session(url)
+    limiter = ratelimit.get_limiter(urlparse(url).netloc)
+    idempotent = method.upper() in _IDEMPOTENT_METHODS
+    
+    for attempt in range(retries + 1):
+        if attempt:
+            _rewind_files(kwargs)
+        limiter.wait()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            retryable = idempotent or _failed_to_connect(e)
+            if attempt >= retries or not retryable:
+                raise
+            delay = ratelimit.backoff_delay(attempt)
+            print(f"Warning: {method} {urlparse(url).netloc} failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        
+        ratelimit.update_from_headers(limiter, response.headers)
+        if attempt >= retries or not _should_retry(response, idempotent):
+            return response
+        
+        retry_after = ratelimit.parse_retry_after(response.headers)
+        if retry_after is not None and retry_after > config.RATE_LIMIT_MAX_WAIT:
+            return response
+        if retry_after is not None:
+            limiter.pause(retry_after)
+        delay = ratelimit.backoff_delay(attempt, retry_after)
+        print(f"Warning: {method} {urlparse(url).netloc} returned {response.status_code}, retrying in {delay:.1f}s...")
+        response.close()
+        time.sleep(delay)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """Send a GET request through the shared session for the URL's host."""
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """Send a POST request through the shared session for the URL's host."""
+    return request("POST", url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    """Send a PUT request through the shared session for the URL's host."""
+    return request("PUT", url, **kwargs)
+
+
+def patch(url: str, **kwargs) -> requests.Response:
+    """Send a PATCH request through the shared session for the URL's host."""
+    return request("PATCH", url, **kwargs)
+
+
+def get_openai_client() -> "OpenAI":
+    """
+    Get the shared OpenAI client, creating it on first use.
+    
+    Returns:
+        OpenAI client reused for every caption, hashtag and image request
+        
+    Raises:
+        ValueError: If OPENAI_API_KEY is not set
+    """
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                config.require("openai")
+                from openai import OpenAI
+                # Retries are done by call_openai, which also reads the
+                # rate-limit headers, so the SDK's own retries are disabled
+                _openai_client = OpenAI(api_key=config.OPENAI_API_KEY, timeout=config.OPENAI_TIMEOUT, max_retries=0)
+    return _openai_client
+
+
+def _openai_failed_to_connect(error: Exception) -> bool:
+    """
+    Check whether an OpenAI request failed before any of it was sent.
+    """
+    # The SDK wraps the HTTP client's error; match by name, as it may come
+    # from httpx or httpx2 depending on the SDK version
+    return type(error.__cause__).__name__ in ("ConnectError", "ConnectTimeout")
+
+
+def call_openai(create: Callable[..., Any], idempotent: bool = True, **kwargs) -> Any:
+    """
+    Call an OpenAI endpoint through the rate limiter, with retries.
+    
+    Args:
+        create: A with_raw_response method of the shared client, e.g.
+            get_openai_client().chat.completions.with_raw_response.create
+        idempotent: False for billed requests that shouldn't run twice
+            (image generation): like non-idempotent requests in request(),
+            they are only retried on 429 and on errors raised before the
+            request was sent, not on 5xx or timeouts
+        **kwargs: Arguments for the endpoint
+        
+    Returns:
+        The parsed API response (its token usage is added to the current
+        post's metrics)
+    """
+    import openai
+    
+    limiter = ratelimit.get_limiter(get_openai_client().base_url.host)
+    
+    for attempt in range(config.HTTP_RETRIES + 1):
+        limiter.wait()
+        try:
+            raw_response = create(**kwargs)
+        except openai.APIStatusError as e:
+            ratelimit.update_from_headers(limiter, e.response.headers)
+            # An exhausted quota won't come back by waiting
+            retryable = ((e.status_code in ratelimit.RETRY_STATUS_CODES if idempotent else e.status_code == 429)
+                         and getattr(e, "code", None) != "insufficient_quota")
+            if not retryable or attempt >= config.HTTP_RETRIES:
+                raise
+            retry_after = ratelimit.parse_retry_after(e.response.headers)
+            if retry_after is not None:
+                limiter.pause(retry_after)
+            delay = ratelimit.backoff_delay(attempt, retry_after)
+            print(f"Warning: OpenAI returned {e.status_code}, retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        except openai.APIConnectionError as e:
+            retryable = idempotent or _openai_failed_to_connect(e)
+            if not retryable or attempt >= config.HTTP_RETRIES:
+                raise
+            delay = ratelimit.backoff_delay(attempt)
+            print(f"Warning: OpenAI request failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        
+        ratelimit.update_from_headers(limiter, raw_response.headers)
+        parsed = raw_response.parse()
+        metrics.add_tokens(getattr(parsed, "usage", None))
+        return parsed
+
@@ -3,24 +3,101 @@ Utility functions for directory management and logging.
 """
 
 import os
+import sys
 import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Tuple
 
 import config
 
+# Serializes post log writes between threads; the lock file below covers
+# other processes
+_post_log_lock = threading.Lock()
+
 
 def ensure_output_directories():
     """
     Ensure output directories exist, creating them if necessary.
     """
     os.makedirs(config.IMAGES_DIR, exist_ok=True)
+    os.makedirs(config.BASE_IMAGES_DIR, exist_ok=True)
+
+
+@contextmanager
+def _locked_post_log() -> Iterator[None]:
+    """
+    Hold an exclusive lock on the post log, across threads and processes.
+    """
+    os.makedirs(os.path.dirname(config.POSTS_LOG_PATH) or ".", exist_ok=True)
+    with _post_log_lock:
+        with open(config.POSTS_LOG_PATH + ".lock", "a+b") as lock_file:
+            if sys.platform == "win32":
+                import msvcrt
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK gives up after ~10 seconds; keep waiting
+                        continue
+                try:
+                    yield
+                finally:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _migrate_posts_json_unlocked():
+    # Caller holds the post log lock
+    if os.path.exists(config.POSTS_LOG_PATH) or not os.path.exists(config.POSTS_JSON_PATH):
+        return
+    
+    with open(config.POSTS_JSON_PATH, "r", encoding="utf-8") as f:
+        posts = json.load(f)
+    
+    # Write the whole history to a temporary file, then move it into place,
+    # so a crash never leaves a half-migrated log behind
+    tmp_path = config.POSTS_LOG_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+        for post in posts:
+            f.write(json.dumps(post, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, config.POSTS_LOG_PATH)
+    print(f"[INFO] Migrated {len(posts)} posts from {config.POSTS_JSON_PATH} to {config.POSTS_LOG_PATH}")
+
+
+def migrate_posts_json():
+    """
+    Convert the legacy posts.json history into the append-only post log.
+    
+    Runs once: nothing happens if posts.jsonl already exists or there is no
+    posts.json. The legacy file is left in place.
+    """
+    if os.path.exists(config.POSTS_LOG_PATH) or not os.path.exists(config.POSTS_JSON_PATH):
+        return
+    with _locked_post_log():
+        _migrate_posts_json_unlocked()
 
 
 def save_post_log(post_data: Dict[str, Any]):
     """
-    Append a post entry to posts.json.
+    Append a post entry to the post log (posts.jsonl).
+    
+    The entry is written as a single line under an exclusive lock and synced
+    to disk, so concurrent writers never interleave and a crash can at worst
+    leave one incomplete last line, which readers skip.
     
     Args:
         post_data: Dictionary containing theme, caption, image_path, and timestamp
@@ -28,33 +105,105 @@ def save_post_log(post_data: Dict[str, Any]):
     # Ensure directories exist
     ensure_output_directories()
     
-    # Load existing posts
-    if os.path.exists(config.POSTS_JSON_PATH):
-        with open(config.POSTS_JSON_PATH, "r", encoding="utf-8") as f:
-            posts = json.load(f)
-    else:
-        posts = []
+    line = (json.dumps(post_data, ensure_ascii=False) + "\n").encode("utf-8")
+    
+    with _locked_post_log():
+        _migrate_posts_json_unlocked()
+        
+        with open(config.POSTS_LOG_PATH, "ab") as f:
+            # Start on a fresh line if a previous writer crashed mid-entry
+            if f.tell() > 0:
+                with open(config.POSTS_LOG_PATH, "rb") as reader:
+                    reader.seek(-1, os.SEEK_END)
+                    if reader.read(1) != b"\n":
+                        line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def iter_post_log(start_offset: int = 0) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """
+    Read post log entries with their byte positions.
+    
+    Lines that aren't valid JSON (e.g. an entry cut short by a crash) are
+    skipped, as is a trailing line without a newline, which may still be
+    being written.
     
-    # Add new post
-    posts.append(post_data)
+    Args:
+        start_offset: Byte offset to start reading from (start of a line)
+        
+    Yields:
+        Tuples of (start offset, end offset, entry)
+    """
+    migrate_posts_json()
+    if not os.path.exists(config.POSTS_LOG_PATH):
+        return
     
-    # Save updated posts
-    with open(config.POSTS_JSON_PATH, "w", encoding="utf-8") as f:
+    with open(config.POSTS_LOG_PATH, "rb") as f:
+        f.seek(start_offset)
+        offset = start_offset
+        for raw_line in f:
+            if not raw_line.endswith(b"\n"):
+                break
+            end_offset = offset + len(raw_line)
+            if raw_line.strip():
+                try:
+                    entry = json.loads(raw_line)
+                except ValueError:
+                    entry = None
+                if isinstance(entry, dict):
+                    yield offset, end_offset, entry
+            offset = end_offset
+
+
+def load_posts() -> List[Dict[str, Any]]:
+    """
+    Load every entry from the post log.
+    
+    Returns:
+        Post entries in the order they were logged
+    """
+    return [entry for _, _, entry in iter_post_log()]
+
+
+def export_posts_json(output_path: str = None) -> str:
+    """
+    Export the post log in the legacy posts.json format (one indented list).
+    
+    Args:
+        output_path: Destination file (default config.POSTS_JSON_PATH)
+        
+    Returns:
+        The path written
+    """
+    output_path = output_path or config.POSTS_JSON_PATH
+    posts = load_posts()
+    
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(posts, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, output_path)
+    
+    return output_path
 
 
-def generate_image_filename(theme: str) -> str:
+def generate_image_filename(theme: str, image_format: str = None) -> str:
     """
     Generate a filename for an image based on theme and timestamp.
     
     Args:
         theme: The content theme
+        image_format: Output format (default config.OUTPUT_FORMAT)
         
     Returns:
-        Filename string with .png extension
+        Filename string with the format's extension (.jpg, .png or .webp)
     """
+    image_format = (image_format or config.OUTPUT_FORMAT).upper()
+    if image_format not in config.OUTPUT_EXTENSIONS:
+        raise ValueError(f"Unsupported output format: {image_format}")
+    
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     safe_theme = "".join(c for c in theme if c.isalnum() or c in (" ", "-", "_")).strip()
     safe_theme = safe_theme.replace(" ", "_").lower()[:30]
-    return f"{safe_theme}_{timestamp}.png"
-
+    return f"{safe_theme}_{timestamp}{config.OUTPUT_EXTENSIONS[image_format]}"